@@ -1,6 +1,8 @@
 # appferiadigital/admin.py (para administrar desde el panel de Django)
 from django.contrib import admin
-from .models import Usuario, Feria, Puesto, Categoria, Producto, Reserva, ReservaProducto
+from .models import (
+    Usuario, Feria, Puesto, Categoria, Producto, Reserva, ReservaArchivada, ReservaProducto, ClimaSnapshot,
+)
 
 @admin.register(Usuario)
 class UsuarioAdmin(admin.ModelAdmin):
@@ -10,7 +12,7 @@ class UsuarioAdmin(admin.ModelAdmin):
 
 @admin.register(Feria)
 class FeriaAdmin(admin.ModelAdmin):
-    list_display = ('nombre_feria', 'ubicacion_feria', 'aglomeracion')
+    list_display = ('nombre_feria', 'ubicacion_feria', 'aglomeracion', 'id_ciudad_clima')
     search_fields = ('nombre_feria',)
 
 @admin.register(Puesto)
@@ -32,10 +34,21 @@ class ProductoAdmin(admin.ModelAdmin):
 
 @admin.register(Reserva)
 class ReservaAdmin(admin.ModelAdmin):
-    list_display = ('id_reserva', 'id_usuario', 'id_producto', 'cantidad', 'fecha_reserva')
-    list_filter = ('fecha_reserva',)
+    list_display = ('id_reserva', 'id_usuario', 'id_producto', 'cantidad', 'fecha_reserva', 'estado')
+    list_filter = ('estado', 'fecha_reserva')
+    search_fields = ('id_usuario__nombre',)
+
+@admin.register(ReservaArchivada)
+class ReservaArchivadaAdmin(admin.ModelAdmin):
+    list_display = ('id_reserva', 'id_usuario', 'id_producto', 'cantidad', 'fecha_reserva', 'estado', 'archivada')
+    list_filter = ('estado', 'fecha_reserva')
     search_fields = ('id_usuario__nombre',)
 
 @admin.register(ReservaProducto)
 class ReservaProductoAdmin(admin.ModelAdmin):
-    list_display = ('id_reserva', 'id_producto', 'cantidad_reserva', 'unidad_de_medida')
\ No newline at end of file
+    list_display = ('id_reserva', 'id_producto', 'cantidad_reserva', 'unidad_de_medida')
+
+@admin.register(ClimaSnapshot)
+class ClimaSnapshotAdmin(admin.ModelAdmin):
+    list_display = ('id_ciudad', 'nombre', 'actualizado')
+    search_fields = ('nombre',)
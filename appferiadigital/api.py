@@ -0,0 +1,220 @@
+"""
+API JSON v1 para los clientes móviles y kioscos.
+
+Usa la misma sesión que las vistas HTML (usuario_id / usuario_rol) y las
+mismas reglas de rol. Los listados se paginan por cursor con paginar_keyset
+y aceptan ?campos=a,b,c para enviar solo los campos pedidos.
+"""
+from django.conf import settings
+from django.db.models import Prefetch
+from django.middleware.csrf import get_token
+from django.shortcuts import get_object_or_404
+from rest_framework import generics, status
+from rest_framework.pagination import BasePagination
+from rest_framework.permissions import AllowAny
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from .autenticacion import EsCliente, EsVendedor
+from .busqueda_service import BusquedaService
+from .clima_guardado import climas_de_ferias
+from .estadisticas_service import EstadisticasService
+from .indice_ferias import ferias_cercanas, leer_coordenadas
+from .models import (
+    Feria, Producto, Puesto, Reserva, ReservaArchivada, ReservaProducto,
+    ReservaProductoArchivada,
+)
+from .paginacion import paginar_keyset
+from .reserva_service import ReservaService
+from .serializers import (
+    CrearReservaSerializer, EstadisticaVendedorSerializer, FeriaCercanaSerializer, FeriaSerializer,
+    ProductoSerializer, PuestoSerializer, ReservaSerializer,
+)
+
+
+# ---------- Paginación y campos ----------
+
+class PaginacionKeyset(BasePagination):
+    """Cursor opaco en ?despues= / ?antes= (ver paginacion.py)"""
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.pagina = paginar_keyset(request, queryset, view.orden_keyset)
+        return list(self.pagina)
+
+    def _absoluta(self, url):
+        return self.request.build_absolute_uri(self.request.path + url) if url else None
+
+    def get_paginated_response(self, data):
+        return Response({
+            'siguiente': self._absoluta(self.pagina.url_siguiente),
+            'anterior': self._absoluta(self.pagina.url_anterior),
+            'resultados': data,
+        })
+
+
+class CamposMixin:
+    def campos_solicitados(self):
+        campos = self.request.query_params.get('campos', '')
+        return [c.strip() for c in campos.split(',') if c.strip()]
+
+    def get_serializer_context(self):
+        contexto = super().get_serializer_context()
+        contexto['campos'] = self.campos_solicitados()
+        return contexto
+
+
+# ---------- Vistas ----------
+
+class CsrfView(APIView):
+    """Token CSRF para POST/DELETE (cabecera X-CSRFToken), también queda en la cookie"""
+    permission_classes = [AllowAny]
+
+    def get(self, request):
+        return Response({'csrftoken': get_token(request)})
+
+
+class FeriaListaView(CamposMixin, generics.ListAPIView):
+    """Ferias con el clima guardado de su ciudad (se omite si no se pide el campo)"""
+    permission_classes = [AllowAny]
+    serializer_class = FeriaSerializer
+    pagination_class = PaginacionKeyset
+    orden_keyset = ['id_feria']
+    queryset = Feria.objects.select_related('id_ciudad_clima')
+
+    def list(self, request, *args, **kwargs):
+        ferias = self.paginate_queryset(self.get_queryset())
+        contexto = self.get_serializer_context()
+        if not contexto['campos'] or 'clima' in contexto['campos']:
+            contexto['climas'] = climas_de_ferias(ferias)
+        serializer = self.serializer_class(ferias, many=True, context=contexto)
+        return self.get_paginated_response(serializer.data)
+
+
+class FeriaCercanasView(CamposMixin, generics.GenericAPIView):
+    """
+    ?lat=&lon= obligatorios; ?radio= en km y ?n= resultados (por defecto
+    FERIAS_CERCANAS, a lo más PAGINACION_TAMANO_MAXIMO). De la más cercana
+    a la más lejana, sin paginar.
+    """
+    permission_classes = [AllowAny]
+    serializer_class = FeriaCercanaSerializer
+
+    def get(self, request):
+        try:
+            cerca = leer_coordenadas(request.query_params)
+        except ValueError as e:
+            return Response({'detail': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        if cerca is None:
+            return Response({'detail': 'Indique lat y lon'}, status=status.HTTP_400_BAD_REQUEST)
+        n = request.query_params.get('n')
+        if n and not (n.isdigit() and int(n) > 0):
+            return Response({'detail': 'n debe ser un entero mayor que 0'}, status=status.HTTP_400_BAD_REQUEST)
+
+        lat, lon, radio = cerca
+        n = min(int(n), settings.PAGINACION_TAMANO_MAXIMO) if n else None
+        if n is None and radio is not None:
+            n = settings.PAGINACION_TAMANO_MAXIMO
+        distancias = dict(ferias_cercanas(lat, lon, n=n, radio_km=radio))
+        ferias = sorted(
+            Feria.objects.select_related('id_ciudad_clima').filter(id_feria__in=list(distancias)),
+            key=lambda f: distancias[f.id_feria],
+        )
+        for feria in ferias:
+            feria.distancia_km = round(distancias[feria.id_feria], 2)
+        contexto = self.get_serializer_context()
+        if not contexto['campos'] or 'clima' in contexto['campos']:
+            contexto['climas'] = climas_de_ferias(ferias)
+        return Response({'resultados': self.serializer_class(ferias, many=True, context=contexto).data})
+
+
+class PuestoDetalleView(CamposMixin, generics.RetrieveAPIView):
+    permission_classes = [EsCliente]
+    serializer_class = PuestoSerializer
+    lookup_field = 'id_puesto'
+    queryset = Puesto.objects.select_related('id_feria', 'id_usuario').prefetch_related(
+        Prefetch('producto_set', queryset=Producto.objects.select_related('id_categoria').order_by('nombre_producto'))
+    )
+
+
+class ProductoBusquedaView(CamposMixin, generics.ListAPIView):
+    """?q= ordena por relevancia (hasta BUSQUEDA_MAX_RESULTADOS); sin q pagina por id"""
+    permission_classes = [EsCliente]
+    serializer_class = ProductoSerializer
+    pagination_class = PaginacionKeyset
+    orden_keyset = ['id_producto']
+
+    def get_queryset(self):
+        productos = Producto.objects.select_related(
+            'id_puesto__id_feria', 'id_categoria'
+        ).filter(stock__gt=0)
+        categoria = self.request.query_params.get('categoria')
+        if categoria:
+            productos = productos.filter(id_categoria_id=categoria)
+        return productos
+
+    def list(self, request, *args, **kwargs):
+        query = request.query_params.get('q', '').strip()
+        if not query:
+            return super().list(request, *args, **kwargs)
+        productos = BusquedaService.buscar(query, self.get_queryset(), limite=settings.BUSQUEDA_MAX_RESULTADOS)
+        serializer = self.get_serializer(productos, many=True)
+        return Response({'siguiente': None, 'anterior': None, 'resultados': serializer.data})
+
+
+class ReservaListaView(CamposMixin, generics.ListCreateAPIView):
+    """GET: reservas del cliente (?archivadas=1: las archivadas). POST: reserva simple o carrito."""
+    permission_classes = [EsCliente]
+    serializer_class = ReservaSerializer
+    pagination_class = PaginacionKeyset
+    orden_keyset = ['-fecha_reserva', '-id_reserva']
+
+    def get_queryset(self):
+        # Las reservas archivadas se leen solo si se piden
+        if self.request.query_params.get('archivadas') == '1':
+            modelo, lineas = ReservaArchivada, ReservaProductoArchivada
+        else:
+            modelo, lineas = Reserva, ReservaProducto
+        return modelo.objects.filter(
+            id_usuario_id=self.request.session.get('usuario_id')
+        ).select_related('id_producto').prefetch_related(
+            Prefetch('reservaproducto_set', queryset=lineas.objects.select_related('id_producto'))
+        )
+
+    def create(self, request, *args, **kwargs):
+        entrada = CrearReservaSerializer(data=request.data)
+        entrada.is_valid(raise_exception=True)
+        datos = entrada.validated_data
+        usuario_id = request.session.get('usuario_id')
+
+        if 'lineas' in datos:
+            reserva = ReservaService.reservar_carrito(usuario_id, datos['id_puesto'], datos['lineas'])
+        else:
+            get_object_or_404(Producto.objects.only('id_producto'), id_producto=datos['id_producto'])
+            reserva = ReservaService.reservar(usuario_id, datos['id_producto'], datos['cantidad'])
+
+        if reserva is None:
+            return Response({'detail': 'Stock insuficiente'}, status=status.HTTP_409_CONFLICT)
+        reserva = self.get_queryset().get(id_reserva=reserva.id_reserva)
+        return Response(ReservaSerializer(reserva).data, status=status.HTTP_201_CREATED)
+
+
+class ReservaCancelarView(APIView):
+    permission_classes = [EsCliente]
+
+    def delete(self, request, id_reserva):
+        reserva = get_object_or_404(
+            Reserva, id_reserva=id_reserva, id_usuario_id=request.session.get('usuario_id')
+        )
+        if not ReservaService.cancelar(reserva):
+            return Response({'detail': 'La reserva ya no está pendiente'}, status=status.HTTP_409_CONFLICT)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class EstadisticasVendedorView(APIView):
+    permission_classes = [EsVendedor]
+
+    def get(self, request):
+        usuario_id = request.session.get('usuario_id')
+        stats = EstadisticasService.leer(usuario_id)
+        return Response(EstadisticaVendedorSerializer(stats).data)
@@ -0,0 +1,14 @@
+# appferiadigital/api_urls.py (montado en /api/v1/)
+from django.urls import path
+from . import api
+
+urlpatterns = [
+    path('csrf/', api.CsrfView.as_view(), name='api_csrf'),
+    path('ferias/', api.FeriaListaView.as_view(), name='api_ferias'),
+    path('ferias/cercanas/', api.FeriaCercanasView.as_view(), name='api_ferias_cercanas'),
+    path('puestos/<int:id_puesto>/', api.PuestoDetalleView.as_view(), name='api_puesto'),
+    path('productos/', api.ProductoBusquedaView.as_view(), name='api_productos'),
+    path('reservas/', api.ReservaListaView.as_view(), name='api_reservas'),
+    path('reservas/<int:id_reserva>/', api.ReservaCancelarView.as_view(), name='api_reserva'),
+    path('vendedor/estadisticas/', api.EstadisticasVendedorView.as_view(), name='api_estadisticas_vendedor'),
+]
@@ -0,0 +1,73 @@
+"""
+Archivo de reservas antiguas.
+
+Las reservas procesadas o canceladas con más de RESERVAS_ARCHIVO_DIAS se
+mueven a ReservaArchivada (y sus líneas a ReservaProductoArchivada), así las
+vistas de todos los días consultan una tabla que no crece sin límite. Las
+pendientes nunca se archivan: todavía hay que procesarlas.
+
+Se mueven en lotes de RESERVAS_ARCHIVO_LOTE, cada uno en su propia
+transacción (copiar y borrar), para no bloquear la tabla mucho rato. Las
+reservas finalizadas ya no cambian, así que no hace falta bloquearlas.
+
+En PostgreSQL la tabla de archivo podría particionarse por fecha; Django no
+crea particiones, y con el archivo aparte la tabla caliente ya queda
+acotada, así que se usa una tabla normal en todos los motores.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from .models import Reserva, ReservaArchivada, ReservaProducto, ReservaProductoArchivada
+
+CAMPOS_RESERVA = ('id_reserva', 'id_usuario_id', 'id_producto_id', 'cantidad', 'fecha_reserva', 'estado')
+CAMPOS_LINEA = ('id_reserva_id', 'id_producto_id', 'cantidad_reserva', 'unidad_de_medida')
+
+
+def candidatas(limite):
+    """Reservas finalizadas antes de `limite`, de la más antigua a la más nueva"""
+    consulta = Reserva.objects.filter(estado__in=Reserva.FINALIZADAS, fecha_reserva__lt=limite)
+    # SQLite reutiliza el id más alto si se borra esa fila: se deja siempre en
+    # la tabla, para que una reserva nueva no repita un id ya archivado
+    maximo = Reserva.objects.aggregate(maximo=Max('id_reserva'))['maximo']
+    if maximo is not None:
+        consulta = consulta.filter(id_reserva__lt=maximo)
+    return consulta.order_by('fecha_reserva', 'id_reserva')
+
+
+def archivar_lote(limite, tamano):
+    """Mueve hasta `tamano` reservas. Retorna (reservas, líneas) movidas."""
+    with transaction.atomic():
+        ids = list(candidatas(limite).values_list('id_reserva', flat=True)[:tamano])
+        if not ids:
+            return 0, 0
+        ReservaArchivada.objects.bulk_create([
+            ReservaArchivada(**fila)
+            for fila in Reserva.objects.filter(id_reserva__in=ids).values(*CAMPOS_RESERVA)
+        ])
+        lineas = ReservaProducto.objects.filter(id_reserva__in=ids)
+        ReservaProductoArchivada.objects.bulk_create([
+            ReservaProductoArchivada(**fila) for fila in lineas.values(*CAMPOS_LINEA)
+        ])
+        _, borrados = Reserva.objects.filter(id_reserva__in=ids).delete()
+        return len(ids), borrados.get(ReservaProducto._meta.label, 0)
+
+
+def archivar(dias=None, tamano=None, max_lotes=None):
+    """
+    Archiva lote por lote hasta que no queden candidatas (o hasta
+    `max_lotes`). Genera (reservas, líneas) por cada lote movido.
+    """
+    dias = settings.RESERVAS_ARCHIVO_DIAS if dias is None else dias
+    tamano = tamano or settings.RESERVAS_ARCHIVO_LOTE
+    limite = timezone.localdate() - timedelta(days=dias)
+    lotes = 0
+    while max_lotes is None or lotes < max_lotes:
+        movidas = archivar_lote(limite, tamano)
+        if not movidas[0]:
+            return
+        lotes += 1
+        yield movidas
@@ -0,0 +1,144 @@
+"""
+Usuario autenticado por petición.
+
+IdentidadMiddleware deja en `request.usuario` un objeto perezoso: el Usuario
+se resuelve la primera vez que se usa y como máximo una vez por petición.
+Los datos de identidad (todo menos la contraseña) se guardan en caché por
+usuario, así que normalmente no se consulta la base de datos; la entrada se
+invalida cuando el Usuario se guarda o se elimina (ver signals.py).
+"""
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.contrib import messages
+from django.core.cache import cache
+from django.db import router
+from django.shortcuts import redirect
+from django.utils.functional import SimpleLazyObject
+from rest_framework.authentication import SessionAuthentication
+from rest_framework.permissions import BasePermission
+
+from .models import Usuario
+
+# Columnas cargadas; `contrasena` queda diferida y se lee solo si se accede
+CAMPOS_IDENTIDAD = ('id_usuario', 'rut', 'nombre', 'puesto', 'rol', 'telefono', 'email')
+
+
+def _clave_identidad(usuario_id):
+    return f'identidad_usuario_{usuario_id}'
+
+
+def invalidar_identidad(usuario_id):
+    cache.delete(_clave_identidad(usuario_id))
+
+
+def obtener_usuario(request):
+    """Usuario de la sesión (sin contraseña) o None si no hay sesión"""
+    usuario_id = request.session.get('usuario_id')
+    if not usuario_id:
+        return None
+
+    clave = _clave_identidad(usuario_id)
+    valores = cache.get(clave)
+    if valores is None:
+        valores = Usuario.objects.filter(id_usuario=usuario_id).values_list(
+            *CAMPOS_IDENTIDAD
+        ).first()
+        if valores is None:
+            return None
+        cache.set(clave, valores, settings.IDENTIDAD_CACHE_TIMEOUT)
+
+    # Instancia "cargada desde la BD" con los demás campos diferidos
+    return Usuario.from_db(router.db_for_read(Usuario), CAMPOS_IDENTIDAD, valores)
+
+
+class IdentidadMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        # Perezoso: las vistas async que no lo usan no tocan la BD
+        request.usuario = SimpleLazyObject(lambda: obtener_usuario(request))
+        return self.get_response(request)
+
+
+def requiere_rol(*roles):
+    """
+    Exige sesión iniciada y, si se indican roles, que el rol de la sesión
+    sea uno de ellos. No consulta la base de datos (salvo para cargar la
+    sesión, que en vistas async se lee con la API async).
+    """
+    def rechazo(request, usuario_id, rol):
+        if not usuario_id:
+            return redirect('login')
+        if roles and rol not in roles:
+            messages.error(request, 'Acceso denegado')
+            return redirect('dashboard')
+        return None
+
+    def decorador(vista):
+        if iscoroutinefunction(vista):
+            @wraps(vista)
+            async def envoltura(request, *args, **kwargs):
+                respuesta = rechazo(
+                    request, await request.session.aget('usuario_id'), await request.session.aget('usuario_rol')
+                )
+                return respuesta or await vista(request, *args, **kwargs)
+        else:
+            @wraps(vista)
+            def envoltura(request, *args, **kwargs):
+                respuesta = rechazo(
+                    request, request.session.get('usuario_id'), request.session.get('usuario_rol')
+                )
+                return respuesta or vista(request, *args, **kwargs)
+        envoltura.roles = roles
+        return envoltura
+    return decorador
+
+
+requiere_login = requiere_rol()
+
+
+# ---------- API (Django REST framework) ----------
+
+class SesionFeriaAuthentication(SessionAuthentication):
+    """
+    Autentica con la sesión de la aplicación (no con django.contrib.auth) y
+    exige el token CSRF en los métodos que escriben, igual que los formularios.
+    """
+
+    def authenticate(self, request):
+        django_request = request._request
+        if not django_request.session.get('usuario_id'):
+            return None
+        self.enforce_csrf(django_request)
+        return (django_request.usuario, None)
+
+    def authenticate_header(self, request):
+        # 401 en vez de 403 cuando falta la sesión
+        return 'Session'
+
+
+class SesionIniciada(BasePermission):
+    roles = ()
+
+    def has_permission(self, request, view):
+        if not request.session.get('usuario_id'):
+            return False
+        return not self.roles or request.session.get('usuario_rol') in self.roles
+
+
+class EsCliente(SesionIniciada):
+    roles = ('cliente',)
+    message = 'Acceso denegado'
+
+
+class EsVendedor(SesionIniciada):
+    roles = ('vendedor',)
+    message = 'Acceso denegado'
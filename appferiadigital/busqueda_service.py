@@ -0,0 +1,150 @@
+import re
+import unicodedata
+
+from django.db import connection
+from django.db.models import Q
+
+from .models import Producto, ProductoBusqueda
+
+# Tabla FTS5 que SQLite mantiene sincronizada con triggers (migración 0005)
+TABLA_FTS = 'appferiadigital_productobusqueda_fts'
+
+
+def normalizar_texto(texto):
+    """
+    Minúsculas y sin tildes: "Plátano Ñuble" -> "platano nuble"
+    """
+    if not texto:
+        return ''
+    descompuesto = unicodedata.normalize('NFKD', texto)
+    sin_tildes = ''.join(c for c in descompuesto if not unicodedata.combining(c))
+    return ' '.join(re.findall(r'\w+', sin_tildes.lower()))
+
+
+def terminos_busqueda(texto):
+    return normalizar_texto(texto).split()
+
+
+def texto_indexable(nombre_producto, nombre_categoria, nombre_feria):
+    return ' '.join(
+        normalizar_texto(parte) for parte in (nombre_producto, nombre_categoria, nombre_feria) if parte
+    )
+
+
+class BusquedaService:
+    _fts_disponible = None
+
+    @staticmethod
+    def indexar(filtro=None, lote=2000):
+        """
+        Recalcula el texto indexado de los productos que cumplen `filtro`
+        (un Q sobre Producto; None = todos). Se procesa en lotes con un
+        upsert por lote.
+        """
+        productos = Producto.objects.all()
+        if filtro is not None:
+            productos = productos.filter(filtro)
+        filas = productos.order_by().values_list(
+            'id_producto', 'nombre_producto', 'id_categoria__nombre', 'id_puesto__id_feria__nombre_feria'
+        )
+
+        pendientes = []
+        total = 0
+        for id_producto, nombre, categoria, feria in filas.iterator(chunk_size=lote):
+            pendientes.append(ProductoBusqueda(
+                id_producto_id=id_producto,
+                texto=texto_indexable(nombre, categoria, feria),
+            ))
+            if len(pendientes) >= lote:
+                total += BusquedaService._guardar(pendientes)
+                pendientes = []
+        if pendientes:
+            total += BusquedaService._guardar(pendientes)
+        return total
+
+    @staticmethod
+    def _guardar(filas):
+        ProductoBusqueda.objects.bulk_create(
+            filas,
+            update_conflicts=True,
+            unique_fields=['id_producto'],
+            update_fields=['texto'],
+        )
+        return len(filas)
+
+    @staticmethod
+    def fts_disponible():
+        if connection.vendor != 'sqlite':
+            return False
+        if BusquedaService._fts_disponible is None:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [TABLA_FTS]
+                )
+                BusquedaService._fts_disponible = cursor.fetchone() is not None
+        return BusquedaService._fts_disponible
+
+    @staticmethod
+    def buscar(query, productos=None, limite=100):
+        """
+        Busca `query` sobre nombre, categoría y feria (sin distinguir tildes)
+        y retorna los productos ordenados por relevancia.
+
+        PostgreSQL: tsvector con prefijos + ts_rank, y similitud de trigramas
+        si no hay coincidencias (errores de tipeo).
+        SQLite: índice FTS5 ordenado por bm25.
+        Otros motores: coincidencia de subcadenas sobre el texto normalizado.
+        """
+        if productos is None:
+            productos = Producto.objects.all()
+        terminos = terminos_busqueda(query)
+        if not terminos:
+            return productos.none()
+
+        if connection.vendor == 'postgresql':
+            return BusquedaService._buscar_postgres(productos, terminos, limite)
+        if BusquedaService.fts_disponible():
+            return BusquedaService._buscar_fts5(productos, terminos, limite)
+
+        condicion = Q()
+        for termino in terminos:
+            condicion &= Q(busqueda__texto__contains=termino)
+        return productos.filter(condicion).order_by('nombre_producto', 'id_producto')[:limite]
+
+    @staticmethod
+    def _buscar_postgres(productos, terminos, limite):
+        from django.contrib.postgres.search import (
+            SearchQuery, SearchRank, SearchVector, TrigramSimilarity,
+        )
+
+        # Debe coincidir con la expresión del índice GIN de la migración 0005
+        vector = SearchVector('busqueda__texto', config='simple')
+        consulta = SearchQuery(
+            ' & '.join(f'{termino}:*' for termino in terminos), search_type='raw', config='simple'
+        )
+        resultados = productos.annotate(vector=vector).filter(vector=consulta).annotate(
+            rango=SearchRank(vector, consulta)
+        ).order_by('-rango', 'id_producto')[:limite]
+        if resultados:
+            return resultados
+
+        texto = ' '.join(terminos)
+        return productos.annotate(
+            rango=TrigramSimilarity('busqueda__texto', texto)
+        ).filter(rango__gt=0.2).order_by('-rango', 'id_producto')[:limite]
+
+    @staticmethod
+    def _buscar_fts5(productos, terminos, limite):
+        # Cada término entre comillas (sin operadores FTS) y como prefijo
+        consulta = ' '.join('"{}"*'.format(termino.replace('"', '')) for termino in terminos)
+        tabla_producto = Producto._meta.db_table
+        return productos.extra(
+            tables=[TABLA_FTS],
+            where=[
+                f'{TABLA_FTS}.rowid = {tabla_producto}.id_producto',
+                f'{TABLA_FTS} MATCH %s',
+            ],
+            params=[consulta],
+            select={'rango': f'{TABLA_FTS}.rank'},
+            order_by=['rango', 'id_producto'],
+        )[:limite]
@@ -0,0 +1,233 @@
+"""
+Backend de caché en dos niveles para compartir datos entre workers de gunicorn.
+
+L1: LRU en memoria del proceso, pequeño y con TTL corto.
+L2: caché compartida entre procesos (por defecto la tabla de DatabaseCache).
+
+Las claves que empiezan con uno de los prefijos de INVALIDAR (por defecto
+todas) tienen un sello de versión por prefijo guardado en L2: cada escritura
+de una de ellas lo cambia. Los procesos revisan los sellos como máximo cada
+VERSION_CHECK_INTERVAL segundos y, si uno cambió, sacan de su L1 las claves
+de ese prefijo; así una escritura en un worker invalida el L1 de los demás
+sin vaciar el resto. Las demás claves (fragmentos con versión en la clave,
+locks) no publican nada y en los otros procesos vencen con L1_TIMEOUT.
+`clear` cambia un sello general que vacía el L1 completo.
+
+`add`, `incr` y `decr` van directo a L2 (son atómicos allí) y no publican
+versión; para contadores y locks conviene usar directamente la caché L2.
+"""
+import pickle
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+from .metricas import registrar_cache
+
+CLAVE_VERSION = '__dos_niveles_version__'
+TODO = object()  # Espacio del sello general (clear)
+
+# Estado L1 por nombre de caché, compartido por todos los hilos del proceso
+# (django crea una instancia del backend por hilo).
+_l1 = {}
+_estado = {}
+_locks = {}
+
+
+class DosNivelesCache(BaseCache):
+    pickle_protocol = pickle.HIGHEST_PROTOCOL
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        opciones = params.get('OPTIONS', {})
+        nombre = location or 'default'
+        self._alias_l2 = opciones.get('L2', 'compartida')
+        self._l1_max = int(opciones.get('L1_MAX_ENTRIES', 1000))
+        self._l1_ttl = float(opciones.get('L1_TIMEOUT', 10))
+        self._intervalo_version = float(opciones.get('VERSION_CHECK_INTERVAL', 1))
+        # Prefijos de clave que se invalidan en los demás procesos ('' = todas)
+        self._prefijos = tuple(opciones.get('INVALIDAR', ('',)))
+        self._cache = _l1.setdefault(nombre, OrderedDict())
+        self._estado = _estado.setdefault(nombre, {'versiones': {}, 'proxima_revision': 0.0})
+        self._lock = _locks.setdefault(nombre, threading.Lock())
+
+    @property
+    def l2(self):
+        return caches[self._alias_l2]
+
+    # ---------- L1 ----------
+
+    def _espacio(self, key):
+        """Prefijo de INVALIDAR al que pertenece la clave, o None si no publica versión"""
+        for prefijo in self._prefijos:
+            if str(key).startswith(prefijo):
+                return prefijo
+        return None
+
+    @staticmethod
+    def _clave_sello(espacio):
+        return CLAVE_VERSION if espacio is TODO else f'{CLAVE_VERSION}:{espacio}'
+
+    def _revisar_version(self):
+        ahora = time.monotonic()
+        if ahora < self._estado['proxima_revision']:
+            return
+        espacios = (TODO,) + self._prefijos
+        sellos = {e: self.l2.get(self._clave_sello(e)) for e in espacios}
+        with self._lock:
+            versiones = self._estado['versiones']
+            for espacio in espacios:
+                version = sellos[espacio]
+                if version == versiones.get(espacio):
+                    continue
+                if espacio is TODO:
+                    self._cache.clear()
+                else:
+                    for clave in [c for c, (_, _, e) in self._cache.items() if e == espacio]:
+                        del self._cache[clave]
+                versiones[espacio] = version
+            self._estado['proxima_revision'] = ahora + self._intervalo_version
+
+    def _publicar_version(self, espacios):
+        espacios = set(espacios) - {None}
+        if TODO in espacios:
+            espacios = {TODO}
+        if not espacios:
+            return
+        versiones = {self._clave_sello(e): uuid.uuid4().hex for e in espacios}
+        self.l2.set_many(versiones, None)
+        with self._lock:
+            # Este proceso ya aplicó su propia escritura en L1
+            for espacio in espacios:
+                self._estado['versiones'][espacio] = versiones[self._clave_sello(espacio)]
+
+    def _l1_get(self, clave):
+        with self._lock:
+            entrada = self._cache.get(clave)
+            if entrada is None:
+                return None
+            expira, datos, _ = entrada
+            if expira <= time.monotonic():
+                del self._cache[clave]
+                return None
+            self._cache.move_to_end(clave)
+        return datos
+
+    def _l1_set(self, clave, valor, timeout=DEFAULT_TIMEOUT, espacio=None):
+        ttl = self._l1_ttl
+        timeout = self.default_timeout if timeout is DEFAULT_TIMEOUT else timeout
+        if timeout is not None:
+            if timeout <= 0:
+                self._l1_delete(clave)
+                return
+            ttl = min(ttl, timeout)
+        datos = pickle.dumps(valor, self.pickle_protocol)
+        with self._lock:
+            self._cache[clave] = (time.monotonic() + ttl, datos, espacio)
+            self._cache.move_to_end(clave)
+            while len(self._cache) > self._l1_max:
+                self._cache.popitem(last=False)
+
+    def _l1_delete(self, clave):
+        with self._lock:
+            self._cache.pop(clave, None)
+
+    # ---------- API de caché ----------
+
+    def get(self, key, default=None, version=None):
+        clave = self.make_and_validate_key(key, version=version)
+        self._revisar_version()
+        datos = self._l1_get(clave)
+        if datos is not None:
+            registrar_cache(1)
+            return pickle.loads(datos)
+
+        valor = self.l2.get(key, self._missing_key, version=version)
+        if valor is self._missing_key:
+            registrar_cache(0, 1)
+            return default
+        registrar_cache(1)
+        self._l1_set(clave, valor, espacio=self._espacio(key))
+        return valor
+
+    def get_many(self, keys, version=None):
+        self._revisar_version()
+        resultado = {}
+        faltantes = []
+        for key in keys:
+            datos = self._l1_get(self.make_and_validate_key(key, version=version))
+            if datos is not None:
+                resultado[key] = pickle.loads(datos)
+            else:
+                faltantes.append(key)
+        if faltantes:
+            desde_l2 = self.l2.get_many(faltantes, version=version)
+            for key, valor in desde_l2.items():
+                self._l1_set(self.make_and_validate_key(key, version=version), valor,
+                             espacio=self._espacio(key))
+            resultado.update(desde_l2)
+        registrar_cache(len(resultado), len(keys) - len(resultado))
+        return resultado
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        clave = self.make_and_validate_key(key, version=version)
+        espacio = self._espacio(key)
+        self.l2.set(key, value, timeout, version=version)
+        self._l1_set(clave, value, timeout, espacio)
+        self._publicar_version([espacio])
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        fallidas = self.l2.set_many(data, timeout, version=version)
+        for key, value in data.items():
+            if key not in fallidas:
+                self._l1_set(self.make_and_validate_key(key, version=version), value, timeout,
+                             self._espacio(key))
+        self._publicar_version(self._espacio(key) for key in data)
+        return fallidas
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        return self.l2.add(key, value, timeout, version=version)
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        return self.l2.touch(key, timeout, version=version)
+
+    def delete(self, key, version=None):
+        self._l1_delete(self.make_and_validate_key(key, version=version))
+        borrado = self.l2.delete(key, version=version)
+        self._publicar_version([self._espacio(key)])
+        return borrado
+
+    def delete_many(self, keys, version=None):
+        for key in keys:
+            self._l1_delete(self.make_and_validate_key(key, version=version))
+        self.l2.delete_many(keys, version=version)
+        self._publicar_version(self._espacio(key) for key in keys)
+
+    def has_key(self, key, version=None):
+        self._revisar_version()
+        if self._l1_get(self.make_and_validate_key(key, version=version)) is not None:
+            return True
+        return self.l2.has_key(key, version=version)
+
+    def incr(self, key, delta=1, version=None):
+        self._l1_delete(self.make_and_validate_key(key, version=version))
+        return self.l2.incr(key, delta, version=version)
+
+    def decr(self, key, delta=1, version=None):
+        self._l1_delete(self.make_and_validate_key(key, version=version))
+        return self.l2.decr(key, delta, version=version)
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+        self.l2.clear()
+        self._publicar_version([TODO])
+
+    def limpiar_l1(self):
+        """Vacía solo el L1 de este proceso"""
+        with self._lock:
+            self._cache.clear()
+            self._estado['proxima_revision'] = 0.0
@@ -0,0 +1,187 @@
+import os
+import threading
+import time
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from django.conf import settings
+
+# Respuestas que se reintentan (con espera creciente)
+ESTADOS_REINTENTO = (429, 500, 502, 503, 504)
+
+# Sesión HTTP compartida por proceso (keep-alive + reintentos acotados)
+_sesion = None
+_sesion_pid = None
+_sesion_lock = threading.Lock()
+
+
+def obtener_sesion():
+    """
+    Retorna la sesión HTTP del proceso, creándola la primera vez.
+    Tras un fork (gunicorn --preload) cada worker crea la suya.
+    """
+    global _sesion, _sesion_pid
+    if _sesion is None or _sesion_pid != os.getpid():
+        with _sesion_lock:
+            if _sesion is None or _sesion_pid != os.getpid():
+                reintentos = Retry(
+                    total=settings.WEATHER_HTTP_RETRIES,
+                    backoff_factor=0.2,
+                    status_forcelist=ESTADOS_REINTENTO,
+                    allowed_methods=frozenset(['GET']),
+                    raise_on_status=False,
+                )
+                adaptador = HTTPAdapter(
+                    pool_connections=4,
+                    pool_maxsize=settings.WEATHER_MAX_WORKERS,
+                    max_retries=reintentos,
+                )
+                sesion = requests.Session()
+                sesion.mount('http://', adaptador)
+                sesion.mount('https://', adaptador)
+                _sesion, _sesion_pid = sesion, os.getpid()
+    return _sesion
+
+
+# Cliente async del lote de consultas en curso. Un httpx.AsyncClient no se
+# puede compartir entre event loops y con WSGI cada vista async corre en un
+# loop propio: se crea por lote y se cierra al terminar, con su pool.
+_cliente_actual = ContextVar('cliente_http_async', default=None)
+
+
+@asynccontextmanager
+async def cliente_async():
+    """
+    Cliente HTTP async (keep-alive y reintentos de conexión) para las
+    consultas dentro del bloque; si ya hay uno abierto en el contexto, se
+    usa ese. Los 5xx se reintentan en quien lo usa.
+    """
+    actual = _cliente_actual.get()
+    if actual is not None:
+        yield actual
+        return
+    async with httpx.AsyncClient(
+        transport=httpx.AsyncHTTPTransport(
+            retries=settings.WEATHER_HTTP_RETRIES,
+            limits=httpx.Limits(max_connections=settings.WEATHER_MAX_WORKERS, max_keepalive_connections=4),
+        ),
+        timeout=httpx.Timeout(settings.WEATHER_READ_TIMEOUT, connect=settings.WEATHER_CONNECT_TIMEOUT),
+    ) as cliente:
+        token = _cliente_actual.set(cliente)
+        try:
+            yield cliente
+        finally:
+            _cliente_actual.reset(token)
+
+
+class CircuitoAbiertoError(Exception):
+    """La API externa está marcada como no disponible"""
+
+
+class CircuitBreaker:
+    """
+    Corta las llamadas a un servicio externo tras varios fallos seguidos.
+
+    cerrado -> abierto tras `umbral_fallos` fallos consecutivos.
+    abierto -> semiabierto pasados `tiempo_espera` segundos; se deja pasar
+    una sola llamada de prueba. Si funciona vuelve a cerrado, si no, a abierto.
+    Si la prueba no informa su resultado en `plazo_prueba` segundos (por
+    defecto `tiempo_espera`) se da por perdida y se deja pasar otra.
+    """
+    CERRADO = 'cerrado'
+    ABIERTO = 'abierto'
+    SEMIABIERTO = 'semiabierto'
+
+    def __init__(self, nombre, umbral_fallos, tiempo_espera, plazo_prueba=None):
+        self.nombre = nombre
+        self.umbral_fallos = umbral_fallos
+        self.tiempo_espera = tiempo_espera
+        self.plazo_prueba = tiempo_espera if plazo_prueba is None else plazo_prueba
+        self._lock = threading.Lock()
+        self._estado = self.CERRADO
+        self._fallos = 0
+        self._abierto_desde = 0.0
+        self._prueba_en_curso = False
+        self._prueba_desde = 0.0
+        # Contadores acumulados por proceso
+        self.transiciones = {self.CERRADO: 0, self.ABIERTO: 0, self.SEMIABIERTO: 0}
+        self.rechazos = 0
+
+    @property
+    def estado(self):
+        return self._estado
+
+    def _cambiar_estado(self, estado):
+        self._estado = estado
+        self.transiciones[estado] += 1
+
+    def permitir(self):
+        with self._lock:
+            if self._estado == self.ABIERTO:
+                if time.monotonic() - self._abierto_desde < self.tiempo_espera:
+                    self.rechazos += 1
+                    return False
+                self._cambiar_estado(self.SEMIABIERTO)
+                self._prueba_en_curso = False
+
+            if self._estado == self.SEMIABIERTO:
+                if self._prueba_en_curso and time.monotonic() - self._prueba_desde < self.plazo_prueba:
+                    self.rechazos += 1
+                    return False
+                self._prueba_en_curso = True
+                self._prueba_desde = time.monotonic()
+            return True
+
+    def registrar_exito(self):
+        with self._lock:
+            self._fallos = 0
+            if self._estado != self.CERRADO:
+                self._prueba_en_curso = False
+                self._cambiar_estado(self.CERRADO)
+
+    def registrar_fallo(self):
+        with self._lock:
+            self._fallos += 1
+            if self._estado == self.SEMIABIERTO or (
+                self._estado == self.CERRADO and self._fallos >= self.umbral_fallos
+            ):
+                self._prueba_en_curso = False
+                self._abierto_desde = time.monotonic()
+                self._cambiar_estado(self.ABIERTO)
+
+    def reiniciar(self):
+        with self._lock:
+            self._estado = self.CERRADO
+            self._fallos = 0
+            self._prueba_en_curso = False
+
+    def metricas(self):
+        """
+        Estado y contadores en formato de texto de Prometheus
+        """
+        with self._lock:
+            lineas = [
+                '# HELP circuit_breaker_estado Estado actual del circuit breaker (1 = activo)',
+                '# TYPE circuit_breaker_estado gauge',
+            ]
+            for estado in (self.CERRADO, self.ABIERTO, self.SEMIABIERTO):
+                valor = 1 if self._estado == estado else 0
+                lineas.append(f'circuit_breaker_estado{{circuito="{self.nombre}",estado="{estado}"}} {valor}')
+            lineas += [
+                '# HELP circuit_breaker_transiciones_total Cambios de estado desde el inicio del proceso',
+                '# TYPE circuit_breaker_transiciones_total counter',
+            ]
+            for estado, total in self.transiciones.items():
+                lineas.append(
+                    f'circuit_breaker_transiciones_total{{circuito="{self.nombre}",estado="{estado}"}} {total}'
+                )
+            lineas += [
+                '# HELP circuit_breaker_rechazos_total Llamadas rechazadas sin contactar al servicio',
+                '# TYPE circuit_breaker_rechazos_total counter',
+                f'circuit_breaker_rechazos_total{{circuito="{self.nombre}"}} {self.rechazos}',
+            ]
+            return '\n'.join(lineas) + '\n'
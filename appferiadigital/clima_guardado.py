@@ -0,0 +1,223 @@
+"""
+Clima y pronóstico guardados en la base de datos.
+
+Un trabajo periódico (manage.py actualizar_clima) resuelve una sola vez la
+ciudad de OpenWeatherMap de cada feria (Feria.id_ciudad_clima) y luego
+guarda por ciudad el clima actual (ClimaSnapshot, con /group: hasta
+WEATHER_GRUPO_MAXIMO ciudades por llamada) y el pronóstico cada 3 horas
+(ClimaPronostico, con /forecast). Las vistas leen el clima junto con la
+feria (select_related) y el pronóstico con una consulta por índice, sin
+llamar a la API durante la petición.
+
+Las ferias sin ciudad resuelta, o cuyo clima guardado tiene más de
+WEATHER_CACHE_STALE_TIMEOUT segundos, siguen usando ClimaService (caché
+con stale-while-revalidate).
+"""
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+import requests
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .cliente_http import CircuitoAbiertoError
+from .clima_service import ClimaService, _en_hilo
+from .models import ClimaPronostico, ClimaSnapshot, Feria
+
+logger = logging.getLogger(__name__)
+
+ERRORES_API = (CircuitoAbiertoError, requests.exceptions.RequestException, KeyError, ValueError)
+HORA_DEL_DIA = 13  # El ícono y la descripción del día son los de la hora más cercana
+
+
+# ---------- Ingesta (manage.py actualizar_clima) ----------
+
+def _snapshot(datos, ahora):
+    return ClimaSnapshot(
+        id_ciudad=datos['id'], nombre=datos['name'],
+        clima=ClimaService.procesar_clima(datos), actualizado=ahora,
+    )
+
+
+def _guardar_snapshots(snapshots):
+    ClimaSnapshot.objects.bulk_create(
+        snapshots, update_conflicts=True, unique_fields=['id_ciudad'],
+        update_fields=['nombre', 'clima', 'actualizado'],
+    )
+
+
+def _parametros_lugar(lugar):
+    if isinstance(lugar, tuple):
+        return ClimaService._parametros_coordenadas(*ClimaService._centro_celda(*lugar))
+    return ClimaService._parametros_ciudad(lugar)
+
+
+def resolver_ciudades():
+    """
+    Busca la ciudad de OpenWeatherMap de las ferias que aún no la tienen:
+    una llamada a /weather por ciudad o celda, que además deja su clima
+    guardado. Retorna cuántas ferias quedaron resueltas.
+    """
+    pendientes = {}  # {lugar normalizado: (lugar, [id_feria])}
+    for feria in Feria.objects.filter(id_ciudad_clima__isnull=True).only('ciudad', 'latitud', 'longitud'):
+        lugar = feria.lugar_clima
+        if ClimaService._es_lugar(lugar):
+            pendientes.setdefault(ClimaService._normalizar_lugar(lugar), (lugar, []))[1].append(feria.id_feria)
+
+    resueltas = 0
+    ahora = timezone.now()
+    for lugar, ids in pendientes.values():
+        try:
+            snapshot = _snapshot(ClimaService._llamar_api(_parametros_lugar(lugar)), ahora)
+        except ERRORES_API as e:
+            logger.warning(f"No se pudo resolver la ciudad del clima para {lugar}: {e}")
+            continue
+        _guardar_snapshots([snapshot])
+        resueltas += Feria.objects.filter(id_feria__in=ids).update(id_ciudad_clima=snapshot.id_ciudad)
+    return resueltas
+
+
+def _ciudades_con_ferias():
+    return sorted(set(
+        Feria.objects.filter(id_ciudad_clima__isnull=False).values_list('id_ciudad_clima', flat=True)
+    ))
+
+
+def actualizar_snapshots():
+    """Clima actual de todas las ciudades con ferias, de a WEATHER_GRUPO_MAXIMO por llamada"""
+    ciudades = _ciudades_con_ferias()
+    actualizadas = 0
+    for inicio in range(0, len(ciudades), settings.WEATHER_GRUPO_MAXIMO):
+        lote = ciudades[inicio:inicio + settings.WEATHER_GRUPO_MAXIMO]
+        ahora = timezone.now()
+        try:
+            datos = ClimaService._llamar_api(ClimaService._parametros_ids(lote), settings.WEATHER_GROUP_URL)
+            snapshots = [_snapshot(ciudad, ahora) for ciudad in datos['list']]
+        except ERRORES_API as e:
+            logger.warning(f"No se pudo actualizar el clima de las ciudades {lote}: {e}")
+            continue
+        _guardar_snapshots(snapshots)
+        actualizadas += len(snapshots)
+    return actualizadas
+
+
+def _consultar_pronostico(id_ciudad):
+    try:
+        datos = ClimaService._llamar_api(ClimaService._parametros_ids([id_ciudad]), settings.WEATHER_FORECAST_URL)
+        return [
+            ClimaPronostico(
+                id_ciudad_id=id_ciudad,
+                fecha_hora=datetime.fromtimestamp(elemento['dt'], tz=dt_timezone.utc),
+                clima=ClimaService.procesar_pronostico(elemento),
+            )
+            for elemento in datos['list']
+        ]
+    except ERRORES_API as e:
+        logger.warning(f"No se pudo obtener el pronóstico de la ciudad {id_ciudad}: {e}")
+        return None
+
+
+def actualizar_pronosticos():
+    """
+    Reemplaza el pronóstico de cada ciudad con ferias (/forecast no acepta
+    varias ciudades: las llamadas se hacen en paralelo)
+    """
+    ciudades = _ciudades_con_ferias()
+    if not ciudades:
+        return 0
+    with ThreadPoolExecutor(max_workers=min(settings.WEATHER_MAX_WORKERS, len(ciudades))) as executor:
+        pronosticos = list(executor.map(lambda c: _en_hilo(_consultar_pronostico, c), ciudades))
+
+    actualizadas = 0
+    for id_ciudad, filas in zip(ciudades, pronosticos):
+        if filas is None:
+            continue
+        with transaction.atomic():
+            ClimaPronostico.objects.filter(id_ciudad=id_ciudad).delete()
+            ClimaPronostico.objects.bulk_create(filas)
+        actualizadas += 1
+    return actualizadas
+
+
+# ---------- Lectura (vistas) ----------
+
+def snapshot_vigente(snapshot):
+    return (
+        snapshot is not None
+        and timezone.now() - snapshot.actualizado <= timedelta(seconds=settings.WEATHER_CACHE_STALE_TIMEOUT)
+    )
+
+
+def _climas_guardados(ferias):
+    """
+    ({id_feria: clima} guardados, [ferias sin clima guardado vigente]).
+    Las ferias deben venir con select_related('id_ciudad_clima').
+    """
+    climas, faltantes = {}, []
+    for feria in ferias:
+        if snapshot_vigente(feria.id_ciudad_clima):
+            climas[feria.id_feria] = feria.id_ciudad_clima.clima
+        elif feria.lugar_clima:
+            faltantes.append(feria)
+    return climas, faltantes
+
+
+def climas_de_ferias(ferias):
+    """{id_feria: clima}: el guardado o, si no hay, el de ClimaService"""
+    climas, faltantes = _climas_guardados(ferias)
+    if faltantes:
+        en_cache = ClimaService.obtener_clima_multiple([f.lugar_clima for f in faltantes])
+        climas.update((f.id_feria, en_cache[f.lugar_clima]) for f in faltantes if f.lugar_clima in en_cache)
+    return climas
+
+
+async def climas_de_ferias_async(ferias):
+    climas, faltantes = _climas_guardados(ferias)
+    if faltantes:
+        en_cache = await ClimaService.obtener_clima_multiple_async([f.lugar_clima for f in faltantes])
+        climas.update((f.id_feria, en_cache[f.lugar_clima]) for f in faltantes if f.lugar_clima in en_cache)
+    return climas
+
+
+async def clima_de_feria_async(feria):
+    if snapshot_vigente(feria.id_ciudad_clima):
+        return feria.id_ciudad_clima.clima
+    if feria.lugar_clima:
+        return await ClimaService.obtener_clima_async(feria.lugar_clima)
+    return None
+
+
+def pronostico_por_dia(id_ciudad):
+    """
+    [{'fecha', 'minima', 'maxima', 'probabilidad_lluvia', 'descripcion',
+    'icono'}] desde hoy, en hora local
+    """
+    dias = {}
+    filas = ClimaPronostico.objects.filter(
+        id_ciudad=id_ciudad, fecha_hora__gte=timezone.now()
+    ).order_by('fecha_hora').values_list('fecha_hora', 'clima')
+    for fecha_hora, clima in filas:
+        local = timezone.localtime(fecha_hora)
+        distancia = abs(local.hour - HORA_DEL_DIA)
+        dia = dias.get(local.date())
+        if dia is None:
+            dias[local.date()] = {
+                'fecha': local.date(),
+                'minima': clima['temperatura'],
+                'maxima': clima['temperatura'],
+                'probabilidad_lluvia': clima['probabilidad_lluvia'],
+                'descripcion': clima['descripcion'],
+                'icono': clima['icono'],
+                '_distancia': distancia,
+            }
+            continue
+        dia['minima'] = min(dia['minima'], clima['temperatura'])
+        dia['maxima'] = max(dia['maxima'], clima['temperatura'])
+        dia['probabilidad_lluvia'] = max(dia['probabilidad_lluvia'], clima['probabilidad_lluvia'])
+        if distancia < dia['_distancia']:
+            dia.update(descripcion=clima['descripcion'], icono=clima['icono'], _distancia=distancia)
+    for dia in dias.values():
+        del dia['_distancia']
+    return list(dias.values())
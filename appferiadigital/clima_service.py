@@ -1,68 +1,605 @@
 import requests
+import httpx
 import json
+import math
+import time
+import asyncio
+import contextvars
+import threading
+from collections import OrderedDict
+from asgiref.sync import sync_to_async
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
 from django.core.cache import cache
 from django.conf import settings
+from django.db import connections
 import logging
+from .cliente_http import (
+    ESTADOS_REINTENTO, CircuitBreaker, CircuitoAbiertoError, cliente_async, obtener_sesion,
+)
+from .metricas import registrar_http
 
 logger = logging.getLogger(__name__)
 
+circuito_clima = CircuitBreaker(
+    'openweathermap',
+    umbral_fallos=settings.WEATHER_CIRCUIT_FAILURES,
+    tiempo_espera=settings.WEATHER_CIRCUIT_RESET,
+)
+
+# Último clima obtenido por clave, para responder mientras la API no está
+# disponible. LRU de a lo más WEATHER_ULTIMOS_MAXIMO lugares.
+_ultimos_climas = OrderedDict()
+_ultimos_lock = threading.Lock()
+
+
+def _recordar_clima(cache_key, clima):
+    with _ultimos_lock:
+        _ultimos_climas[cache_key] = clima
+        _ultimos_climas.move_to_end(cache_key)
+        while len(_ultimos_climas) > settings.WEATHER_ULTIMOS_MAXIMO:
+            _ultimos_climas.popitem(last=False)
+
+
+def _ultimo_clima(cache_key):
+    with _ultimos_lock:
+        clima = _ultimos_climas.get(cache_key)
+        if clima is not None:
+            _ultimos_climas.move_to_end(cache_key)
+        return clima
+
+
+def _en_hilo(funcion, *args):
+    """
+    Ejecuta `funcion` en un hilo del pool y cierra las conexiones a la BD
+    que haya abierto (la caché L2 vive en la base de datos).
+    """
+    try:
+        return funcion(*args)
+    finally:
+        connections.close_all()
+
+
+# Hilos para refrescar en segundo plano las entradas vencidas (stale-while-revalidate)
+_refresco_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='clima-refresco')
+
+
 class ClimaService:
+    """
+    Clima por lugar: el nombre de una ciudad o coordenadas (lat, lon). Las
+    coordenadas se agrupan en celdas de WEATHER_CELDA_GRADOS y se consulta
+    el centro de la celda: las ferias cercanas comparten una sola llamada a
+    la API y una sola entrada de caché.
+    """
+
+    @staticmethod
+    def obtener_clima(lugar):
+        if isinstance(lugar, tuple):
+            return ClimaService.obtener_clima_por_coordenadas(*lugar)
+        return ClimaService.obtener_clima_por_ciudad(lugar)
+
     @staticmethod
     def obtener_clima_por_ciudad(ciudad):
         """
         Obtiene el clima actual para una ciudad específica
         """
-        cache_key = f"clima_{ciudad.lower().replace(' ', '_')}"
-        
-        # Intentar obtener de caché primero
-        clima_cache = cache.get(cache_key)
-        if clima_cache:
-            return clima_cache
-        
+        cache_key = ClimaService._clave_cache_ciudad(ciudad)
+        return ClimaService._obtener_con_cache(
+            cache_key, lambda: ClimaService._consultar_clima_ciudad(ciudad)
+        )
+
+    @staticmethod
+    def refrescar_clima(lugar):
+        """
+        Consulta la API y reemplaza la entrada en caché aunque siga vigente
+        """
+        cache_key = ClimaService._clave_cache(lugar)
+        clima = ClimaService._consultar(lugar)
+        if clima:
+            ClimaService._guardar_en_cache(cache_key, clima)
+            _recordar_clima(cache_key, clima)
+        return clima
+
+    @staticmethod
+    def refrescar_clima_ciudad(ciudad):
+        return ClimaService.refrescar_clima(ciudad)
+
+    @staticmethod
+    def _consultar(lugar):
+        if isinstance(lugar, tuple):
+            return ClimaService._consultar_clima_coordenadas(*ClimaService._centro_celda(*lugar))
+        return ClimaService._consultar_clima_ciudad(lugar)
+
+    @staticmethod
+    def _consultar_clima_ciudad(ciudad):
+        """
+        Llama a OpenWeatherMap para una ciudad, sin pasar por la caché
+        """
         try:
-            url = f"http://api.openweathermap.org/data/2.5/weather"
-            params = {
-                'q': f"{ciudad},CL",  # CL para Chile
-                'appid': settings.OPENWEATHERMAP_API_KEY,
-                'units': 'metric',  # Para temperatura en Celsius
-                'lang': 'es'
-            }
-            
-            response = requests.get(url, params=params, timeout=10)
-            response.raise_for_status()
-            
-            datos = response.json()
-            
-            # Procesar los datos del clima
-            clima = {
-                'temperatura': round(datos['main']['temp'], 1),
-                'sensacion_termica': round(datos['main']['feels_like'], 1),
-                'humedad': datos['main']['humidity'],
-                'descripcion': datos['weather'][0]['description'].capitalize(),
-                'icono': datos['weather'][0]['icon'],
-                'viento_velocidad': round(datos['wind']['speed'] * 3.6, 1),  # Convertir a km/h
-                'viento_direccion': ClimaService._obtener_direccion_viento(datos['wind'].get('deg', 0)),
-                'presion': datos['main']['pressure'],
-                'visibilidad': datos.get('visibility', 0) / 1000 if datos.get('visibility') else None,
-                'ciudad': datos['name'],
-                'pais': datos['sys']['country'],
-                'amanecer': datos['sys']['sunrise'],
-                'atardecer': datos['sys']['sunset'],
-                'hora_actualizacion': datos['dt']
-            }
-            
-            # Guardar en caché
-            cache.set(cache_key, clima, settings.WEATHER_CACHE_TIMEOUT)
-            
-            return clima
-            
+            datos = ClimaService._llamar_api(ClimaService._parametros_ciudad(ciudad))
+            return ClimaService.procesar_clima(datos)
+        except CircuitoAbiertoError:
+            logger.debug(f"Circuito abierto, se omite consulta de clima para {ciudad}")
+            return None
         except requests.exceptions.RequestException as e:
             logger.error(f"Error al obtener clima para {ciudad}: {e}")
             return None
         except KeyError as e:
             logger.error(f"Error en la estructura de datos del clima: {e}")
             return None
-    
+
+    @staticmethod
+    def _parametros_ciudad(ciudad):
+        return {
+            'q': f"{ciudad},CL",  # CL para Chile
+            'appid': settings.OPENWEATHERMAP_API_KEY,
+            'units': 'metric',  # Para temperatura en Celsius
+            'lang': 'es'
+        }
+
+    @staticmethod
+    def _procesar_condiciones(datos):
+        """Campos comunes al clima actual y a cada elemento del pronóstico"""
+        return {
+            'temperatura': round(datos['main']['temp'], 1),
+            'sensacion_termica': round(datos['main']['feels_like'], 1),
+            'humedad': datos['main']['humidity'],
+            'descripcion': datos['weather'][0]['description'].capitalize(),
+            'icono': datos['weather'][0]['icon'],
+            'viento_velocidad': round(datos['wind']['speed'] * 3.6, 1),  # Convertir a km/h
+            'viento_direccion': ClimaService._obtener_direccion_viento(datos['wind'].get('deg', 0)),
+            'presion': datos['main']['pressure'],
+        }
+
+    @staticmethod
+    def procesar_clima(datos):
+        """
+        Clima actual desde una respuesta de /weather o un elemento de /group
+        (el mismo formato se guarda en ClimaSnapshot)
+        """
+        return {
+            **ClimaService._procesar_condiciones(datos),
+            'visibilidad': datos.get('visibility', 0) / 1000 if datos.get('visibility') else None,
+            'ciudad': datos['name'],
+            'pais': datos['sys']['country'],
+            'amanecer': datos['sys']['sunrise'],
+            'atardecer': datos['sys']['sunset'],
+            'hora_actualizacion': datos['dt']
+        }
+
+    @staticmethod
+    def procesar_pronostico(datos):
+        """Un elemento (cada 3 horas) de /forecast"""
+        return {
+            **ClimaService._procesar_condiciones(datos),
+            'probabilidad_lluvia': round(datos.get('pop', 0) * 100),
+        }
+
+    @staticmethod
+    def _llamar_api(params, url=None):
+        """
+        GET a OpenWeatherMap (por defecto a WEATHER_API_URL) con la sesión
+        compartida, pasando por el circuit breaker
+        """
+        if not circuito_clima.permitir():
+            raise CircuitoAbiertoError(circuito_clima.nombre)
+
+        inicio = time.perf_counter()
+        try:
+            try:
+                response = obtener_sesion().get(
+                    url or settings.WEATHER_API_URL,
+                    params=params,
+                    timeout=(settings.WEATHER_CONNECT_TIMEOUT, settings.WEATHER_READ_TIMEOUT),
+                )
+            finally:
+                registrar_http(time.perf_counter() - inicio)
+            response.raise_for_status()
+            datos = response.json()
+        except requests.exceptions.HTTPError as e:
+            # Un 4xx (ciudad inexistente, API key inválida) no indica que la API esté caída
+            if e.response is not None and e.response.status_code < 500:
+                circuito_clima.registrar_exito()
+            else:
+                circuito_clima.registrar_fallo()
+            raise
+        except BaseException:
+            # Errores de red, JSON inválido o cancelación: la prueba del
+            # semiabierto también debe terminar
+            circuito_clima.registrar_fallo()
+            raise
+
+        circuito_clima.registrar_exito()
+        return datos
+
+    # ========== CACHÉ CON VENCIMIENTO SUAVE Y DURO ==========
+    #
+    # Cada entrada guarda el clima y su vencimiento suave. La caché la
+    # elimina al llegar al vencimiento duro (WEATHER_CACHE_STALE_TIMEOUT).
+    # Entre ambos se sirve el dato viejo y se refresca en segundo plano.
+
+    @staticmethod
+    def _entrada_cache(clima):
+        return {
+            'clima': clima,
+            'expira_suave': time.time() + settings.WEATHER_CACHE_TIMEOUT,
+        }
+
+    @staticmethod
+    def _guardar_en_cache(cache_key, clima):
+        cache.set(cache_key, ClimaService._entrada_cache(clima), settings.WEATHER_CACHE_STALE_TIMEOUT)
+
+    @staticmethod
+    def _leer_entrada(entrada):
+        """
+        Retorna (clima, vencido) a partir de una entrada de caché
+        """
+        if not entrada:
+            return None, False
+        return entrada['clima'], time.time() >= entrada['expira_suave']
+
+    @staticmethod
+    def _tomar_lock(cache_key):
+        # cache.add es atómico: solo un proceso obtiene el lock por ciudad
+        return cache.add(f"lock_{cache_key}", 1, settings.WEATHER_LOCK_TIMEOUT)
+
+    @staticmethod
+    def _liberar_lock(cache_key):
+        cache.delete(f"lock_{cache_key}")
+
+    @staticmethod
+    def _refrescar_con_lock(cache_key, consultar):
+        try:
+            clima = consultar()
+            if clima:
+                ClimaService._guardar_en_cache(cache_key, clima)
+                _recordar_clima(cache_key, clima)
+                return clima
+            return _ultimo_clima(cache_key)
+        finally:
+            ClimaService._liberar_lock(cache_key)
+
+    @staticmethod
+    def _programar_refresco(cache_key, consultar):
+        """
+        Refresca una entrada vencida en segundo plano, una sola vez por ciudad
+        """
+        if ClimaService._tomar_lock(cache_key):
+            _refresco_executor.submit(_en_hilo, ClimaService._refrescar_con_lock, cache_key, consultar)
+
+    @staticmethod
+    def _obtener_con_cache(cache_key, consultar):
+        clima, vencido = ClimaService._leer_entrada(cache.get(cache_key))
+        if clima:
+            if vencido:
+                ClimaService._programar_refresco(cache_key, consultar)
+            return clima
+
+        if ClimaService._tomar_lock(cache_key):
+            return ClimaService._refrescar_con_lock(cache_key, consultar)
+
+        # Otro hilo o proceso ya está consultando esta ciudad: esperar su resultado
+        limite = time.monotonic() + settings.WEATHER_LOCK_WAIT
+        while time.monotonic() < limite:
+            time.sleep(0.1)
+            clima, _ = ClimaService._leer_entrada(cache.get(cache_key))
+            if clima:
+                return clima
+        return _ultimo_clima(cache_key)
+
+    @staticmethod
+    def _normalizar_ciudad(ciudad):
+        """
+        Normaliza el nombre de una ciudad para usarlo como clave
+        """
+        return ' '.join(ciudad.split()).lower().replace(' ', '_')
+
+    @staticmethod
+    def _clave_cache_ciudad(ciudad):
+        return f"clima_{ClimaService._normalizar_ciudad(ciudad)}"
+
+    @staticmethod
+    def celda(lat, lon):
+        """Índices de la celda de la grilla que contiene el punto"""
+        tamano = settings.WEATHER_CELDA_GRADOS
+        return math.floor(float(lat) / tamano), math.floor(float(lon) / tamano)
+
+    @staticmethod
+    def _centro_celda(lat, lon):
+        tamano = settings.WEATHER_CELDA_GRADOS
+        return tuple(round((i + 0.5) * tamano, 4) for i in ClimaService.celda(lat, lon))
+
+    @staticmethod
+    def _normalizar_lugar(lugar):
+        if isinstance(lugar, tuple):
+            return 'celda:{}:{}'.format(*ClimaService.celda(*lugar))
+        return ClimaService._normalizar_ciudad(lugar)
+
+    @staticmethod
+    def _clave_cache(lugar):
+        return f"clima_{ClimaService._normalizar_lugar(lugar)}"
+
+    @staticmethod
+    def _es_lugar(lugar):
+        return isinstance(lugar, tuple) or bool(lugar and lugar.strip())
+
+    @staticmethod
+    def obtener_clima_multiple(ciudades, timeout=None):
+        """
+        Obtiene el clima de varias ciudades (o lugares) en paralelo.
+
+        Las ciudades se deduplican por nombre normalizado y las coordenadas
+        por celda, los aciertos de
+        caché se leen en una sola llamada y las faltas se consultan en un
+        pool de hilos acotado. Pasado el plazo total (`timeout`, por defecto
+        WEATHER_BATCH_TIMEOUT) se devuelve lo que haya terminado; las
+        consultas pendientes siguen en segundo plano y llenan la caché.
+
+        Retorna un diccionario {ciudad original: clima}.
+        """
+        if timeout is None:
+            timeout = settings.WEATHER_BATCH_TIMEOUT
+
+        originales = ClimaService._agrupar_ciudades(ciudades)
+        if not originales:
+            return {}
+
+        claves = {f"clima_{n}": n for n in originales}
+        climas, vencidas = ClimaService._leer_en_cache(cache.get_many(list(claves)), claves)
+        for cache_key, normalizada in vencidas:
+            ClimaService._refrescar_en_segundo_plano(cache_key, originales[normalizada][0])
+
+        faltantes = [n for n in originales if n not in climas]
+        if faltantes:
+            max_workers = min(settings.WEATHER_MAX_WORKERS, len(faltantes))
+            executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='clima')
+            try:
+                futuros = {
+                    # Con el contexto de la petición, para atribuirle las métricas HTTP
+                    executor.submit(
+                        contextvars.copy_context().run,
+                        _en_hilo, ClimaService.obtener_clima, originales[n][0]
+                    ): n
+                    for n in faltantes
+                }
+                limite = time.monotonic() + timeout
+                pendientes = set(futuros)
+                while pendientes:
+                    restante = limite - time.monotonic()
+                    if restante <= 0:
+                        break
+                    listos, pendientes = wait(pendientes, timeout=restante, return_when=FIRST_COMPLETED)
+                    for futuro in listos:
+                        try:
+                            clima = futuro.result()
+                        except Exception as e:
+                            logger.error(f"Error al obtener clima para {futuros[futuro]}: {e}")
+                            continue
+                        if clima:
+                            climas[futuros[futuro]] = clima
+                if pendientes:
+                    logger.warning(
+                        f"Plazo de {timeout}s agotado; {len(pendientes)} ciudades sin clima"
+                    )
+            finally:
+                # No bloquear la respuesta esperando a los hilos rezagados; las
+                # consultas aún en cola no se cancelan y terminan llenando la caché
+                executor.shutdown(wait=False)
+
+        return ClimaService._por_original(climas, originales)
+
+    @staticmethod
+    def _agrupar_ciudades(ciudades):
+        """{ciudad normalizada o celda: [lugares originales]}"""
+        originales = {}
+        for lugar in ciudades:
+            if ClimaService._es_lugar(lugar):
+                originales.setdefault(ClimaService._normalizar_lugar(lugar), []).append(lugar)
+        return originales
+
+    @staticmethod
+    def _leer_en_cache(en_cache, claves):
+        """({normalizada: clima}, [(cache_key, normalizada) vencidas])"""
+        climas, vencidas = {}, []
+        for cache_key, normalizada in claves.items():
+            clima, vencido = ClimaService._leer_entrada(en_cache.get(cache_key))
+            if clima:
+                climas[normalizada] = clima
+                if vencido:
+                    vencidas.append((cache_key, normalizada))
+        return climas, vencidas
+
+    @staticmethod
+    def _refrescar_en_segundo_plano(cache_key, lugar):
+        ClimaService._programar_refresco(cache_key, lambda: ClimaService._consultar(lugar))
+
+    @staticmethod
+    def _por_original(climas, originales):
+        return {
+            original: clima
+            for normalizada, clima in climas.items()
+            for original in originales[normalizada]
+        }
+
+    # ========== VERSIÓN ASYNC (vistas async con ASGI) ==========
+    #
+    # Misma caché, locks, circuit breaker y último clima conocido que la
+    # versión con hilos, pero la espera de la API no ocupa un hilo: las
+    # ciudades se consultan a la vez con httpx y asyncio.gather. Los
+    # refrescos en segundo plano siguen usando el pool de hilos.
+
+    @staticmethod
+    async def _llamar_api_async(params):
+        if not circuito_clima.permitir():
+            raise CircuitoAbiertoError(circuito_clima.nombre)
+
+        inicio = time.perf_counter()
+        try:
+            try:
+                async with cliente_async() as cliente:
+                    for intento in range(settings.WEATHER_HTTP_RETRIES + 1):
+                        response = await cliente.get(settings.WEATHER_API_URL, params=params)
+                        if response.status_code not in ESTADOS_REINTENTO or intento == settings.WEATHER_HTTP_RETRIES:
+                            break
+                        await asyncio.sleep(0.2 * 2 ** intento)
+            finally:
+                registrar_http(time.perf_counter() - inicio)
+            response.raise_for_status()
+            datos = response.json()
+        except httpx.HTTPStatusError as e:
+            # Un 4xx (ciudad inexistente, API key inválida) no indica que la API esté caída
+            if e.response.status_code < 500:
+                circuito_clima.registrar_exito()
+            else:
+                circuito_clima.registrar_fallo()
+            raise
+        except BaseException:
+            # Incluye la cancelación por wait_for: si no, una prueba del
+            # semiabierto cancelada dejaría el circuito sin probar más
+            circuito_clima.registrar_fallo()
+            raise
+
+        circuito_clima.registrar_exito()
+        return datos
+
+    @staticmethod
+    async def _consultar_async(params, lugar):
+        try:
+            datos = await ClimaService._llamar_api_async(params)
+            return ClimaService.procesar_clima(datos)
+        except CircuitoAbiertoError:
+            logger.debug(f"Circuito abierto, se omite consulta de clima para {lugar}")
+            return None
+        except httpx.HTTPError as e:
+            logger.error(f"Error al obtener clima para {lugar}: {e}")
+            return None
+        except (KeyError, ValueError) as e:
+            logger.error(f"Error en la estructura de datos del clima: {e}")
+            return None
+
+    @staticmethod
+    async def _consultar_clima_ciudad_async(ciudad):
+        return await ClimaService._consultar_async(ClimaService._parametros_ciudad(ciudad), ciudad)
+
+    @staticmethod
+    async def _consultar_clima_coordenadas_async(lat, lon):
+        return await ClimaService._consultar_async(
+            ClimaService._parametros_coordenadas(lat, lon), f"coordenadas {lat},{lon}"
+        )
+
+    @staticmethod
+    async def obtener_clima_async(lugar):
+        if isinstance(lugar, tuple):
+            return await ClimaService.obtener_clima_por_coordenadas_async(*lugar)
+        return await ClimaService.obtener_clima_por_ciudad_async(lugar)
+
+    @staticmethod
+    async def obtener_clima_por_ciudad_async(ciudad):
+        return await ClimaService._obtener_con_cache_async(
+            ciudad, lambda: ClimaService._consultar_clima_ciudad_async(ciudad)
+        )
+
+    @staticmethod
+    async def obtener_clima_por_coordenadas_async(lat, lon):
+        centro = ClimaService._centro_celda(lat, lon)
+        return await ClimaService._obtener_con_cache_async(
+            (lat, lon), lambda: ClimaService._consultar_clima_coordenadas_async(*centro)
+        )
+
+    @staticmethod
+    async def _obtener_con_cache_async(lugar, consultar):
+        cache_key = ClimaService._clave_cache(lugar)
+        clima, vencido = ClimaService._leer_entrada(await cache.aget(cache_key))
+        if clima:
+            if vencido:
+                await sync_to_async(ClimaService._refrescar_en_segundo_plano)(cache_key, lugar)
+            return clima
+
+        lock = f"lock_{cache_key}"
+        if await cache.aadd(lock, 1, settings.WEATHER_LOCK_TIMEOUT):
+            try:
+                clima = await consultar()
+                if clima:
+                    await cache.aset(cache_key, ClimaService._entrada_cache(clima),
+                                     settings.WEATHER_CACHE_STALE_TIMEOUT)
+                    _recordar_clima(cache_key, clima)
+                    return clima
+                return _ultimo_clima(cache_key)
+            finally:
+                await cache.adelete(lock)
+
+        # Otra petición ya está consultando este lugar: esperar su resultado
+        limite = time.monotonic() + settings.WEATHER_LOCK_WAIT
+        while time.monotonic() < limite:
+            await asyncio.sleep(0.1)
+            clima, _ = ClimaService._leer_entrada(await cache.aget(cache_key))
+            if clima:
+                return clima
+        return _ultimo_clima(cache_key)
+
+    @staticmethod
+    async def obtener_clima_multiple_async(ciudades, timeout=None):
+        """
+        Como obtener_clima_multiple, con a lo más WEATHER_MAX_WORKERS
+        consultas a la vez. Cada ciudad tiene el plazo total (`timeout`); las
+        que no terminan a tiempo se cancelan en vez de seguir en segundo plano.
+        """
+        if timeout is None:
+            timeout = settings.WEATHER_BATCH_TIMEOUT
+
+        originales = ClimaService._agrupar_ciudades(ciudades)
+        if not originales:
+            return {}
+
+        claves = {f"clima_{n}": n for n in originales}
+        climas, vencidas = ClimaService._leer_en_cache(await cache.aget_many(list(claves)), claves)
+        for cache_key, normalizada in vencidas:
+            await sync_to_async(ClimaService._refrescar_en_segundo_plano)(cache_key, originales[normalizada][0])
+
+        faltantes = [n for n in originales if n not in climas]
+        if faltantes:
+            cupos = asyncio.Semaphore(settings.WEATHER_MAX_WORKERS)
+
+            async def consultar(normalizada):
+                async with cupos:
+                    return await ClimaService.obtener_clima_async(originales[normalizada][0])
+
+            async def con_plazo(normalizada):
+                try:
+                    return await asyncio.wait_for(consultar(normalizada), timeout)
+                except asyncio.TimeoutError:
+                    return None
+                except Exception as e:
+                    logger.error(f"Error al obtener clima para {normalizada}: {e}")
+                    return None
+
+            # Un solo cliente (y pool de conexiones) para el lote
+            async with cliente_async():
+                resultados = await asyncio.gather(*(con_plazo(n) for n in faltantes))
+            for normalizada, clima in zip(faltantes, resultados):
+                if clima:
+                    climas[normalizada] = clima
+            sin_clima = len(faltantes) - sum(1 for clima in resultados if clima)
+            if sin_clima:
+                logger.warning(f"{sin_clima} ciudades sin clima (plazo de {timeout}s)")
+
+        return ClimaService._por_original(climas, originales)
+
+    @staticmethod
+    def marca_clima(ciudades):
+        """
+        Momento (epoch) en que se guardó el clima más reciente de estas
+        ciudades (o lugares), o 0 si ninguna está en caché. Solo lee la caché:
+        sirve para saber si una página con clima cambió sin consultar la API.
+        """
+        claves = {ClimaService._clave_cache(c) for c in ciudades if ClimaService._es_lugar(c)}
+        if not claves:
+            return 0
+        entradas = cache.get_many(list(claves)).values()
+        return max(
+            (e['expira_suave'] - settings.WEATHER_CACHE_TIMEOUT for e in entradas if e),
+            default=0,
+        )
+
     @staticmethod
     def _obtener_direccion_viento(grados):
         """
@@ -72,62 +609,55 @@ class ClimaService:
                       'S', 'SSO', 'SO', 'OSO', 'O', 'ONO', 'NO', 'NNO']
         idx = round(grados / (360. / len(direcciones))) % len(direcciones)
         return direcciones[idx]
-    
+
     @staticmethod
     def obtener_clima_por_coordenadas(lat, lon):
         """
-        Obtiene el clima por coordenadas (opcional)
+        Obtiene el clima de la celda que contiene las coordenadas
         """
-        cache_key = f"clima_{lat}_{lon}"
-        
-        clima_cache = cache.get(cache_key)
-        if clima_cache:
-            return clima_cache
-        
+        centro = ClimaService._centro_celda(lat, lon)
+        return ClimaService._obtener_con_cache(
+            ClimaService._clave_cache((lat, lon)), lambda: ClimaService._consultar_clima_coordenadas(*centro)
+        )
+
+    @staticmethod
+    def _parametros_coordenadas(lat, lon):
+        return {
+            'lat': lat,
+            'lon': lon,
+            'appid': settings.OPENWEATHERMAP_API_KEY,
+            'units': 'metric',
+            'lang': 'es'
+        }
+
+    @staticmethod
+    def _parametros_ids(ids):
+        """Para /group (IDs separados por coma) y /forecast (un ID)"""
+        return {
+            'id': ','.join(str(i) for i in ids),
+            'appid': settings.OPENWEATHERMAP_API_KEY,
+            'units': 'metric',
+            'lang': 'es'
+        }
+
+    @staticmethod
+    def _consultar_clima_coordenadas(lat, lon):
         try:
-            url = f"http://api.openweathermap.org/data/2.5/weather"
-            params = {
-                'lat': lat,
-                'lon': lon,
-                'appid': settings.OPENWEATHERMAP_API_KEY,
-                'units': 'metric',
-                'lang': 'es'
-            }
-            
-            response = requests.get(url, params=params, timeout=10)
-            response.raise_for_status()
-            
-            datos = response.json()
-            clima = ClimaService._procesar_datos_clima(datos)
-            
-            cache.set(cache_key, clima, settings.WEATHER_CACHE_TIMEOUT)
-            return clima
-            
+            datos = ClimaService._llamar_api(ClimaService._parametros_coordenadas(lat, lon))
+            return ClimaService.procesar_clima(datos)
+        except CircuitoAbiertoError:
+            logger.debug(f"Circuito abierto, se omite consulta de clima para {lat},{lon}")
+            return None
         except requests.exceptions.RequestException as e:
             logger.error(f"Error al obtener clima para coordenadas {lat},{lon}: {e}")
             return None
-    
-    @staticmethod
-    def _procesar_datos_clima(datos):
-        """
-        Procesa los datos crudos del clima
-        """
-        return {
-            'temperatura': round(datos['main']['temp'], 1),
-            'sensacion_termica': round(datos['main']['feels_like'], 1),
-            'humedad': datos['main']['humidity'],
-            'descripcion': datos['weather'][0]['description'].capitalize(),
-            'icono': datos['weather'][0]['icon'],
-            'viento_velocidad': round(datos['wind']['speed'] * 3.6, 1),
-            'viento_direccion': ClimaService._obtener_direccion_viento(datos['wind'].get('deg', 0)),
-            'presion': datos['main']['pressure'],
-            'ciudad': datos['name'],
-            'hora_actualizacion': datos['dt']
-        }
-    
+        except KeyError as e:
+            logger.error(f"Error en la estructura de datos del clima: {e}")
+            return None
+
     @staticmethod
     def obtener_icono_url(codigo_icono):
         """
         Obtiene la URL del icono del clima
         """
-        return f"http://openweathermap.org/img/wn/{codigo_icono}@2x.png"
\ No newline at end of file
+        return f"http://openweathermap.org/img/wn/{codigo_icono}@2x.png"
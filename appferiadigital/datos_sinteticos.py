@@ -0,0 +1,173 @@
+"""
+Generación masiva de datos de prueba (usuarios, ferias, puestos, productos
+y reservas) con bulk_create. La usan `generar_datos` y `benchmark_vistas`.
+"""
+import random
+from datetime import date, timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+from django.db.models import Q
+from django.db.models.functions import Mod
+
+from .busqueda_service import BusquedaService
+from .estadisticas_service import EstadisticasService
+from .models import Categoria, Feria, Producto, Puesto, Reserva, ReservaProducto, Usuario
+
+CONTRASENA = 'feria1234'
+# Centro aproximado de cada ciudad; las ferias quedan a unos 15 km a la redonda
+CIUDADES = {
+    'Santiago': (-33.45, -70.66), 'Talca': (-35.43, -71.66), 'Valparaíso': (-33.05, -71.62),
+    'Concepción': (-36.83, -73.05), 'Temuco': (-38.74, -72.60), 'La Serena': (-29.90, -71.25),
+    'Rancagua': (-34.17, -70.74), 'Chillán': (-36.61, -72.10),
+}
+NOMBRES_FERIA = ['Feria Libre', 'Persa', 'Vega', 'Mercado', 'Feria Modelo', 'Feria Campesina']
+CATEGORIAS = [
+    ('Frutas', 'Alimento'), ('Verduras', 'Alimento'), ('Legumbres', 'Alimento'),
+    ('Frutos secos', 'Alimento'), ('Huevos', 'Alimento'), ('Hierbas', 'Alimento'),
+]
+PRODUCTOS = [
+    'Plátano', 'Manzana', 'Limón', 'Tomate', 'Palta', 'Cebolla', 'Papa', 'Zanahoria', 'Lechuga',
+    'Ají', 'Durazno', 'Frutilla', 'Choclo', 'Zapallo', 'Pepino', 'Melón', 'Porotos', 'Lentejas',
+    'Nueces', 'Almendras', 'Huevos de campo', 'Cilantro', 'Perejil', 'Albahaca',
+]
+VARIEDADES = ['orgánico', 'hass', 'cherry', 'verde', 'rojo', 'del valle', 'premium', 'granel']
+NOMBRES = ['Ana', 'Pedro', 'María', 'José', 'Camila', 'Diego', 'Valentina', 'Matías', 'Fernanda', 'Tomás']
+APELLIDOS = ['González', 'Muñoz', 'Rojas', 'Díaz', 'Pérez', 'Soto', 'Contreras', 'Silva', 'Martínez']
+DIAS_HISTORIA = 30
+FRACCION_CARRITO = 5  # una de cada N reservas es un carrito
+
+
+def _rut(numero):
+    """RUT con dígito verificador válido"""
+    suma, factor = 0, 2
+    for digito in reversed(str(numero)):
+        suma += int(digito) * factor
+        factor = 2 if factor == 7 else factor + 1
+    dv = 11 - suma % 11
+    return f"{numero}-{'0' if dv == 11 else 'k' if dv == 10 else dv}"
+
+
+def generar(ferias, puestos, productos, reservas, semilla=0, lote=5000):
+    """
+    Crea los datos pedidos y deja al día el índice de búsqueda y las
+    estadísticas de los vendedores. Retorna un resumen con las cantidades
+    creadas y algunos IDs de ejemplo.
+    """
+    azar = random.Random(semilla)
+    contrasena = make_password(CONTRASENA)  # un solo hash para todos
+
+    with transaction.atomic():
+        base = (Usuario.objects.order_by('-id_usuario').values_list('id_usuario', flat=True).first() or 0) + 1
+        etiqueta = f'{semilla}-{base}'
+
+        categorias = []
+        for nombre, tipo in CATEGORIAS:
+            categoria, _ = Categoria.objects.get_or_create(nombre=nombre, defaults={'tipo': tipo})
+            categorias.append(categoria)
+
+        lista_ferias = []
+        for i in range(ferias):
+            ciudad = azar.choice(list(CIUDADES))
+            lat, lon = CIUDADES[ciudad]
+            lista_ferias.append(Feria(
+                nombre_feria=f'{azar.choice(NOMBRES_FERIA)} {i + 1}',
+                ubicacion_feria=f'Calle {azar.randint(1, 999)}',
+                ciudad=ciudad,
+                latitud=round(lat + azar.uniform(-0.15, 0.15), 6),
+                longitud=round(lon + azar.uniform(-0.15, 0.15), 6),
+                aglomeracion=azar.randint(0, 100),
+            ))
+        lista_ferias = Feria.objects.bulk_create(lista_ferias, batch_size=lote)
+
+        n_vendedores = max(1, puestos // 2)
+        n_clientes = max(1, reservas // 20)
+        usuarios = [
+            Usuario(
+                rut=_rut(10_000_000 + base + i),
+                nombre=f'{azar.choice(NOMBRES)} {azar.choice(APELLIDOS)}',
+                rol='vendedor' if i < n_vendedores else 'cliente',
+                telefono=f'+569{azar.randint(10_000_000, 99_999_999)}',
+                email=f'{"vendedor" if i < n_vendedores else "cliente"}{i}.{etiqueta}@feriadigital.test',
+                contrasena=contrasena,
+            )
+            for i in range(n_vendedores + n_clientes)
+        ]
+        Usuario.objects.bulk_create(usuarios, batch_size=lote)
+        vendedores, clientes = usuarios[:n_vendedores], usuarios[n_vendedores:]
+
+        lista_puestos = Puesto.objects.bulk_create([
+            Puesto(
+                id_feria=lista_ferias[i % len(lista_ferias)],
+                id_usuario=vendedores[i % len(vendedores)],
+                numero_puesto=str(i + 1),
+            )
+            for i in range(puestos)
+        ], batch_size=lote) if lista_ferias else []
+
+        lista_productos = Producto.objects.bulk_create([
+            Producto(
+                id_puesto=lista_puestos[i % len(lista_puestos)],
+                id_categoria=azar.choice(categorias),
+                nombre_producto=f'{azar.choice(PRODUCTOS)} {azar.choice(VARIEDADES)}',
+                stock=azar.randint(0, 200),
+            )
+            for i in range(productos)
+        ], batch_size=lote) if lista_puestos else []
+
+        por_puesto = {}
+        for producto in lista_productos:
+            por_puesto.setdefault(producto.id_puesto_id, []).append(producto.id_producto)
+
+        lista_reservas, lineas = [], []
+        if lista_productos and reservas:
+            for i in range(reservas):
+                cliente = clientes[i % len(clientes)]
+                producto = azar.choice(lista_productos)
+                del_puesto = por_puesto[producto.id_puesto_id]
+                if i % FRACCION_CARRITO == 0 and len(del_puesto) > 1:
+                    elegidos = azar.sample(del_puesto, min(len(del_puesto), azar.randint(2, 4)))
+                    cantidades = [azar.randint(1, 5) for _ in elegidos]
+                    lista_reservas.append(Reserva(id_usuario=cliente, cantidad=sum(cantidades)))
+                    lineas.append(list(zip(elegidos, cantidades)))
+                else:
+                    lista_reservas.append(Reserva(id_usuario=cliente, id_producto=producto,
+                                                  cantidad=azar.randint(1, 5)))
+                    lineas.append(None)
+            Reserva.objects.bulk_create(lista_reservas, batch_size=lote)
+            ReservaProducto.objects.bulk_create([
+                ReservaProducto(id_reserva=reserva, id_producto_id=producto_id,
+                                cantidad_reserva=cantidad, unidad_de_medida='kg')
+                for reserva, carrito in zip(lista_reservas, lineas) if carrito
+                for producto_id, cantidad in carrito
+            ], batch_size=lote)
+
+            # fecha_reserva es auto_now_add: se reparte después en los últimos días
+            primera = lista_reservas[0].id_reserva
+            hoy = date.today()
+            for dias in range(DIAS_HISTORIA):
+                Reserva.objects.annotate(resto=Mod('id_reserva', DIAS_HISTORIA)).filter(
+                    id_reserva__gte=primera, resto=dias
+                ).update(fecha_reserva=hoy - timedelta(days=dias))
+
+        if lista_productos:
+            BusquedaService.indexar(Q(id_producto__gte=lista_productos[0].id_producto), lote=lote)
+        for vendedor in vendedores:
+            EstadisticasService.recalcular(vendedor.id_usuario)
+
+    return {
+        'ferias': len(lista_ferias),
+        'vendedores': len(vendedores),
+        'clientes': len(clientes),
+        'puestos': len(lista_puestos),
+        'productos': len(lista_productos),
+        'reservas': len(lista_reservas),
+        'ejemplo': {
+            'feria_id': lista_ferias[0].id_feria if lista_ferias else None,
+            'id_puesto': lista_puestos[0].id_puesto if lista_puestos else None,
+            'id_producto': lista_productos[0].id_producto if lista_productos else None,
+            'id_reserva': lista_reservas[0].id_reserva if lista_reservas else None,
+            'vendedor': vendedores[0],
+            'cliente': clientes[0],
+        },
+    }
@@ -0,0 +1,288 @@
+from datetime import date, timedelta
+
+from django.db import transaction
+from django.db.models import Case, Count, F, Q, Sum, When
+
+from .models import (
+    EstadisticaProducto, EstadisticaVendedor, Producto, Puesto, Reserva, ReservaProducto,
+)
+
+DIAS_RECIENTES = 7
+TOP_POPULARES = 5
+
+
+def _fecha_limite():
+    return date.today() - timedelta(days=DIAS_RECIENTES)
+
+
+class EstadisticasService:
+    """
+    Mantiene EstadisticaVendedor y EstadisticaProducto al día.
+
+    Cada operación que cambia reservas o stock llama aquí dentro de su
+    propia transacción y suma sus deltas con F(), así la página de
+    estadísticas solo lee una fila (más el top y las reservas por día
+    cuando cambiaron, ver leer).
+    `recalcular` reconstruye todo desde las tablas de origen.
+    """
+
+    @staticmethod
+    def _vendedor_de(productos_ids):
+        return Puesto.objects.filter(
+            producto__id_producto__in=productos_ids
+        ).values_list('id_usuario_id', flat=True).first()
+
+    @staticmethod
+    def _aplicar(vendedor_id, productos=0, stock=0, reservas=0, cantidad=0,
+                 por_producto=None, reconstruir=True):
+        """
+        Suma los deltas con F() (sin bloquear la fila antes de escribir).
+        Los cambios de reservas o productos solo suben `cambios`: el top de
+        populares y las reservas por día se recalculan al leer (ver leer).
+
+        Si falta alguna fila de estadísticas se reconstruye todo el vendedor
+        desde las tablas de origen (salvo con reconstruir=False).
+        """
+        with transaction.atomic():
+            if por_producto:
+                actualizados = EstadisticaProducto.objects.filter(id_producto__in=por_producto).update(
+                    total_reservas=Case(
+                        *[When(id_producto=pid, then=F('total_reservas') + n)
+                          for pid, (n, _) in por_producto.items()],
+                        default=F('total_reservas'),
+                    ),
+                    cantidad_reservada=Case(
+                        *[When(id_producto=pid, then=F('cantidad_reservada') + c)
+                          for pid, (_, c) in por_producto.items()],
+                        default=F('cantidad_reservada'),
+                    ),
+                )
+                if actualizados != len(por_producto) and reconstruir:
+                    return EstadisticasService.recalcular(vendedor_id)
+
+            derivados = bool(reservas or por_producto or productos < 0)
+            actualizado = EstadisticaVendedor.objects.filter(id_usuario_id=vendedor_id).update(
+                total_productos=F('total_productos') + productos,
+                total_stock=F('total_stock') + stock,
+                total_reservas=F('total_reservas') + reservas,
+                cantidad_reservada=F('cantidad_reservada') + cantidad,
+                cambios=F('cambios') + int(derivados),
+            )
+            if not actualizado and reconstruir:
+                # Primera vez: se construye desde cero (ya incluye este cambio)
+                return EstadisticasService.recalcular(vendedor_id)
+            return None
+
+    @staticmethod
+    def _populares(vendedor_id):
+        return list(EstadisticaProducto.objects.filter(
+            id_usuario_id=vendedor_id, cantidad_reservada__gt=0
+        ).order_by('-cantidad_reservada').annotate(
+            id_producto__nombre_producto=F('id_producto__nombre_producto'),
+            total_reservado=F('cantidad_reservada'),
+        ).values('id_producto__nombre_producto', 'total_reservado')[:TOP_POPULARES])
+
+    @staticmethod
+    def _reservas_pendientes(vendedor_id):
+        productos = Producto.objects.filter(id_puesto__id_usuario=vendedor_id)
+        return Reserva.objects.filter(
+            Q(id_producto__in=productos) | Q(reservaproducto__id_producto__in=productos),
+            estado=Reserva.PENDIENTE,
+        )
+
+    @staticmethod
+    def _por_dia(reservas):
+        return {
+            dia.isoformat(): n
+            for dia, n in reservas.filter(fecha_reserva__gte=_fecha_limite()).values(
+                'fecha_reserva'
+            ).annotate(n=Count('id_reserva', distinct=True)).values_list('fecha_reserva', 'n')
+        }
+
+    @staticmethod
+    def _derivar(stats):
+        """
+        Recalcula productos_populares y reservas_por_dia si hubo cambios desde
+        el último cálculo. Se guardan solo si nadie cambió la fila entretanto;
+        si no, la próxima lectura vuelve a calcularlos.
+        """
+        if stats.cambios == stats.cambios_derivados:
+            return stats
+        stats.productos_populares = EstadisticasService._populares(stats.id_usuario_id)
+        stats.reservas_por_dia = EstadisticasService._por_dia(
+            EstadisticasService._reservas_pendientes(stats.id_usuario_id)
+        )
+        stats.cambios_derivados = stats.cambios
+        EstadisticaVendedor.objects.filter(id_usuario_id=stats.id_usuario_id, cambios=stats.cambios).update(
+            productos_populares=stats.productos_populares,
+            reservas_por_dia=stats.reservas_por_dia,
+            cambios_derivados=stats.cambios,
+        )
+        return stats
+
+    @staticmethod
+    def leer(vendedor_id):
+        """Estadísticas para mostrar: una lectura por clave primaria si no hubo cambios"""
+        stats = EstadisticaVendedor.objects.filter(id_usuario_id=vendedor_id).first()
+        if stats is None:
+            return EstadisticasService.recalcular(vendedor_id)
+        return EstadisticasService._derivar(stats)
+
+    # ---------- Eventos ----------
+
+    @staticmethod
+    def registrar_reserva(lineas, signo=1, devolver_stock=True, vendedor_id=None):
+        """
+        Reserva creada (signo=1) o quitada (signo=-1). `lineas` es
+        {producto_id: cantidad}. Al procesar una reserva el stock no vuelve
+        (devolver_stock=False).
+        """
+        if not lineas:
+            return None
+        vendedor_id = vendedor_id or EstadisticasService._vendedor_de(list(lineas))
+        if vendedor_id is None:
+            return None
+        total = sum(lineas.values())
+        stock = -signo * total if (signo > 0 or devolver_stock) else 0
+        return EstadisticasService._aplicar(
+            vendedor_id,
+            stock=stock,
+            reservas=signo,
+            cantidad=signo * total,
+            por_producto={pid: (signo, signo * c) for pid, c in lineas.items()},
+        )
+
+    @staticmethod
+    def registrar_producto_creado(producto, vendedor_id):
+        with transaction.atomic():
+            EstadisticaProducto.objects.get_or_create(
+                id_producto=producto, defaults={'id_usuario_id': vendedor_id}
+            )
+            return EstadisticasService._aplicar(vendedor_id, productos=1, stock=producto.stock)
+
+    @staticmethod
+    def registrar_productos_importados(creados, vendedor_id, diferencia_stock):
+        """Un lote de la importación masiva (sin señales): productos nuevos y stock neto"""
+        with transaction.atomic():
+            EstadisticaProducto.objects.bulk_create(
+                [EstadisticaProducto(id_producto=producto, id_usuario_id=vendedor_id) for producto in creados],
+                ignore_conflicts=True,
+            )
+            return EstadisticasService._aplicar(vendedor_id, productos=len(creados), stock=diferencia_stock)
+
+    @staticmethod
+    def registrar_cambio_stock(vendedor_id, diferencia):
+        if diferencia:
+            return EstadisticasService._aplicar(vendedor_id, stock=diferencia)
+        return None
+
+    @staticmethod
+    def registrar_producto_eliminado(producto, vendedor_id):
+        # Sin reconstruir: el borrado puede venir en cascada desde el vendedor
+        return EstadisticasService._aplicar(
+            vendedor_id, productos=-1, stock=-producto.stock, reconstruir=False
+        )
+
+    # ---------- Reconstrucción ----------
+
+    @staticmethod
+    def calcular(vendedor_id):
+        """
+        Calcula las estadísticas desde las tablas de origen, sin guardarlas.
+        Retorna (valores del vendedor, {producto_id: (reservas, cantidad)}).
+        """
+        productos = Producto.objects.filter(id_puesto__id_usuario=vendedor_id)
+        totales = productos.aggregate(total=Count('id_producto'), stock=Sum('stock'))
+
+        por_producto = {pid: [0, 0] for pid in productos.values_list('id_producto', flat=True)}
+        # Solo reservas pendientes: procesar o cancelar las descuenta
+        directas = Reserva.objects.filter(
+            id_producto__in=productos, estado=Reserva.PENDIENTE
+        ).values('id_producto').annotate(
+            n=Count('id_reserva'), c=Sum('cantidad')
+        ).values_list('id_producto', 'n', 'c')
+        lineas = ReservaProducto.objects.filter(
+            id_producto__in=productos, id_reserva__estado=Reserva.PENDIENTE
+        ).values('id_producto').annotate(
+            n=Count('id'), c=Sum('cantidad_reserva')
+        ).values_list('id_producto', 'n', 'c')
+        for pid, n, c in list(directas) + list(lineas):
+            por_producto[pid][0] += n
+            por_producto[pid][1] += c or 0
+
+        reservas = EstadisticasService._reservas_pendientes(vendedor_id)
+        por_dia = EstadisticasService._por_dia(reservas)
+
+        nombres = dict(productos.values_list('id_producto', 'nombre_producto'))
+        populares = sorted(
+            ((pid, c) for pid, (_, c) in por_producto.items() if c > 0),
+            key=lambda item: -item[1]
+        )[:TOP_POPULARES]
+
+        valores = {
+            'total_productos': totales['total'],
+            'total_stock': totales['stock'] or 0,
+            'total_reservas': reservas.values('id_reserva').distinct().count(),
+            'cantidad_reservada': sum(c for _, c in por_producto.values()),
+            'productos_populares': [
+                {'id_producto__nombre_producto': nombres[pid], 'total_reservado': c}
+                for pid, c in populares
+            ],
+            'reservas_por_dia': por_dia,
+        }
+        return valores, {pid: tuple(v) for pid, v in por_producto.items()}
+
+    @staticmethod
+    def recalcular(vendedor_id):
+        """Reconstruye y guarda las estadísticas de un vendedor"""
+        with transaction.atomic():
+            valores, por_producto = EstadisticasService.calcular(vendedor_id)
+            EstadisticaProducto.objects.filter(id_usuario_id=vendedor_id).exclude(
+                id_producto__in=list(por_producto)
+            ).delete()
+            EstadisticaProducto.objects.bulk_create(
+                [
+                    EstadisticaProducto(id_producto_id=pid, id_usuario_id=vendedor_id,
+                                        total_reservas=n, cantidad_reservada=c)
+                    for pid, (n, c) in por_producto.items()
+                ],
+                update_conflicts=True,
+                unique_fields=['id_producto'],
+                update_fields=['id_usuario', 'total_reservas', 'cantidad_reservada'],
+            )
+            stats, _ = EstadisticaVendedor.objects.update_or_create(
+                id_usuario_id=vendedor_id, defaults={**valores, 'cambios': 0, 'cambios_derivados': 0}
+            )
+            return stats
+
+    @staticmethod
+    def diferencias(vendedor_id):
+        """
+        Compara lo guardado con lo calculado. Retorna {campo: (guardado, real)}.
+        """
+        valores, por_producto = EstadisticasService.calcular(vendedor_id)
+        stats = EstadisticaVendedor.objects.filter(id_usuario_id=vendedor_id).first()
+        if stats is not None:
+            stats = EstadisticasService._derivar(stats)
+        diferencias = {}
+        limite = _fecha_limite().isoformat()
+        for campo, real in valores.items():
+            guardado = getattr(stats, campo, None)
+            if campo == 'reservas_por_dia' and guardado is not None:
+                guardado = {d: n for d, n in guardado.items() if d >= limite and n}
+            if campo == 'productos_populares' and guardado is not None:
+                # El orden entre empates no es significativo
+                guardado = sorted(guardado, key=lambda p: (-p['total_reservado'], p['id_producto__nombre_producto']))
+                real = sorted(real, key=lambda p: (-p['total_reservado'], p['id_producto__nombre_producto']))
+            if guardado != real:
+                diferencias[campo] = (guardado, real)
+
+        guardados = dict(
+            (pid, (n, c)) for pid, n, c in EstadisticaProducto.objects.filter(
+                id_usuario_id=vendedor_id
+            ).values_list('id_producto', 'total_reservas', 'cantidad_reservada')
+        )
+        for pid, real in por_producto.items():
+            if guardados.get(pid) != real:
+                diferencias[f'producto {pid}'] = (guardados.get(pid), real)
+        return diferencias
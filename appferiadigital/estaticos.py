@@ -0,0 +1,101 @@
+"""
+Archivos estáticos para producción.
+
+`collectstatic` con EstaticosComprimidos minifica los CSS y JS propios, les
+pone un hash del contenido en el nombre (css/base.3f1c9a2b7d10.css) y guarda al
+lado las versiones .gz y .br (brotli, si está instalado). WhiteNoise sirve
+esos nombres con caché de un año e `immutable`: el navegador no vuelve a
+pedirlos hasta que cambie el contenido, y entonces cambia el nombre.
+EstaticosMiddleware es el middleware de WhiteNoise, también para ASGI.
+
+Los minificadores son conservadores (comentarios y espacios, sin tocar las
+cadenas): lo que más pesa se gana con la compresión, y así no hace falta
+otra herramienta en el despliegue.
+"""
+import re
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.core.files.base import ContentFile
+from whitenoise.middleware import WhiteNoiseMiddleware
+from whitenoise.storage import CompressedManifestStaticFilesStorage
+
+_CADENA = r'"(?:\\.|[^"\\\n])*"|\'(?:\\.|[^\'\\\n])*\''
+_CSS = re.compile(rf'({_CADENA})|/\*.*?\*/|\s+', re.S)
+_CSS_SIGNOS = re.compile(rf'({_CADENA})|\s*;?\s*(}})\s*|\s*([{{;,>])\s*|(:)\s+')
+
+
+def minificar_css(texto):
+    # Comentarios fuera y cada tramo de espacios a uno solo...
+    texto = _CSS.sub(lambda m: m.group(1) or ('' if m.group(0).startswith('/*') else ' '), texto)
+    # ...y sin espacios junto a llaves, separadores y después de ':' (ni el
+    # último ';' de cada bloque). Antes de ':' se dejan: "div :hover" no es
+    # "div:hover".
+    return _CSS_SIGNOS.sub(lambda m: m.group(1) or m.group(2) or m.group(3) or m.group(4), texto).strip()
+
+
+def minificar_js(texto):
+    """Quita sangría, líneas en blanco y líneas que son solo comentario"""
+    lineas = (linea.strip() for linea in texto.splitlines())
+    return '\n'.join(linea for linea in lineas if linea and not linea.startswith('//')) + '\n'
+
+
+MINIFICADORES = {'.css': minificar_css, '.js': minificar_js}
+
+
+class EstaticosComprimidos(CompressedManifestStaticFilesStorage):
+    def post_process(self, paths, dry_run=False, **options):
+        if not dry_run:
+            paths = dict(paths)
+            for ruta, (origen, ruta_origen) in list(paths.items()):
+                minificar = next(
+                    (funcion for extension, funcion in MINIFICADORES.items() if ruta.endswith(extension)), None
+                )
+                # Los .min.* ya vienen minificados
+                if minificar is None or '.min.' in ruta:
+                    continue
+                with origen.open(ruta_origen) as archivo:
+                    texto = archivo.read().decode('utf-8')
+                # Se reemplaza la copia recién hecha; el hash se calcula
+                # sobre el archivo minificado
+                self.delete(ruta)
+                self._save(ruta, ContentFile(minificar(texto).encode('utf-8')))
+                paths[ruta] = (self, ruta)
+        yield from super().post_process(paths, dry_run=dry_run, **options)
+
+    def stored_name(self, name):
+        # Sin manifiesto (no se ha corrido collectstatic: desarrollo con
+        # DEBUG=False o pruebas) se usa el nombre original
+        if not self.hashed_files:
+            return name
+        return super().stored_name(name)
+
+
+class EstaticosMiddleware(WhiteNoiseMiddleware):
+    """
+    WhiteNoiseMiddleware que también funciona en modo asíncrono: el de
+    WhiteNoise es solo síncrono y bajo ASGI obligaría a pasar cada petición
+    (también las vistas async) por un hilo.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response=None, *args, **kwargs):
+        super().__init__(get_response, *args, **kwargs)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return super().__call__(request)
+
+    async def __acall__(self, request):
+        # Con autorefresh (DEBUG) find_file revisa el disco; en producción
+        # es una búsqueda en el diccionario cargado al inicio
+        if self.autorefresh:
+            static_file = self.find_file(request.path_info)
+        else:
+            static_file = self.files.get(request.path_info)
+        if static_file is not None:
+            return self.serve(static_file, request)
+        return await self.get_response(request)
@@ -0,0 +1,173 @@
+"""
+Stock de los puestos en vivo (Server-Sent Events).
+
+El feed de cambios es la versión del puesto (ver versiones.py): toda
+reserva, devolución o edición de un producto la incrementa en la misma
+transacción que cambia el stock. Cada proceso tiene un único sondeo por
+event loop para todos los puestos con clientes conectados: cada
+STOCK_EVENTOS_INTERVALO segundos lee sus versiones en una consulta y, solo
+para los que cambiaron, el stock de sus productos en otra. Los cambios de
+un intervalo salen juntos en un evento por cliente, con solo los productos
+cuyo stock cambió. Sin cambios, cada STOCK_EVENTOS_LATIDO segundos se envía
+un comentario para que los proxies no corten la conexión.
+
+Requiere ASGI: con WSGI la respuesta se armaría completa antes de enviarse.
+El stream termina tras STOCK_EVENTOS_DURACION segundos y el navegador se
+reconecta solo con Last-Event-ID (la versión), así una conexión no queda
+abierta para siempre en el mismo worker.
+"""
+import asyncio
+import json
+import logging
+import time
+import weakref
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import DatabaseError, close_old_connections
+
+from .models import Producto, Puesto
+
+logger = logging.getLogger(__name__)
+
+_feeds = weakref.WeakKeyDictionary()
+
+
+def _leer_cambios(conocidas):
+    """
+    {id_puesto: (version, {id_producto: stock})} de los puestos cuya versión
+    difiere de `conocidas`. Un puesto eliminado queda como (None, None).
+    """
+    versiones = dict(
+        Puesto.objects.filter(id_puesto__in=list(conocidas)).values_list('id_puesto', 'version')
+    )
+    cambios = {
+        id_puesto: (versiones[id_puesto], {}) if id_puesto in versiones else (None, None)
+        for id_puesto, version in conocidas.items()
+        if versiones.get(id_puesto) != version
+    }
+    productos = Producto.objects.filter(
+        id_puesto_id__in=[id_puesto for id_puesto, (version, _) in cambios.items() if version is not None]
+    ).values_list('id_puesto_id', 'id_producto', 'stock')
+    for id_puesto, id_producto, stock in productos:
+        cambios[id_puesto][1][id_producto] = stock
+    return cambios
+
+
+def _leer_cambios_seguro(conocidas):
+    try:
+        return _leer_cambios(conocidas)
+    except DatabaseError:
+        logger.warning('No se pudo leer el stock de los puestos', exc_info=True)
+        # Descarta la conexión si quedó inutilizable; se reintenta en el próximo intervalo
+        close_old_connections()
+        return {}
+
+
+class FeedStock:
+    """Un sondeo para todos los clientes del event loop"""
+
+    def __init__(self):
+        self._suscriptores = {}  # id_puesto -> set de colas
+        self._estado = {}        # id_puesto -> (version, stocks) del último sondeo
+        self._tarea = None
+
+    def suscribir(self, id_puesto):
+        cola = asyncio.Queue()
+        self._suscriptores.setdefault(id_puesto, set()).add(cola)
+        if id_puesto in self._estado:
+            cola.put_nowait(self._estado[id_puesto])
+        if self._tarea is None:
+            self._tarea = asyncio.get_running_loop().create_task(self._sondear())
+        return cola
+
+    def desuscribir(self, id_puesto, cola):
+        colas = self._suscriptores.get(id_puesto, set())
+        colas.discard(cola)
+        if not colas:
+            self._suscriptores.pop(id_puesto, None)
+            self._estado.pop(id_puesto, None)
+        if not self._suscriptores and self._tarea is not None:
+            self._tarea.cancel()
+            self._tarea = None
+
+    async def _sondear(self):
+        while True:
+            conocidas = {
+                id_puesto: self._estado.get(id_puesto, (None, None))[0]
+                for id_puesto in self._suscriptores
+            }
+            cambios = await sync_to_async(_leer_cambios_seguro)(conocidas)
+            for id_puesto, estado in cambios.items():
+                if id_puesto not in self._suscriptores:
+                    continue  # se desconectaron durante la consulta
+                self._estado[id_puesto] = estado
+                for cola in self._suscriptores[id_puesto]:
+                    cola.put_nowait(estado)
+            await asyncio.sleep(settings.STOCK_EVENTOS_INTERVALO)
+
+
+def _feed():
+    loop = asyncio.get_running_loop()
+    feed = _feeds.get(loop)
+    if feed is None:
+        feed = _feeds[loop] = FeedStock()
+    return feed
+
+
+def _evento(nombre, datos, id_evento=None):
+    lineas = [f'event: {nombre}']
+    if id_evento is not None:
+        lineas.append(f'id: {id_evento}')
+    lineas.append(f'data: {json.dumps(datos, separators=(",", ":"))}')
+    return '\n'.join(lineas) + '\n\n'
+
+
+async def eventos_stock(id_puesto, version=None):
+    """
+    Stream SSE del stock de un puesto. `version` es la que ya tiene el
+    cliente (la de la página o Last-Event-ID): si es la actual no se envía
+    nada hasta el próximo cambio; si no, el primer evento trae todos los
+    productos.
+
+    Eventos:
+      stock  {"version": 8, "productos": {"12": 3, "15": 0}}  (null: eliminado)
+      fin    el puesto ya no existe; el cliente no debe reconectarse
+    """
+    feed = _feed()
+    cola = feed.suscribir(id_puesto)
+    enviados = None
+    fin = time.monotonic() + settings.STOCK_EVENTOS_DURACION
+    try:
+        yield f'retry: {settings.STOCK_EVENTOS_REINTENTO_MS}\n\n'
+        while True:
+            restante = fin - time.monotonic()
+            if restante <= 0:
+                return
+            try:
+                estado = await asyncio.wait_for(cola.get(), min(settings.STOCK_EVENTOS_LATIDO, restante))
+            except asyncio.TimeoutError:
+                yield ': latido\n\n'
+                continue
+            # Los sondeos acumulados salen en un solo evento
+            estados = [estado]
+            while not cola.empty():
+                estados.append(cola.get_nowait())
+
+            cambios = {}
+            for version_actual, stocks in estados:
+                if version_actual is None:
+                    yield _evento('fin', {})
+                    return
+                if enviados is None and version_actual == version:
+                    enviados = stocks  # la página ya muestra este stock
+                    continue
+                enviados = enviados or {}
+                cambios.update({str(id_producto): stock for id_producto, stock in stocks.items()
+                                if enviados.get(id_producto) != stock})
+                cambios.update({str(id_producto): None for id_producto in enviados if id_producto not in stocks})
+                enviados = stocks
+            if cambios:
+                yield _evento('stock', {'version': version_actual, 'productos': cambios}, version_actual)
+    finally:
+        feed.desuscribir(id_puesto, cola)
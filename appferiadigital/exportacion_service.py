@@ -0,0 +1,117 @@
+"""
+Exportación de las reservas de un vendedor en CSV o JSON Lines.
+
+Una fila por producto reservado: las reservas simples (Reserva.id_producto)
+y las líneas de carrito (ReservaProducto), más las del archivo si se piden,
+salen de una sola consulta UNION ALL ordenada por fecha. Se lee con
+`.iterator(chunk_size=...)` sobre `values_list` (tuplas, sin instancias de
+modelo) y se envía de a bloques, así la memoria no depende de cuántas
+reservas tenga el vendedor. Bajo ASGI se usa bloques_async: un iterador
+síncrono haría que Django lo leyera completo antes de enviar el primer byte.
+"""
+import csv
+import json
+from datetime import date
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db.models import CharField, Value
+
+from .models import Reserva, ReservaArchivada, ReservaProducto, ReservaProductoArchivada
+
+COLUMNAS = (
+    'id_reserva', 'fecha', 'cliente', 'email', 'telefono', 'puesto', 'producto', 'cantidad', 'unidad', 'estado',
+)
+FORMATOS = {
+    'csv': ('text/csv; charset=utf-8', 'csv'),
+    'jsonl': ('application/x-ndjson; charset=utf-8', 'jsonl'),
+}
+
+
+class _Eco:
+    """Archivo que devuelve lo que se escribe (para csv.writer sin buffer)"""
+
+    def write(self, valor):
+        return valor
+
+
+class ExportacionService:
+    @staticmethod
+    def _consultas(modelo_reserva, modelo_linea, filtros, desde, hasta):
+        simples = modelo_reserva.objects.filter(**filtros)
+        lineas = modelo_linea.objects.filter(**filtros)
+        if desde:
+            simples = simples.filter(fecha_reserva__gte=desde)
+            lineas = lineas.filter(id_reserva__fecha_reserva__gte=desde)
+        if hasta:
+            simples = simples.filter(fecha_reserva__lte=hasta)
+            lineas = lineas.filter(id_reserva__fecha_reserva__lte=hasta)
+
+        simples = simples.annotate(unidad=Value(None, output_field=CharField())).values_list(
+            'id_reserva', 'fecha_reserva', 'id_usuario__nombre', 'id_usuario__email', 'id_usuario__telefono',
+            'id_producto__id_puesto__numero_puesto', 'id_producto__nombre_producto', 'cantidad', 'unidad',
+            'estado',
+        )
+        lineas = lineas.values_list(
+            'id_reserva', 'id_reserva__fecha_reserva', 'id_reserva__id_usuario__nombre',
+            'id_reserva__id_usuario__email', 'id_reserva__id_usuario__telefono',
+            'id_producto__id_puesto__numero_puesto', 'id_producto__nombre_producto',
+            'cantidad_reserva', 'unidad_de_medida', 'id_reserva__estado',
+        )
+        return [simples.order_by(), lineas.order_by()]
+
+    @staticmethod
+    def reservas_vendedor(vendedor_id, desde=None, hasta=None, id_puesto=None, archivadas=False):
+        """
+        Tuplas en el orden de COLUMNAS, más recientes primero. Con
+        `archivadas` incluye también las reservas del archivo.
+        """
+        filtros = {'id_producto__id_puesto__id_usuario_id': vendedor_id}
+        if id_puesto is not None:
+            filtros['id_producto__id_puesto_id'] = id_puesto
+
+        consultas = ExportacionService._consultas(Reserva, ReservaProducto, filtros, desde, hasta)
+        if archivadas:
+            consultas += ExportacionService._consultas(
+                ReservaArchivada, ReservaProductoArchivada, filtros, desde, hasta
+            )
+        primera, *resto = consultas
+        return primera.union(*resto, all=True).order_by('-fecha_reserva', '-id_reserva')
+
+    @staticmethod
+    def bloques(filas, formato):
+        """
+        Texto del archivo en bloques de EXPORTACION_CHUNK filas, para un
+        StreamingHttpResponse. `filas` es la consulta de reservas_vendedor.
+        """
+        tamano = settings.EXPORTACION_CHUNK
+        if formato == 'csv':
+            escritor = csv.writer(_Eco())
+            # BOM: Excel lo necesita para leer el UTF-8 (tildes, ñ)
+            bloque = ['\ufeff' + escritor.writerow(COLUMNAS)]
+            convertir = escritor.writerow
+        else:
+            bloque = []
+
+            def convertir(fila):
+                return json.dumps(dict(zip(COLUMNAS, fila)), ensure_ascii=False, default=date.isoformat) + '\n'
+
+        for fila in filas.iterator(chunk_size=tamano):
+            bloque.append(convertir(fila))
+            if len(bloque) >= tamano:
+                yield ''.join(bloque)
+                bloque = []
+        if bloque:
+            yield ''.join(bloque)
+
+    @staticmethod
+    async def bloques_async(filas, formato):
+        """bloques() para ASGI: cada bloque se lee en el hilo de la conexión a la BD"""
+        bloques = ExportacionService.bloques(filas, formato)
+        siguiente = sync_to_async(next, thread_sensitive=True)
+        try:
+            while (bloque := await siguiente(bloques, None)) is not None:
+                yield bloque
+        finally:
+            # Cierra el cursor también si el cliente se desconecta
+            await sync_to_async(bloques.close, thread_sensitive=True)()
@@ -0,0 +1,238 @@
+"""
+Importación masiva de productos de un vendedor desde CSV o XLSX.
+
+Las filas se leen de a una (el archivo no se carga entero) y se guardan en
+lotes de IMPORTACION_LOTE: un bulk_create para los productos nuevos y un
+bulk_update para los existentes. Categorías, puestos del vendedor y sus
+productos se cargan una vez al comienzo, así validar una fila no consulta
+la base de datos y cada lote hace el mismo número de consultas sin
+importar el tamaño del archivo.
+
+Un producto existe si el puesto ya tiene uno con el mismo nombre (sin
+distinguir mayúsculas ni tildes); entonces se reemplaza su stock y, si la
+fila trae categoría, su categoría. Como bulk_create/bulk_update no envían
+señales, cada lote actualiza aquí el índice de búsqueda, las estadísticas
+del vendedor y la versión de los puestos.
+"""
+import csv
+import io
+from dataclasses import dataclass, field
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+
+from .busqueda_service import BusquedaService, normalizar_texto
+from .estadisticas_service import EstadisticasService
+from .models import Categoria, Producto, Puesto
+from .versiones import tocar_puestos
+
+COLUMNAS = ('puesto', 'nombre', 'stock', 'categoria')
+COLUMNAS_OBLIGATORIAS = ('nombre', 'stock')
+LARGO_NOMBRE = Producto._meta.get_field('nombre_producto').max_length
+
+
+class ArchivoInvalidoError(Exception):
+    """El archivo no se puede leer o le faltan columnas"""
+
+
+@dataclass
+class ResultadoImportacion:
+    creados: int = 0
+    actualizados: int = 0
+    sin_cambios: int = 0
+    filas_con_error: int = 0
+    # [(número de fila, [mensajes])], hasta IMPORTACION_MAX_ERRORES
+    errores: list = field(default_factory=list)
+
+    @property
+    def errores_omitidos(self):
+        return self.filas_con_error - len(self.errores)
+
+
+def _filas_csv(archivo):
+    texto = io.TextIOWrapper(archivo, encoding='utf-8-sig', newline='')
+    muestra = texto.read(4096)
+    texto.seek(0)
+    # Excel en español guarda los CSV con ';'
+    delimitador = ';' if muestra.count(';') > muestra.count(',') else ','
+    yield from csv.reader(texto, delimiter=delimitador)
+
+
+def _filas_xlsx(archivo):
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        raise ArchivoInvalidoError('Este servidor no puede leer XLSX; suba el archivo como CSV')
+    try:
+        libro = load_workbook(archivo, read_only=True, data_only=True)
+    except Exception:
+        raise ArchivoInvalidoError('El archivo XLSX está dañado o no es una planilla')
+    try:
+        for fila in libro.active.iter_rows(values_only=True):
+            yield ['' if valor is None else valor for valor in fila]
+    finally:
+        libro.close()
+
+
+def _texto(valor):
+    # XLSX entrega los números como float: 12.0 -> "12"
+    if isinstance(valor, float) and valor.is_integer():
+        valor = int(valor)
+    return str(valor).strip()
+
+
+class ImportacionService:
+    @staticmethod
+    def leer_filas(archivo, nombre):
+        """Filas (listas de valores) del archivo subido, según su extensión"""
+        extension = nombre.rsplit('.', 1)[-1].lower()
+        if extension == 'csv':
+            return _filas_csv(archivo)
+        if extension == 'xlsx':
+            return _filas_xlsx(archivo)
+        raise ArchivoInvalidoError('Formato no soportado: use CSV o XLSX')
+
+    @staticmethod
+    def importar(vendedor_id, filas):
+        """
+        Crea o actualiza los productos de `filas` (la primera es el
+        encabezado) en los puestos del vendedor. Las filas con errores se
+        omiten y se informan en el resultado; las demás se guardan.
+        """
+        filas = iter(filas)
+        try:
+            encabezado = [normalizar_texto(str(celda)) for celda in next(filas)]
+        except StopIteration:
+            raise ArchivoInvalidoError('El archivo está vacío')
+        except UnicodeDecodeError:
+            raise ArchivoInvalidoError('El CSV debe estar en UTF-8')
+        faltantes = [c for c in COLUMNAS_OBLIGATORIAS if c not in encabezado]
+        if faltantes:
+            raise ArchivoInvalidoError(f'Faltan columnas: {", ".join(faltantes)}')
+        posiciones = {c: encabezado.index(c) for c in COLUMNAS if c in encabezado}
+
+        puestos = {p.id_puesto: p for p in Puesto.objects.filter(id_usuario_id=vendedor_id)}
+        if not puestos:
+            raise ArchivoInvalidoError('Debe crear un puesto primero')
+        # Por id o por número; el número (el que ve el vendedor) tiene prioridad
+        puestos_por_texto = {str(id_puesto): id_puesto for id_puesto in puestos}
+        puestos_por_texto.update({
+            normalizar_texto(p.numero_puesto): p.id_puesto for p in puestos.values() if p.numero_puesto
+        })
+        # Por id o por nombre normalizado
+        categorias = {}
+        for id_categoria, nombre in Categoria.objects.values_list('id_categoria', 'nombre'):
+            categorias.setdefault(normalizar_texto(nombre), id_categoria)
+            categorias[str(id_categoria)] = id_categoria
+        existentes = {
+            (id_puesto, normalizar_texto(nombre)): id_producto
+            for id_producto, id_puesto, nombre in Producto.objects.filter(
+                id_puesto__in=list(puestos)
+            ).values_list('id_producto', 'id_puesto_id', 'nombre_producto')
+        }
+
+        resultado = ResultadoImportacion()
+        lote = {}
+        try:
+            for numero, fila in enumerate(filas, start=2):
+                valores = {c: fila[i] if i < len(fila) else '' for c, i in posiciones.items()}
+                if not any(str(v).strip() for v in valores.values()):
+                    continue  # fila en blanco
+                errores = []
+                datos = ImportacionService._validar(valores, puestos_por_texto, categorias, errores)
+                if errores:
+                    resultado.filas_con_error += 1
+                    if len(resultado.errores) < settings.IMPORTACION_MAX_ERRORES:
+                        resultado.errores.append((numero, errores))
+                    continue
+                # Si el producto se repite en el archivo, vale la última fila
+                lote[(datos['id_puesto'], normalizar_texto(datos['nombre']))] = datos
+                if len(lote) >= settings.IMPORTACION_LOTE:
+                    ImportacionService._guardar_lote(vendedor_id, lote, existentes, resultado)
+                    lote = {}
+        except UnicodeDecodeError:
+            raise ArchivoInvalidoError(
+                f'El CSV debe estar en UTF-8; se guardaron {resultado.creados + resultado.actualizados} '
+                'productos de las filas anteriores al error'
+            )
+        if lote:
+            ImportacionService._guardar_lote(vendedor_id, lote, existentes, resultado)
+        return resultado
+
+    @staticmethod
+    def _validar(valores, puestos_por_texto, categorias, errores):
+        datos = {'nombre': _texto(valores['nombre']), 'id_categoria': None}
+        if not datos['nombre']:
+            errores.append('El nombre es obligatorio')
+        elif len(datos['nombre']) > LARGO_NOMBRE:
+            errores.append(f'El nombre supera los {LARGO_NOMBRE} caracteres')
+
+        try:
+            datos['stock'] = int(_texto(valores['stock']))
+            if datos['stock'] < 0:
+                raise ValueError
+        except (TypeError, ValueError):
+            errores.append(f'Stock inválido: "{valores["stock"]}"')
+
+        puesto = _texto(valores.get('puesto', ''))
+        if puesto:
+            datos['id_puesto'] = puestos_por_texto.get(normalizar_texto(puesto))
+            if datos['id_puesto'] is None:
+                errores.append(f'El puesto "{puesto}" no es suyo')
+        elif len(set(puestos_por_texto.values())) == 1:
+            datos['id_puesto'] = next(iter(puestos_por_texto.values()))
+        else:
+            errores.append('Indique el puesto (tiene más de uno)')
+
+        categoria = _texto(valores.get('categoria', ''))
+        if categoria:
+            datos['id_categoria'] = categorias.get(categoria) or categorias.get(normalizar_texto(categoria))
+            if datos['id_categoria'] is None:
+                errores.append(f'Categoría desconocida: "{categoria}"')
+        return datos
+
+    @staticmethod
+    def _guardar_lote(vendedor_id, lote, existentes, resultado):
+        """Guarda un lote con un número fijo de consultas"""
+        a_actualizar = {existentes[clave]: datos for clave, datos in lote.items() if clave in existentes}
+        nuevos = [
+            Producto(id_puesto_id=datos['id_puesto'], id_categoria_id=datos['id_categoria'],
+                     nombre_producto=datos['nombre'], stock=datos['stock'])
+            for clave, datos in lote.items() if clave not in existentes
+        ]
+
+        with transaction.atomic():
+            # Stock actual (no el del comienzo): pudo haber reservas entre medio
+            actuales = Producto.objects.select_for_update().filter(
+                id_producto__in=list(a_actualizar)
+            ).only('id_producto', 'id_puesto', 'stock', 'id_categoria')
+            cambiados = []
+            diferencia_stock = 0
+            for producto in actuales:
+                datos = a_actualizar[producto.id_producto]
+                categoria = datos['id_categoria'] or producto.id_categoria_id
+                if producto.stock == datos['stock'] and producto.id_categoria_id == categoria:
+                    continue
+                diferencia_stock += datos['stock'] - producto.stock
+                producto.stock, producto.id_categoria_id = datos['stock'], categoria
+                cambiados.append(producto)
+
+            Producto.objects.bulk_create(nuevos)
+            Producto.objects.bulk_update(cambiados, ['stock', 'id_categoria'])
+
+            modificados = nuevos + cambiados
+            if modificados:
+                ids = [p.id_producto for p in modificados]
+                EstadisticasService.registrar_productos_importados(
+                    nuevos, vendedor_id, diferencia_stock + sum(p.stock for p in nuevos)
+                )
+                BusquedaService.indexar(Q(id_producto__in=ids))
+                tocar_puestos(Q(id_puesto__in={p.id_puesto_id for p in modificados}))
+
+        for producto in nuevos:
+            existentes[(producto.id_puesto_id, normalizar_texto(producto.nombre_producto))] = producto.id_producto
+        resultado.creados += len(nuevos)
+        resultado.actualizados += len(cambiados)
+        # Incluye productos borrados desde que empezó la importación
+        resultado.sin_cambios += len(a_actualizar) - len(cambiados)
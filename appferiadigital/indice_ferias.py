@@ -0,0 +1,150 @@
+"""
+Índice espacial en memoria de las ferias, para "ferias cerca de mí".
+
+Cada proceso guarda un k-d tree con las ferias que tienen coordenadas. Los
+puntos se pasan a vectores sobre la esfera unitaria: la distancia en línea
+recta entre dos vectores crece con la distancia sobre la Tierra, así que el
+árbol busca con distancias euclidianas y el resultado es exacto también
+cerca de los polos o del antimeridiano.
+
+Las señales de Feria vacían el índice del proceso al guardar o borrar. Los
+cambios hechos en otros procesos (o con bulk_create/update) se detectan
+revisando, a lo más cada INDICE_FERIAS_REVISION segundos, el total de ferias
+y su último `modificado`; si cambiaron, el índice se reconstruye.
+"""
+import heapq
+import math
+import threading
+import time
+
+from django.conf import settings
+from django.db.models import Count, Max
+
+from .models import Feria
+
+RADIO_TIERRA_KM = 6371.0088
+
+
+def _vector(lat, lon):
+    lat, lon = math.radians(lat), math.radians(lon)
+    return math.cos(lat) * math.cos(lon), math.cos(lat) * math.sin(lon), math.sin(lat)
+
+
+def _cuerda_a_km(cuerda):
+    return 2 * RADIO_TIERRA_KM * math.asin(min(1.0, cuerda / 2))
+
+
+def _km_a_cuerda(km):
+    return 2 * math.sin(min(km / RADIO_TIERRA_KM, math.pi) / 2)
+
+
+class ArbolKD:
+    """k-d tree estático de (vector, id): nodos (punto, eje, izquierda, derecha)"""
+
+    def __init__(self, puntos):
+        self.total = len(puntos)
+        self.raiz = self._construir(list(puntos), 0)
+
+    def _construir(self, puntos, eje):
+        if not puntos:
+            return None
+        puntos.sort(key=lambda punto: punto[0][eje])
+        medio = len(puntos) // 2
+        siguiente = (eje + 1) % 3
+        return (
+            puntos[medio], eje,
+            self._construir(puntos[:medio], siguiente),
+            self._construir(puntos[medio + 1:], siguiente),
+        )
+
+    def cercanos(self, objetivo, n, max_cuerda):
+        """Hasta `n` (cuerda, id) a no más de `max_cuerda`, del más cercano al más lejano"""
+        mejores = []  # montículo de (-cuerda², id): el peor de los n arriba
+        limite = max_cuerda ** 2
+
+        def visitar(nodo):
+            nonlocal limite
+            if nodo is None:
+                return
+            (punto, ident), eje, izquierda, derecha = nodo
+            distancia = sum((a - b) ** 2 for a, b in zip(punto, objetivo))
+            if distancia <= limite:
+                heapq.heappush(mejores, (-distancia, ident))
+                if len(mejores) > n:
+                    heapq.heappop(mejores)
+                if len(mejores) == n:
+                    limite = -mejores[0][0]
+            diferencia = objetivo[eje] - punto[eje]
+            cerca, lejos = (izquierda, derecha) if diferencia < 0 else (derecha, izquierda)
+            visitar(cerca)
+            # El otro lado solo si el plano de corte está dentro del límite
+            if diferencia ** 2 <= limite:
+                visitar(lejos)
+
+        if n > 0:
+            visitar(self.raiz)
+        return [(math.sqrt(-d), ident) for d, ident in sorted(mejores, reverse=True)]
+
+
+_estado = {'arbol': None, 'huella': None, 'proxima_revision': 0.0}
+_lock = threading.Lock()
+
+
+def invalidar():
+    _estado['arbol'] = None
+
+
+def _huella():
+    datos = Feria.objects.aggregate(total=Count('id_feria'), modificado=Max('modificado'))
+    return datos['total'], datos['modificado']
+
+
+def _arbol():
+    with _lock:
+        ahora = time.monotonic()
+        if _estado['arbol'] is not None and ahora < _estado['proxima_revision']:
+            return _estado['arbol']
+        huella = _huella()
+        if _estado['arbol'] is None or huella != _estado['huella']:
+            filas = Feria.objects.filter(latitud__isnull=False, longitud__isnull=False).values_list(
+                'id_feria', 'latitud', 'longitud'
+            )
+            _estado['arbol'] = ArbolKD([(_vector(float(lat), float(lon)), ident) for ident, lat, lon in filas])
+            _estado['huella'] = huella
+        _estado['proxima_revision'] = ahora + settings.INDICE_FERIAS_REVISION
+        return _estado['arbol']
+
+
+def ferias_cercanas(lat, lon, n=None, radio_km=None):
+    """
+    [(id_feria, distancia en km)] de la más cercana a la más lejana: las `n`
+    más cercanas, las que están a menos de `radio_km` o ambas condiciones.
+    Sin ninguna de las dos, las FERIAS_CERCANAS más cercanas.
+    """
+    arbol = _arbol()
+    if n is None:
+        n = arbol.total if radio_km is not None else settings.FERIAS_CERCANAS
+    max_cuerda = _km_a_cuerda(radio_km) if radio_km is not None else 2.0
+    return [
+        (ident, _cuerda_a_km(cuerda))
+        for cuerda, ident in arbol.cercanos(_vector(lat, lon), n, max_cuerda)
+    ]
+
+
+def leer_coordenadas(parametros):
+    """
+    (lat, lon, radio_km) desde ?lat=&lon=&radio= o None si no vienen.
+    ValueError si son inválidos.
+    """
+    if not parametros.get('lat') and not parametros.get('lon'):
+        return None
+    try:
+        lat, lon = float(parametros.get('lat')), float(parametros.get('lon'))
+        radio = float(parametros['radio']) if parametros.get('radio') else None
+    except (TypeError, ValueError):
+        raise ValueError('lat, lon y radio deben ser números')
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        raise ValueError('Coordenadas fuera de rango')
+    if radio is not None and not radio > 0:
+        raise ValueError('El radio debe ser positivo')
+    return lat, lon, radio
@@ -0,0 +1,149 @@
+"""
+Límite de intentos de inicio de sesión, compartido entre workers.
+
+Cada POST a login toma una ficha de dos cubetas (token bucket), una por IP
+y otra por email, antes de calcular el hash de la contraseña (PBKDF2, caro a
+propósito). Tras LOGIN_FALLOS_SIN_ESPERA fallos seguidos, la IP o el email
+deben esperar un tiempo que se duplica con cada nuevo fallo, hasta
+LOGIN_ESPERA_MAXIMA. Un acierto borra los fallos; las cubetas siguen
+limitando el ritmo de intentos de una IP aunque entre medio acierte.
+
+El estado vive en caches['compartida']. No hay operaciones atómicas, así que
+dos peticiones simultáneas pueden leer el mismo estado: a lo sumo pasa
+algún intento de más, nunca se bloquea de más.
+
+Para emails que no existen se verifica la contraseña contra un hash
+ficticio, así esa respuesta tarda lo mismo que una contraseña incorrecta.
+"""
+import hashlib
+import math
+import time
+from functools import lru_cache
+
+from django.conf import settings
+from django.contrib.auth.hashers import check_password, make_password
+from django.core.cache import caches
+
+from .models import Usuario
+
+RESULTADOS = ('exito', 'fallo', 'limitado')
+
+
+def _cache():
+    return caches['compartida']
+
+
+def ip_cliente(request):
+    """
+    Con un proxy delante se configura LOGIN_IP_CABECERA (p. ej.
+    HTTP_X_FORWARDED_FOR); se usa la última dirección, la que agregó el proxy.
+    """
+    valor = request.META.get(settings.LOGIN_IP_CABECERA) or request.META.get('REMOTE_ADDR', '')
+    return valor.split(',')[-1].strip()
+
+
+def _sujetos(ip, email):
+    """{clave de caché: (capacidad, fichas por segundo)}"""
+    # El email va resumido: las claves de la caché no guardan datos personales
+    resumen = hashlib.sha256(email.strip().lower().encode()).hexdigest()[:32]
+    return {
+        f'login_ip_{ip}': (settings.LOGIN_IP_CAPACIDAD, settings.LOGIN_IP_RECARGA),
+        f'login_email_{resumen}': (settings.LOGIN_EMAIL_CAPACIDAD, settings.LOGIN_EMAIL_RECARGA),
+    }
+
+
+def _estados(sujetos, ahora):
+    guardados = _cache().get_many(list(sujetos))
+    estados = {}
+    for clave, (capacidad, recarga) in sujetos.items():
+        estado = guardados.get(clave) or {'fichas': capacidad, 'ts': ahora, 'fallos': 0, 'hasta': 0}
+        estado['fichas'] = min(capacidad, estado['fichas'] + (ahora - estado['ts']) * recarga)
+        estado['ts'] = ahora
+        estados[clave] = estado
+    return estados
+
+
+def _contar(resultado):
+    clave = f'login_contador_{resultado}'
+    try:
+        _cache().incr(clave)
+    except ValueError:
+        if not _cache().add(clave, 1, None):
+            _cache().incr(clave)
+
+
+def consumir(ip, email):
+    """
+    Toma una ficha de la IP y del email. Retorna 0 si el intento puede
+    seguir, o los segundos que faltan para poder intentarlo.
+    """
+    ahora = time.time()
+    sujetos = _sujetos(ip, email)
+    estados = _estados(sujetos, ahora)
+
+    espera = 0
+    for clave, estado in estados.items():
+        if estado['hasta'] > ahora:
+            espera = max(espera, estado['hasta'] - ahora)
+        elif estado['fichas'] < 1:
+            espera = max(espera, (1 - estado['fichas']) / sujetos[clave][1])
+
+    if espera:
+        _contar('limitado')
+        return math.ceil(espera)
+
+    for estado in estados.values():
+        estado['fichas'] -= 1
+    _cache().set_many(estados, settings.LOGIN_ESTADO_TIMEOUT)
+    return 0
+
+
+def _registrar(ip, email, exito):
+    ahora = time.time()
+    sujetos = _sujetos(ip, email)
+    estados = _estados(sujetos, ahora)
+    for estado in estados.values():
+        if exito:
+            estado['fallos'], estado['hasta'] = 0, 0
+            continue
+        estado['fallos'] += 1
+        exceso = estado['fallos'] - settings.LOGIN_FALLOS_SIN_ESPERA
+        if exceso >= 0:
+            estado['hasta'] = ahora + min(settings.LOGIN_ESPERA_BASE * 2 ** exceso, settings.LOGIN_ESPERA_MAXIMA)
+    _cache().set_many(estados, settings.LOGIN_ESTADO_TIMEOUT)
+    _contar('exito' if exito else 'fallo')
+
+
+@lru_cache(maxsize=None)
+def _hash_ficticio():
+    # Mismo hasher y costo que las contraseñas reales
+    return make_password('hash ficticio para emails desconocidos')
+
+
+def autenticar(ip, email, contrasena):
+    """
+    Usuario si las credenciales son correctas, o None. Llamar después de
+    `consumir`; registra el resultado para la espera progresiva.
+    """
+    usuario = Usuario.objects.filter(email=email).first()
+    if usuario is None:
+        check_password(contrasena, _hash_ficticio())
+    elif check_password(contrasena, usuario.contrasena):
+        _registrar(ip, email, exito=True)
+        return usuario
+    _registrar(ip, email, exito=False)
+    return None
+
+
+def metricas():
+    """Contadores de todos los workers en formato de texto de Prometheus"""
+    totales = _cache().get_many([f'login_contador_{r}' for r in RESULTADOS])
+    lineas = [
+        '# HELP login_intentos_total Intentos de inicio de sesión por resultado',
+        '# TYPE login_intentos_total counter',
+    ]
+    for resultado in RESULTADOS:
+        lineas.append(
+            f'login_intentos_total{{resultado="{resultado}"}} {totales.get(f"login_contador_{resultado}", 0)}'
+        )
+    return '\n'.join(lineas) + '\n'
@@ -0,0 +1,42 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from appferiadigital import clima_guardado
+
+
+class Command(BaseCommand):
+    help = (
+        'Guarda en la base de datos el clima actual y el pronóstico de las '
+        'ciudades con ferias (ver clima_guardado.py). Primero resuelve la '
+        'ciudad de OpenWeatherMap de las ferias nuevas o que cambiaron de lugar. '
+        'Con --intervalo se repite indefinidamente cada N segundos.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--intervalo', type=int, default=0,
+            help='Segundos entre actualizaciones (0 = ejecutar una sola vez)'
+        )
+        parser.add_argument(
+            '--sin-pronostico', action='store_true',
+            help='Actualizar solo el clima actual'
+        )
+
+    def handle(self, *args, **options):
+        intervalo = options['intervalo']
+        while True:
+            self.actualizar(options['sin_pronostico'])
+            if intervalo <= 0:
+                break
+            time.sleep(intervalo)
+
+    def actualizar(self, sin_pronostico):
+        inicio = time.monotonic()
+        resueltas = clima_guardado.resolver_ciudades()
+        climas = clima_guardado.actualizar_snapshots()
+        pronosticos = 0 if sin_pronostico else clima_guardado.actualizar_pronosticos()
+        self.stdout.write(self.style.SUCCESS(
+            f'{resueltas} ferias con ciudad nueva; clima de {climas} ciudades y '
+            f'pronóstico de {pronosticos} en {time.monotonic() - inicio:.1f}s'
+        ))
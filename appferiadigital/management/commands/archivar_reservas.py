@@ -0,0 +1,37 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from appferiadigital.archivo_reservas import archivar
+
+
+class Command(BaseCommand):
+    help = (
+        'Mueve las reservas procesadas o canceladas más antiguas que '
+        'RESERVAS_ARCHIVO_DIAS a la tabla de archivo, en lotes de una transacción '
+        'cada uno. Pensado para ejecutarse periódicamente (cron).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dias', type=int, default=None,
+                            help='Antigüedad mínima en días (por defecto RESERVAS_ARCHIVO_DIAS)')
+        parser.add_argument('--lote', type=int, default=None,
+                            help='Reservas por lote (por defecto RESERVAS_ARCHIVO_LOTE)')
+        parser.add_argument('--max-lotes', type=int, default=None,
+                            help='Detenerse después de esta cantidad de lotes')
+        parser.add_argument('--pausa', type=float, default=0,
+                            help='Segundos de espera entre lotes, para repartir la carga')
+
+    def handle(self, *args, **options):
+        reservas = lineas = lotes = 0
+        for movidas, lineas_movidas in archivar(options['dias'], options['lote'], options['max_lotes']):
+            reservas += movidas
+            lineas += lineas_movidas
+            lotes += 1
+            if options['verbosity'] > 1:
+                self.stdout.write(f'lote {lotes}: {movidas} reservas, {lineas_movidas} líneas')
+            if options['pausa']:
+                time.sleep(options['pausa'])
+        self.stdout.write(self.style.SUCCESS(
+            f'{reservas} reservas ({lineas} líneas) archivadas en {lotes} lotes'
+        ))
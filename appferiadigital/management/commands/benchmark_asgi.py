@@ -0,0 +1,202 @@
+import json
+import math
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import reverse
+
+from appferiadigital.models import Feria
+
+# Respuesta mínima con la forma de OpenWeatherMap
+CLIMA_STUB = {
+    'main': {'temp': 18.2, 'feels_like': 17.5, 'humidity': 60, 'pressure': 1015},
+    'weather': [{'description': 'cielo claro', 'icon': '01d'}],
+    'wind': {'speed': 2.5, 'deg': 180},
+    'visibility': 10000,
+    'name': 'Stub',
+    'sys': {'country': 'CL', 'sunrise': 0, 'sunset': 0},
+    'dt': 0,
+}
+
+# Settings de los servidores: API del clima en el stub y sin caché, para
+# que cada petición espere al upstream lento
+SETTINGS_BENCHMARK = '''from {base} import *  # noqa
+WEATHER_API_URL = {url!r}
+CACHES = {{
+    'default': {{'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}},
+    'compartida': {{'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}},
+}}
+'''
+
+
+def _puerto_libre():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+class Command(BaseCommand):
+    help = (
+        'Compara el rendimiento de lista_ferias y detalle_feria con WSGI (gunicorn, '
+        'workers sync) y ASGI (uvicorn) cuando la API del clima es lenta, usando '
+        'un servidor local que responde con demora. Crea ferias temporales en la '
+        'base de datos configurada y las borra al terminar.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--demora', type=float, default=0.5, help='Demora del upstream (s)')
+        parser.add_argument('--workers', type=int, default=2, help='Procesos de cada servidor')
+        parser.add_argument('--concurrencia', type=int, default=16, help='Clientes simultáneos')
+        parser.add_argument('--duracion', type=float, default=10, help='Segundos de carga por caso')
+        parser.add_argument('--salida', default=None, help='Guardar los resultados en este JSON')
+
+    def handle(self, *args, **options):
+        demora = options['demora']
+
+        class Stub(BaseHTTPRequestHandler):
+            def do_GET(self):
+                time.sleep(demora)
+                cuerpo = json.dumps(CLIMA_STUB).encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(cuerpo)))
+                self.end_headers()
+                self.wfile.write(cuerpo)
+
+            def log_message(self, *args):
+                pass
+
+        stub = ThreadingHTTPServer(('127.0.0.1', 0), Stub)
+        threading.Thread(target=stub.serve_forever, daemon=True).start()
+
+        # Una feria (y ciudad) por cliente: sin caché, las peticiones simultáneas
+        # a una misma ciudad se esperarían entre sí por el lock de refresco
+        ferias = Feria.objects.bulk_create([
+            Feria(nombre_feria=f'Benchmark ASGI {i}', ciudad=f'Ciudad benchmark {i}')
+            for i in range(options['concurrencia'])
+        ])
+        resultados = []
+        try:
+            with tempfile.TemporaryDirectory() as directorio:
+                with open(os.path.join(directorio, 'settings_benchmark_asgi.py'), 'w') as archivo:
+                    archivo.write(SETTINGS_BENCHMARK.format(
+                        base=os.environ['DJANGO_SETTINGS_MODULE'],
+                        url=f'http://127.0.0.1:{stub.server_port}/data/2.5/weather',
+                    ))
+                entorno = dict(
+                    os.environ,
+                    DJANGO_SETTINGS_MODULE='settings_benchmark_asgi',
+                    PYTHONPATH=os.pathsep.join(filter(None, [directorio, str(settings.BASE_DIR),
+                                                             os.environ.get('PYTHONPATH')])),
+                )
+                for servidor in ('wsgi', 'asgi'):
+                    resultados += self._medir_servidor(servidor, entorno, ferias, options)
+        finally:
+            Feria.objects.filter(id_feria__in=[f.id_feria for f in ferias]).delete()
+            stub.shutdown()
+
+        self.stdout.write(f'\nUpstream con {demora}s de demora, {options["workers"]} workers, '
+                          f'{options["concurrencia"]} clientes')
+        self.stdout.write(f'{"vista":<15} {"servidor":<8} {"req/s":>8} {"p50 ms":>9} {"p95 ms":>9} {"errores":>8}')
+        for r in resultados:
+            self.stdout.write(
+                f'{r["vista"]:<15} {r["servidor"]:<8} {r["req_s"]:>8.1f} {r["ms_p50"]:>9.0f} '
+                f'{r["ms_p95"]:>9.0f} {r["errores"]:>8}'
+            )
+        if options['salida']:
+            with open(options['salida'], 'w') as archivo:
+                json.dump({
+                    'fecha': datetime.now().isoformat(timespec='seconds'),
+                    'demora': demora,
+                    'workers': options['workers'],
+                    'concurrencia': options['concurrencia'],
+                    'resultados': resultados,
+                }, archivo, indent=2, ensure_ascii=False)
+            self.stdout.write(self.style.SUCCESS(f'Resultados guardados en {options["salida"]}'))
+
+    def _iniciar(self, servidor, puerto, workers, entorno):
+        if servidor == 'wsgi':
+            comando = ['gunicorn', 'proyectoferiadigital.wsgi:application',
+                       '--workers', str(workers), '--bind', f'127.0.0.1:{puerto}', '--log-level', 'warning']
+        else:
+            comando = ['uvicorn', 'proyectoferiadigital.asgi:application',
+                       '--workers', str(workers), '--host', '127.0.0.1', '--port', str(puerto),
+                       '--log-level', 'warning', '--no-access-log']
+        comando = [sys.executable, '-m'] + comando
+        proceso = subprocess.Popen(comando, env=entorno, cwd=settings.BASE_DIR)
+
+        limite = time.monotonic() + 30
+        while time.monotonic() < limite:
+            if proceso.poll() is not None:
+                raise CommandError(f'{servidor}: el servidor terminó al iniciar ({" ".join(comando)})')
+            try:
+                requests.get(f'http://127.0.0.1:{puerto}/', timeout=1)
+                return proceso
+            except requests.RequestException:
+                time.sleep(0.2)
+        proceso.terminate()
+        raise CommandError(f'{servidor}: el servidor no respondió en 30s')
+
+    def _medir_servidor(self, servidor, entorno, ferias, options):
+        puerto = _puerto_libre()
+        proceso = self._iniciar(servidor, puerto, options['workers'], entorno)
+        base = f'http://127.0.0.1:{puerto}'
+        try:
+            casos = [
+                ('lista_ferias', lambda cliente, i: reverse('lista_ferias')),
+                ('detalle_feria', lambda cliente, i: reverse('detalle_feria', args=[ferias[cliente].id_feria])),
+            ]
+            return [
+                self._carga(servidor, nombre, base, url, options['concurrencia'], options['duracion'])
+                for nombre, url in casos
+            ]
+        finally:
+            proceso.terminate()
+            proceso.wait(timeout=30)
+
+    def _carga(self, servidor, vista, base, url, concurrencia, duracion):
+        self.stdout.write(f'{servidor}: {vista} durante {duracion}s...')
+        fin = time.monotonic() + duracion
+
+        def cliente(numero):
+            sesion = requests.Session()
+            tiempos, errores, i = [], 0, 0
+            while time.monotonic() < fin:
+                inicio = time.perf_counter()
+                try:
+                    respuesta = sesion.get(base + url(numero, i), headers={'Host': 'localhost'}, timeout=60)
+                    if respuesta.status_code != 200:
+                        errores += 1
+                except requests.RequestException:
+                    errores += 1
+                tiempos.append((time.perf_counter() - inicio) * 1000)
+                i += 1
+            return tiempos, errores
+
+        inicio = time.monotonic()
+        with ThreadPoolExecutor(max_workers=concurrencia) as pool:
+            partes = list(pool.map(cliente, range(concurrencia)))
+        transcurrido = time.monotonic() - inicio
+
+        tiempos = sorted(t for parte, _ in partes for t in parte)
+        return {
+            'servidor': servidor,
+            'vista': vista,
+            'peticiones': len(tiempos),
+            'errores': sum(errores for _, errores in partes),
+            'req_s': round(len(tiempos) / transcurrido, 2),
+            'ms_p50': round(statistics.median(tiempos), 1) if tiempos else None,
+            'ms_p95': round(tiempos[math.ceil(len(tiempos) * 0.95) - 1], 1) if tiempos else None,
+        }
@@ -0,0 +1,85 @@
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Q
+
+from appferiadigital.busqueda_service import BusquedaService
+from appferiadigital.models import Categoria, Feria, Producto, Puesto, Usuario
+
+NOMBRES = [
+    'Plátano', 'Manzana', 'Limón', 'Tomate', 'Palta', 'Cebolla', 'Papa', 'Zanahoria',
+    'Lechuga', 'Ají', 'Durazno', 'Frutilla', 'Choclo', 'Zapallo', 'Pepino', 'Melón',
+]
+VARIEDADES = ['orgánico', 'hass', 'cherry', 'verde', 'rojo', 'del valle', 'premium', 'granel']
+CONSULTAS = ['platano', 'Limón', 'palta hass', 'toma', 'frutilla organico', 'inexistente']
+
+
+class Command(BaseCommand):
+    help = (
+        'Compara la búsqueda indexada contra nombre_producto__icontains con '
+        'datos sintéticos. Todo se hace dentro de una transacción que se revierte.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tamanos', type=int, nargs='+', default=[10_000, 100_000, 1_000_000])
+        parser.add_argument('--repeticiones', type=int, default=5)
+
+    def handle(self, *args, **options):
+        self.stdout.write(f'Motor: {connection.vendor}')
+        self.stdout.write(f'{"productos":>10} {"consulta":>18} {"icontains ms":>13} {"índice ms":>10}')
+        with transaction.atomic():
+            puesto = self._crear_puesto()
+            creados = 0
+            for tamano in sorted(options['tamanos']):
+                self._crear_productos(puesto, tamano - creados)
+                creados = tamano
+                self._medir(tamano, options['repeticiones'])
+            transaction.set_rollback(True)
+
+    def _crear_puesto(self):
+        vendedor = Usuario.objects.create(
+            rut='00000000-0', nombre='Benchmark', rol='vendedor',
+            email='benchmark@feriadigital.invalid', contrasena='!'
+        )
+        feria = Feria.objects.create(nombre_feria='Feria Benchmark')
+        self.categoria = Categoria.objects.create(nombre='Verduras')
+        return Puesto.objects.create(id_feria=feria, id_usuario=vendedor)
+
+    def _crear_productos(self, puesto, cantidad, lote=10_000):
+        azar = random.Random(cantidad)
+        primer_id = (Producto.objects.order_by('-id_producto')
+                     .values_list('id_producto', flat=True).first() or 0)
+        for inicio in range(0, cantidad, lote):
+            Producto.objects.bulk_create([
+                Producto(
+                    id_puesto=puesto,
+                    id_categoria=self.categoria,
+                    nombre_producto=f'{azar.choice(NOMBRES)} {azar.choice(VARIEDADES)} {azar.randint(1, 999)}',
+                    stock=azar.randint(0, 50),
+                )
+                for _ in range(min(lote, cantidad - inicio))
+            ])
+        BusquedaService.indexar(Q(id_producto__gt=primer_id), lote=lote)
+
+    def _medir(self, tamano, repeticiones):
+        base = Producto.objects.filter(stock__gt=0)
+        for consulta in CONSULTAS:
+            icontains = self._tiempo(
+                lambda: list(base.filter(nombre_producto__icontains=consulta)[:100]), repeticiones
+            )
+            indice = self._tiempo(
+                lambda: list(BusquedaService.buscar(consulta, base, limite=100)), repeticiones
+            )
+            self.stdout.write(f'{tamano:>10} {consulta:>18} {icontains:>13.2f} {indice:>10.2f}')
+
+    @staticmethod
+    def _tiempo(funcion, repeticiones):
+        tiempos = []
+        for _ in range(repeticiones):
+            inicio = time.perf_counter()
+            funcion()
+            tiempos.append((time.perf_counter() - inicio) * 1000)
+        return statistics.median(tiempos)
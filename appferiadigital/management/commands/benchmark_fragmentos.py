@@ -0,0 +1,78 @@
+import statistics
+import time
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.core.signals import request_finished, request_started
+from django.db import close_old_connections, connection, reset_queries, transaction
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from appferiadigital.datos_sinteticos import generar
+
+
+class Command(BaseCommand):
+    help = (
+        'Compara detalle_feria y lista_puestos con y sin fragmentos en caché, '
+        'sobre una feria con muchos puestos en una sola página. Los datos se '
+        'generan dentro de una transacción que se revierte.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--puestos', type=int, default=500)
+        parser.add_argument('--productos', type=int, default=2000)
+        parser.add_argument('--repeticiones', type=int, default=5)
+
+    def handle(self, *args, **options):
+        puestos = options['puestos']
+        # Ver benchmark_vistas: la transacción debe sobrevivir a cada petición
+        request_started.disconnect(close_old_connections)
+        request_finished.disconnect(close_old_connections)
+        try:
+            with transaction.atomic(), override_settings(PAGINACION_TAMANO_MAXIMO=puestos):
+                ejemplo = generar(1, puestos, options['productos'], 0)['ejemplo']
+                cliente = Client(HTTP_HOST='localhost')
+                sesion = cliente.session
+                sesion.update({
+                    'usuario_id': ejemplo['cliente'].id_usuario,
+                    'usuario_rol': 'cliente',
+                    'usuario_nombre': ejemplo['cliente'].nombre,
+                })
+                sesion.save()
+
+                self.stdout.write(f'{puestos} puestos en una página, {options["repeticiones"]} repeticiones')
+                self.stdout.write(f'{"vista":<15} {"modo":<16} {"consultas":>9} {"mediana ms":>11}')
+                for nombre, url in (
+                    ('detalle_feria', reverse('detalle_feria', args=[ejemplo['feria_id']])),
+                    ('lista_puestos', reverse('lista_puestos')),
+                ):
+                    url += f'?tamano={puestos}'
+                    with override_settings(FRAGMENTOS_CACHE_HABILITADOS=False):
+                        sin_cache = self._medir(cliente, url, options['repeticiones'])
+                    cache.clear()
+                    cliente.get(url)  # llena la caché de fragmentos
+                    con_cache = self._medir(cliente, url, options['repeticiones'])
+
+                    for modo, (consultas, mediana) in (('sin caché', sin_cache), ('caché caliente', con_cache)):
+                        self.stdout.write(f'{nombre:<15} {modo:<16} {consultas:>9} {mediana:>11.2f}')
+                    self.stdout.write(self.style.SUCCESS(
+                        f'{nombre}: {100 * (1 - con_cache[1] / sin_cache[1]):.0f}% menos tiempo'
+                    ))
+                transaction.set_rollback(True)
+        finally:
+            request_started.connect(close_old_connections)
+            request_finished.connect(close_old_connections)
+            cache.clear()
+
+    @staticmethod
+    def _medir(cliente, url, repeticiones):
+        reset_queries()
+        with CaptureQueriesContext(connection) as consultas:
+            cliente.get(url)
+        tiempos = []
+        for _ in range(repeticiones):
+            inicio = time.perf_counter()
+            cliente.get(url)
+            tiempos.append((time.perf_counter() - inicio) * 1000)
+        return len(consultas), statistics.median(tiempos)
@@ -0,0 +1,137 @@
+import json
+import math
+import platform
+import statistics
+import time
+from datetime import datetime
+
+import django
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.core.signals import request_finished, request_started
+from django.db import close_old_connections, connection, reset_queries, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from appferiadigital import urls
+from appferiadigital.datos_sinteticos import generar
+
+
+class Command(BaseCommand):
+    help = (
+        'Mide todas las vistas de appferiadigital/urls.py con el cliente de pruebas '
+        'en varios tamaños de datos y guarda los resultados en JSON. Los datos se '
+        'generan dentro de una transacción que se revierte.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ferias', type=int, default=5)
+        parser.add_argument('--puestos', type=int, default=50)
+        parser.add_argument('--productos', type=int, default=1000)
+        parser.add_argument('--reservas', type=int, default=2000)
+        parser.add_argument('--escalas', type=int, nargs='+', default=[1, 5, 25],
+                            help='Multiplicadores de las cantidades anteriores')
+        parser.add_argument('--repeticiones', type=int, default=5)
+        parser.add_argument('--salida', default=None,
+                            help='Archivo JSON (por defecto benchmark_vistas_<fecha>.json)')
+
+    def handle(self, *args, **options):
+        # El cliente de pruebas cierra la conexión al terminar cada petición,
+        # lo que descartaría la transacción con los datos generados
+        request_started.disconnect(close_old_connections)
+        request_finished.disconnect(close_old_connections)
+        resultados = []
+        try:
+            for escala in options['escalas']:
+                tamano = {
+                    clave: options[clave] * escala
+                    for clave in ('ferias', 'puestos', 'productos', 'reservas')
+                }
+                with transaction.atomic():
+                    cache.clear()
+                    resumen = generar(**tamano, semilla=escala)
+                    resultados += self._medir(tamano, resumen['ejemplo'], options['repeticiones'])
+                    transaction.set_rollback(True)
+                cache.clear()
+        finally:
+            request_started.connect(close_old_connections)
+            request_finished.connect(close_old_connections)
+
+        salida = options['salida'] or f'benchmark_vistas_{datetime.now():%Y%m%d_%H%M%S}.json'
+        with open(salida, 'w') as archivo:
+            json.dump({
+                'fecha': datetime.now().isoformat(timespec='seconds'),
+                'motor': connection.vendor,
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'repeticiones': options['repeticiones'],
+                'resultados': resultados,
+            }, archivo, indent=2, ensure_ascii=False)
+        self.stdout.write(self.style.SUCCESS(f'Resultados guardados en {salida}'))
+
+    def _rutas(self, ejemplo):
+        for patron in urls.urlpatterns:
+            parametros = patron.pattern.converters
+            if any(ejemplo.get(nombre) is None for nombre in parametros):
+                continue
+            url = reverse(patron.name, kwargs={nombre: ejemplo[nombre] for nombre in parametros})
+            roles = getattr(patron.callback, 'roles', None)
+            if roles is None:
+                usuario = None
+            elif 'vendedor' in roles:
+                usuario = ejemplo['vendedor']
+            else:
+                usuario = ejemplo['cliente']
+            yield patron.name, url, usuario
+
+    @staticmethod
+    def _iniciar_sesion(cliente, usuario):
+        cliente.cookies.clear()
+        if usuario is not None:
+            sesion = cliente.session
+            sesion.update({
+                'usuario_id': usuario.id_usuario,
+                'usuario_rol': usuario.rol,
+                'usuario_nombre': usuario.nombre,
+            })
+            sesion.save()
+
+    def _medir(self, tamano, ejemplo, repeticiones):
+        etiqueta = ' '.join(f'{clave}={valor}' for clave, valor in tamano.items())
+        self.stdout.write(f'\n{etiqueta}')
+        self.stdout.write(f'{"vista":<22} {"estado":>6} {"consultas":>9} {"mediana ms":>11} {"p95 ms":>8}')
+        cliente = Client(HTTP_HOST='localhost')
+        resultados = []
+        for nombre, url, usuario in self._rutas(ejemplo):
+            # Primera petición sin medir (cachés frías), luego una para contar consultas
+            self._iniciar_sesion(cliente, usuario)
+            cliente.get(url)
+            self._iniciar_sesion(cliente, usuario)
+            reset_queries()  # con DEBUG el registro de consultas tiene un máximo
+            with CaptureQueriesContext(connection) as consultas:
+                respuesta = cliente.get(url)
+
+            tiempos = []
+            for _ in range(repeticiones):
+                self._iniciar_sesion(cliente, usuario)
+                inicio = time.perf_counter()
+                cliente.get(url)
+                tiempos.append((time.perf_counter() - inicio) * 1000)
+
+            resultado = {
+                'tamano': tamano,
+                'vista': nombre,
+                'url': url,
+                'rol': usuario.rol if usuario else None,
+                'estado': respuesta.status_code,
+                'consultas': len(consultas),
+                'ms_mediana': round(statistics.median(tiempos), 3),
+                'ms_p95': round(sorted(tiempos)[math.ceil(len(tiempos) * 0.95) - 1], 3),
+            }
+            resultados.append(resultado)
+            self.stdout.write(
+                f'{nombre:<22} {resultado["estado"]:>6} {resultado["consultas"]:>9} '
+                f'{resultado["ms_mediana"]:>11.2f} {resultado["ms_p95"]:>8.2f}'
+            )
+        return resultados
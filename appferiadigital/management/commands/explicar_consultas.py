@@ -0,0 +1,160 @@
+import json
+import re
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Count, Q
+
+from appferiadigital.archivo_reservas import candidatas
+from appferiadigital.datos_sinteticos import generar
+from appferiadigital.models import (
+    EstadisticaVendedor, Feria, Producto, Puesto, Reserva, Usuario,
+)
+
+TAMANO_PAGINA = 25
+
+
+class Command(BaseCommand):
+    help = (
+        'Ejecuta EXPLAIN sobre las consultas principales de cada vista y marca los '
+        'escaneos secuenciales sobre tablas grandes. Termina con error si encuentra '
+        'alguno no permitido, así sirve como prueba de regresión de los planes.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--generar', type=int, nargs=4, metavar=('FERIAS', 'PUESTOS', 'PRODUCTOS', 'RESERVAS'),
+                            help='Generar estos datos dentro de una transacción que se revierte')
+        parser.add_argument('--filas-minimas', type=int, default=1000,
+                            help='Tablas con menos filas no se consideran grandes')
+        parser.add_argument('--plan', action='store_true', help='Mostrar el plan de todas las consultas')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            if options['generar']:
+                generar(*options['generar'])
+            self._analizar_estadisticas()
+            problemas = self._revisar(options['filas_minimas'], options['plan'])
+            transaction.set_rollback(True)
+
+        if problemas:
+            raise CommandError(
+                f'{len(problemas)} escaneos secuenciales sobre tablas grandes: ' + '; '.join(problemas)
+            )
+        self.stdout.write(self.style.SUCCESS('Sin escaneos secuenciales sobre tablas grandes'))
+
+    @staticmethod
+    def _analizar_estadisticas():
+        # Sin estadísticas el planificador no conoce el tamaño de las tablas
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def _consultas(self):
+        """
+        (vista, queryset, tablas que se pueden recorrer completas) con los mismos
+        filtros y órdenes que usan las vistas.
+        """
+        vendedor = Usuario.objects.filter(rol='vendedor').annotate(
+            n=Count('puestos')
+        ).order_by('-n').first()
+        cliente = Reserva.objects.values_list('id_usuario_id', flat=True).first()
+        puesto = Producto.objects.values_list('id_puesto_id', flat=True).first()
+        feria = Puesto.objects.values_list('id_feria_id', flat=True).first()
+        producto = Producto.objects.values_list('id_producto', flat=True).first()
+
+        productos_vendedor = Producto.objects.filter(
+            id_puesto__in=Puesto.objects.filter(id_usuario=vendedor)
+        )
+        reservas_vendedor = Reserva.objects.filter(
+            Q(id_producto__in=productos_vendedor) | Q(reservaproducto__id_producto__in=productos_vendedor)
+        )
+
+        return [
+            ('lista_puestos', Puesto.objects.select_related('id_feria', 'id_usuario')
+             .order_by('id_puesto')[:TAMANO_PAGINA], set()),
+            # Lista todas las ferias a propósito (sin paginar)
+            ('lista_ferias', Feria.objects.all(), {Feria._meta.db_table}),
+
+            ('detalle_feria', Puesto.objects.filter(id_feria=feria).select_related('id_usuario')
+             .order_by('id_puesto')[:TAMANO_PAGINA], set()),
+            ('detalle_puesto', Producto.objects.filter(id_puesto=puesto).select_related('id_categoria'), set()),
+            ('crear_reserva', Producto.objects.filter(id_producto=producto).values_list('id_puesto_id'), set()),
+            ('mis_reservas_cliente', Reserva.objects.filter(id_usuario=cliente)
+             .order_by('-fecha_reserva', '-id_reserva')[:TAMANO_PAGINA], set()),
+            ('mis_reservas', reservas_vendedor.distinct()
+             .order_by('-fecha_reserva', '-id_reserva')[:TAMANO_PAGINA], set()),
+            ('mis_productos', productos_vendedor.select_related('id_puesto', 'id_categoria')
+             .order_by('id_puesto', 'nombre_producto', 'id_producto')[:TAMANO_PAGINA], set()),
+            ('buscar_productos', Producto.objects.filter(stock__gt=0)
+             .select_related('id_puesto__id_feria', 'id_categoria')
+             .order_by('id_producto')[:TAMANO_PAGINA], set()),
+            ('estadisticas_vendedor', EstadisticaVendedor.objects.filter(id_usuario=vendedor), set()),
+            ('recalcular_estadisticas', reservas_vendedor.filter(
+                fecha_reserva__gte=date.today() - timedelta(days=7), estado=Reserva.PENDIENTE,
+            ).values('fecha_reserva').annotate(n=Count('id_reserva', distinct=True)), set()),
+            ('archivar_reservas', candidatas(date.today() - timedelta(days=90))
+             .values_list('id_reserva', flat=True)[:TAMANO_PAGINA], set()),
+        ]
+
+    def _revisar(self, filas_minimas, mostrar_plan):
+        filas = {}
+        problemas = []
+        for vista, queryset, permitidas in self._consultas():
+            if connection.vendor == 'postgresql':
+                escaneadas, plan = self._escaneos_postgres(queryset)
+            else:
+                escaneadas, plan = self._escaneos_sqlite(queryset)
+
+            marcadas = []
+            for tabla in sorted(escaneadas - permitidas):
+                if tabla not in filas:
+                    with connection.cursor() as cursor:
+                        cursor.execute(f'SELECT COUNT(*) FROM {connection.ops.quote_name(tabla)}')
+                        filas[tabla] = cursor.fetchone()[0]
+                if filas[tabla] >= filas_minimas:
+                    marcadas.append(f'{tabla} ({filas[tabla]} filas)')
+
+            estado = self.style.ERROR('ESCANEO ' + ', '.join(marcadas)) if marcadas else self.style.SUCCESS('ok')
+            self.stdout.write(f'{vista:<24} {estado}')
+            if mostrar_plan or marcadas:
+                for linea in plan.splitlines():
+                    self.stdout.write(f'    {linea}')
+            problemas += [f'{vista}: {tabla}' for tabla in marcadas]
+        return problemas
+
+    @staticmethod
+    def _escaneos_postgres(queryset):
+        plan = json.loads(queryset.explain(format='json'))[0]['Plan']
+        escaneadas = set()
+        pendientes = [plan]
+        while pendientes:
+            nodo = pendientes.pop()
+            if nodo.get('Node Type') == 'Seq Scan':
+                escaneadas.add(nodo['Relation Name'])
+            pendientes += nodo.get('Plans', [])
+        return escaneadas, queryset.explain()
+
+    @staticmethod
+    def _escaneos_sqlite(queryset):
+        plan = queryset.explain()
+        # Las subconsultas usan alias (U0, V0...): se traducen desde el SQL
+        sql = str(queryset.query)
+        alias = dict((a, t) for t, a in re.findall(r'"(\w+)" ([A-Z]\d+)\b', sql))
+        # Un SCAN de la tabla principal en orden de clave primaria con LIMIT y
+        # sin ordenamiento temporal se detiene al completar la página
+        query = queryset.query
+        modelo = query.model
+        en_orden_pk = (
+            query.high_mark is not None
+            and query.order_by[:1] in ((modelo._meta.pk.name,), ('pk',))
+            and 'TEMP B-TREE' not in plan
+        )
+        escaneadas = set()
+        for linea in plan.splitlines():
+            # "SCAN tabla" sin "USING ... INDEX" es un recorrido completo
+            coincidencia = re.search(r'\bSCAN (\w+)', linea)
+            if coincidencia and 'INDEX' not in linea:
+                tabla = alias.get(coincidencia.group(1), coincidencia.group(1))
+                if not (en_orden_pk and tabla == modelo._meta.db_table):
+                    escaneadas.add(tabla)
+        return escaneadas, plan
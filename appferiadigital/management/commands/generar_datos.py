@@ -0,0 +1,33 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from appferiadigital.datos_sinteticos import CONTRASENA, generar
+
+
+class Command(BaseCommand):
+    help = 'Carga datos sintéticos (usuarios, ferias, puestos, productos y reservas) en bloque.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ferias', type=int, default=10)
+        parser.add_argument('--puestos', type=int, default=100)
+        parser.add_argument('--productos', type=int, default=2000)
+        parser.add_argument('--reservas', type=int, default=5000)
+        parser.add_argument('--semilla', type=int, default=0)
+        parser.add_argument('--lote', type=int, default=5000, help='Filas por INSERT')
+
+    def handle(self, *args, **options):
+        inicio = time.perf_counter()
+        resumen = generar(
+            options['ferias'], options['puestos'], options['productos'], options['reservas'],
+            semilla=options['semilla'], lote=options['lote'],
+        )
+        duracion = time.perf_counter() - inicio
+        self.stdout.write(self.style.SUCCESS(
+            f"{resumen['ferias']} ferias, {resumen['puestos']} puestos, {resumen['productos']} productos, "
+            f"{resumen['reservas']} reservas, {resumen['vendedores']} vendedores y "
+            f"{resumen['clientes']} clientes en {duracion:.1f}s"
+        ))
+        ejemplo = resumen['ejemplo']
+        for usuario in (ejemplo['vendedor'], ejemplo['cliente']):
+            self.stdout.write(f'  {usuario.rol}: {usuario.email} / {CONTRASENA}')
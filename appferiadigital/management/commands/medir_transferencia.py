@@ -0,0 +1,79 @@
+import re
+import tempfile
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.core.signals import request_finished, request_started
+from django.db import close_old_connections, transaction
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from appferiadigital.datos_sinteticos import generar
+
+RECURSO = re.compile(r'(?:href|src)="(/static/[^"]+)"')
+
+
+class Command(BaseCommand):
+    help = (
+        'Mide los bytes que transfiere cada página: el HTML más los CSS/JS '
+        'propios, en la primera visita y en las siguientes (con los recursos '
+        'ya en la caché del navegador). Corre collectstatic en un directorio '
+        'temporal y sirve los archivos con WhiteNoise, como en producción. '
+        'Los datos se generan dentro de una transacción que se revierte.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--productos', type=int, default=40)
+
+    def handle(self, *args, **options):
+        # Ver benchmark_vistas: la transacción debe sobrevivir a cada petición
+        request_started.disconnect(close_old_connections)
+        request_finished.disconnect(close_old_connections)
+        try:
+            with tempfile.TemporaryDirectory() as directorio, \
+                    override_settings(STATIC_ROOT=directorio, DEBUG=False), transaction.atomic():
+                call_command('collectstatic', interactive=False, verbosity=0)
+                ejemplo = generar(1, 1, options['productos'], 0)['ejemplo']
+                self._informe(ejemplo)
+                transaction.set_rollback(True)
+        finally:
+            request_started.connect(close_old_connections)
+            request_finished.connect(close_old_connections)
+
+    def _informe(self, ejemplo):
+        # Cliente nuevo: WhiteNoise lee STATIC_ROOT al crear el middleware
+        anonimo = Client(HTTP_HOST='localhost')
+        cliente = Client(HTTP_HOST='localhost')
+        sesion = cliente.session
+        sesion.update({
+            'usuario_id': ejemplo['cliente'].id_usuario,
+            'usuario_rol': 'cliente',
+            'usuario_nombre': ejemplo['cliente'].nombre,
+        })
+        sesion.save()
+
+        self.stdout.write(
+            f'{"página":<15} {"HTML":>8} {"recursos":>9} {"CSS/JS":>8} {"1ª visita":>10} {"siguientes":>11}'
+        )
+        for nombre, navegador, url in (
+            ('login', anonimo, reverse('login')),
+            ('lista_ferias', cliente, reverse('lista_ferias')),
+            ('detalle_puesto', cliente, reverse('detalle_puesto', args=[ejemplo['id_puesto']])),
+        ):
+            html = len(navegador.get(url).content)
+            recursos = primera = siguientes = 0
+            for ruta in dict.fromkeys(RECURSO.findall(navegador.get(url).content.decode())):
+                respuesta = navegador.get(ruta, HTTP_ACCEPT_ENCODING='br, gzip')
+                if respuesta.status_code != 200:
+                    self.stderr.write(f'{ruta}: {respuesta.status_code}')
+                    continue
+                tamano = len(b''.join(respuesta.streaming_content))
+                recursos += 1
+                primera += tamano
+                # Sin immutable el navegador vuelve a preguntar (304, sin cuerpo)
+                if 'immutable' not in respuesta.get('Cache-Control', ''):
+                    siguientes += len(respuesta.serialize_headers())
+            self.stdout.write(
+                f'{nombre:<15} {html:>8} {recursos:>9} {primera:>8} {html + primera:>10} {html + siguientes:>11}'
+            )
+        self.stdout.write('Bytes de cuerpo (y cabeceras de revalidación); el HTML sin comprimir, como lo envía Django')
@@ -0,0 +1,56 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from appferiadigital.clima_service import ClimaService, _en_hilo
+from appferiadigital.models import Feria
+
+
+class Command(BaseCommand):
+    help = (
+        'Refresca en caché el clima de todas las ciudades (o celdas, para las '
+        'ferias con coordenadas) con ferias. '
+        'Con --intervalo se repite indefinidamente cada N segundos.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--intervalo', type=int, default=0,
+            help='Segundos entre refrescos (0 = ejecutar una sola vez)'
+        )
+
+    def handle(self, *args, **options):
+        intervalo = options['intervalo']
+        while True:
+            self.refrescar()
+            if intervalo <= 0:
+                break
+            time.sleep(intervalo)
+
+    def refrescar(self):
+        # Un lugar por ciudad o por celda de la grilla
+        lugares = {}
+        for feria in Feria.objects.only('ciudad', 'latitud', 'longitud'):
+            lugar = feria.lugar_clima
+            if ClimaService._es_lugar(lugar):
+                lugares.setdefault(ClimaService._normalizar_lugar(lugar), lugar)
+
+        if not lugares:
+            self.stdout.write('No hay ciudades para refrescar')
+            return
+
+        inicio = time.monotonic()
+        max_workers = min(settings.WEATHER_MAX_WORKERS, len(lugares))
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            resultados = list(executor.map(
+                lambda lugar: _en_hilo(ClimaService.refrescar_clima, lugar),
+                lugares.values(),
+            ))
+
+        exitosas = sum(1 for clima in resultados if clima)
+        self.stdout.write(self.style.SUCCESS(
+            f'Clima refrescado para {exitosas}/{len(lugares)} ciudades o celdas '
+            f'en {time.monotonic() - inicio:.1f}s'
+        ))
@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from appferiadigital.estadisticas_service import EstadisticasService
+from appferiadigital.models import Usuario
+
+
+class Command(BaseCommand):
+    help = (
+        'Reconstruye las estadísticas de los vendedores desde reservas y productos. '
+        'Con --verificar solo compara y falla si alguna se desvió.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--verificar', action='store_true',
+                            help='Reportar diferencias sin corregirlas')
+        parser.add_argument('--vendedor', type=int, nargs='+',
+                            help='IDs de usuario a procesar (por defecto todos los vendedores)')
+
+    def handle(self, *args, **options):
+        vendedores = options['vendedor'] or list(
+            Usuario.objects.filter(rol='vendedor').values_list('id_usuario', flat=True)
+        )
+
+        if not options['verificar']:
+            for vendedor_id in vendedores:
+                EstadisticasService.recalcular(vendedor_id)
+            self.stdout.write(self.style.SUCCESS(f'{len(vendedores)} vendedores recalculados'))
+            return
+
+        con_diferencias = 0
+        for vendedor_id in vendedores:
+            diferencias = EstadisticasService.diferencias(vendedor_id)
+            if diferencias:
+                con_diferencias += 1
+                for campo, (guardado, real) in diferencias.items():
+                    self.stdout.write(f'vendedor {vendedor_id} {campo}: guardado={guardado} real={real}')
+        if con_diferencias:
+            raise CommandError(f'{con_diferencias} de {len(vendedores)} vendedores con diferencias')
+        self.stdout.write(self.style.SUCCESS(f'{len(vendedores)} vendedores sin diferencias'))
@@ -0,0 +1,324 @@
+"""
+Métricas por vista en formato de texto de Prometheus.
+
+MetricasMiddleware mide cada petición y la acumula por nombre de URL:
+histograma de latencia, consultas SQL (cantidad y tiempo), aciertos y fallos
+de caché, aciertos y fallos de fragmentos de plantilla y llamadas HTTP
+salientes (cantidad y tiempo).
+
+Cada proceso acumula en memoria y cada METRICAS_INTERVALO segundos escribe
+su instantánea en METRICAS_DIR/<pid>.json (un solo escritor por archivo).
+El endpoint suma los archivos de todos los workers de gunicorn; los de
+workers que ya terminaron se borran al leerlos.
+"""
+import json
+import os
+import tempfile
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+# Límites superiores (segundos) del histograma de latencia
+BUCKETS_LATENCIA = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+_medicion_actual = ContextVar('medicion_actual', default=None)
+
+
+class Medicion:
+    """Contadores de una petición; las llamadas HTTP pueden venir de otros hilos"""
+    __slots__ = ('consultas', 'consultas_segundos', 'cache_aciertos', 'cache_fallos',
+                 'fragmentos_aciertos', 'fragmentos_fallos', 'http', 'http_segundos', '_lock')
+
+    def __init__(self):
+        self.consultas = 0
+        self.consultas_segundos = 0.0
+        self.cache_aciertos = 0
+        self.cache_fallos = 0
+        self.fragmentos_aciertos = 0
+        self.fragmentos_fallos = 0
+        self.http = 0
+        self.http_segundos = 0.0
+        self._lock = threading.Lock()
+
+
+def medir_consulta(execute, sql, params, many, context):
+    """
+    execute_wrapper fijo de cada conexión (ver signals.instalar_metricas):
+    las conexiones son por hilo, así que la medición de la petición llega por
+    el contexto, que sync_to_async copia al hilo donde corren las consultas
+    """
+    medicion = _medicion_actual.get()
+    if medicion is None:
+        return execute(sql, params, many, context)
+    inicio = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        with medicion._lock:
+            medicion.consultas += 1
+            medicion.consultas_segundos += time.perf_counter() - inicio
+
+
+def instalar_en_conexion(conexion):
+    if medir_consulta not in conexion.execute_wrappers:
+        conexion.execute_wrappers.append(medir_consulta)
+
+
+def registrar_cache(aciertos, fallos=0):
+    medicion = _medicion_actual.get()
+    if medicion is not None:
+        with medicion._lock:
+            medicion.cache_aciertos += aciertos
+            medicion.cache_fallos += fallos
+
+
+def registrar_fragmento(acierto):
+    medicion = _medicion_actual.get()
+    if medicion is not None:
+        with medicion._lock:
+            if acierto:
+                medicion.fragmentos_aciertos += 1
+            else:
+                medicion.fragmentos_fallos += 1
+
+
+def registrar_http(duracion):
+    medicion = _medicion_actual.get()
+    if medicion is not None:
+        with medicion._lock:
+            medicion.http += 1
+            medicion.http_segundos += duracion
+
+
+def _vista_vacia():
+    return {
+        'peticiones': {},
+        'latencia_buckets': [0] * (len(BUCKETS_LATENCIA) + 1),
+        'latencia_suma': 0.0,
+        'consultas': 0,
+        'consultas_segundos': 0.0,
+        'cache_aciertos': 0,
+        'cache_fallos': 0,
+        'fragmentos_aciertos': 0,
+        'fragmentos_fallos': 0,
+        'http': 0,
+        'http_segundos': 0.0,
+    }
+
+
+class RegistroMetricas:
+    """Acumulado del proceso, por nombre de vista"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._vistas = {}
+
+    def registrar(self, vista, estado, duracion, medicion):
+        with self._lock:
+            datos = self._vistas.get(vista)
+            if datos is None:
+                datos = self._vistas[vista] = _vista_vacia()
+            datos['peticiones'][estado] = datos['peticiones'].get(estado, 0) + 1
+            datos['latencia_buckets'][bisect_left(BUCKETS_LATENCIA, duracion)] += 1
+            datos['latencia_suma'] += duracion
+            datos['consultas'] += medicion.consultas
+            datos['consultas_segundos'] += medicion.consultas_segundos
+            datos['cache_aciertos'] += medicion.cache_aciertos
+            datos['cache_fallos'] += medicion.cache_fallos
+            datos['fragmentos_aciertos'] += medicion.fragmentos_aciertos
+            datos['fragmentos_fallos'] += medicion.fragmentos_fallos
+            datos['http'] += medicion.http
+            datos['http_segundos'] += medicion.http_segundos
+
+    def instantanea(self):
+        with self._lock:
+            return json.loads(json.dumps(self._vistas))
+
+    def reiniciar(self):
+        with self._lock:
+            self._vistas = {}
+
+
+registro = RegistroMetricas()
+_ultima_escritura = 0.0
+
+
+def combinar(instantaneas):
+    total = {}
+    for vistas in instantaneas:
+        for vista, datos in vistas.items():
+            acumulado = total.setdefault(vista, _vista_vacia())
+            for clave, valor in datos.items():
+                if clave == 'peticiones':
+                    for estado, n in valor.items():
+                        acumulado['peticiones'][estado] = acumulado['peticiones'].get(estado, 0) + n
+                elif clave == 'latencia_buckets':
+                    acumulado[clave] = [a + b for a, b in zip(acumulado[clave], valor)]
+                else:
+                    acumulado[clave] += valor
+    return total
+
+
+# ---------- Instantáneas por worker ----------
+
+def _archivo_proceso():
+    return os.path.join(settings.METRICAS_DIR, f'{os.getpid()}.json')
+
+
+def _toca_escribir():
+    """True cada METRICAS_INTERVALO segundos (se marca antes de escribir)"""
+    global _ultima_escritura
+    ahora = time.monotonic()
+    if ahora - _ultima_escritura < settings.METRICAS_INTERVALO:
+        return False
+    _ultima_escritura = ahora
+    return True
+
+
+def escribir_instantanea():
+    """Escribe el acumulado de este proceso (reemplazo atómico del archivo)"""
+    if not settings.METRICAS_DIR:
+        return
+    os.makedirs(settings.METRICAS_DIR, exist_ok=True)
+    descriptor, temporal = tempfile.mkstemp(dir=settings.METRICAS_DIR, suffix='.tmp')
+    with os.fdopen(descriptor, 'w') as archivo:
+        json.dump(registro.instantanea(), archivo)
+    os.replace(temporal, _archivo_proceso())
+
+
+def _proceso_vivo(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True  # existe, pero es de otro usuario
+    return True
+
+
+def leer_todas():
+    """
+    Acumulado de todos los workers vivos (este proceso se lee en vivo). Los
+    archivos de workers terminados se borran: si no, sus contadores se
+    sumarían para siempre.
+    """
+    instantaneas = [registro.instantanea()]
+    if settings.METRICAS_DIR and os.path.isdir(settings.METRICAS_DIR):
+        propio = os.path.basename(_archivo_proceso())
+        for nombre in os.listdir(settings.METRICAS_DIR):
+            if not nombre.endswith('.json') or nombre == propio:
+                continue
+            ruta = os.path.join(settings.METRICAS_DIR, nombre)
+            pid = nombre[:-len('.json')]
+            if pid.isdigit() and not _proceso_vivo(int(pid)):
+                try:
+                    os.remove(ruta)
+                except OSError:
+                    pass
+                continue
+            try:
+                with open(ruta) as archivo:
+                    instantaneas.append(json.load(archivo))
+            except (OSError, ValueError):
+                continue
+    return combinar(instantaneas)
+
+
+# ---------- Formato Prometheus ----------
+
+def _numero(valor):
+    return f'{valor:.6f}'.rstrip('0').rstrip('.') if isinstance(valor, float) else str(valor)
+
+
+def exportar_prometheus(vistas):
+    lineas = [
+        '# HELP vista_peticiones_total Peticiones atendidas por vista y clase de estado HTTP',
+        '# TYPE vista_peticiones_total counter',
+    ]
+    for vista, datos in sorted(vistas.items()):
+        for estado, n in sorted(datos['peticiones'].items()):
+            lineas.append(f'vista_peticiones_total{{vista="{vista}",estado="{estado}"}} {n}')
+
+    lineas += [
+        '# HELP vista_latencia_segundos Latencia de las peticiones por vista',
+        '# TYPE vista_latencia_segundos histogram',
+    ]
+    for vista, datos in sorted(vistas.items()):
+        acumulado = 0
+        for limite, n in zip(BUCKETS_LATENCIA + ('+Inf',), datos['latencia_buckets']):
+            acumulado += n
+            lineas.append(f'vista_latencia_segundos_bucket{{vista="{vista}",le="{limite}"}} {acumulado}')
+        lineas.append(f'vista_latencia_segundos_sum{{vista="{vista}"}} {_numero(datos["latencia_suma"])}')
+        lineas.append(f'vista_latencia_segundos_count{{vista="{vista}"}} {acumulado}')
+
+    contadores = [
+        ('vista_consultas_db_total', 'Consultas SQL ejecutadas', 'consultas'),
+        ('vista_consultas_db_segundos_total', 'Tiempo en consultas SQL', 'consultas_segundos'),
+        ('vista_cache_aciertos_total', 'Lecturas de caché con resultado', 'cache_aciertos'),
+        ('vista_cache_fallos_total', 'Lecturas de caché sin resultado', 'cache_fallos'),
+        ('vista_fragmentos_aciertos_total', 'Fragmentos de plantilla servidos desde caché', 'fragmentos_aciertos'),
+        ('vista_fragmentos_fallos_total', 'Fragmentos de plantilla renderizados', 'fragmentos_fallos'),
+        ('vista_http_saliente_total', 'Llamadas HTTP salientes', 'http'),
+        ('vista_http_saliente_segundos_total', 'Tiempo en llamadas HTTP salientes', 'http_segundos'),
+    ]
+    for nombre, ayuda, clave in contadores:
+        lineas += [f'# HELP {nombre} {ayuda} por vista', f'# TYPE {nombre} counter']
+        for vista, datos in sorted(vistas.items()):
+            lineas.append(f'{nombre}{{vista="{vista}"}} {_numero(datos[clave])}')
+    return '\n'.join(lineas) + '\n'
+
+
+# ---------- Middleware ----------
+
+class MetricasMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.METRICAS_HABILITADAS:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        medicion = Medicion()
+        token = _medicion_actual.set(medicion)
+        inicio = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _medicion_actual.reset(token)
+        self._registrar(request, response, time.perf_counter() - inicio, medicion)
+        if _toca_escribir():
+            escribir_instantanea()
+        return response
+
+    async def __acall__(self, request):
+        # Las consultas corren en el hilo de sync_to_async con sus propias
+        # conexiones; solo el contexto (la medición) llega hasta allá
+        medicion = Medicion()
+        token = _medicion_actual.set(medicion)
+        inicio = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _medicion_actual.reset(token)
+        self._registrar(request, response, time.perf_counter() - inicio, medicion)
+        if _toca_escribir():
+            # Archivo en disco: fuera del event loop
+            await sync_to_async(escribir_instantanea, thread_sensitive=False)()
+        return response
+
+    @staticmethod
+    def _registrar(request, response, duracion, medicion):
+        coincidencia = getattr(request, 'resolver_match', None)
+        vista = (coincidencia.view_name if coincidencia else None) or 'sin_ruta'
+        registro.registrar(vista, f'{response.status_code // 100}xx', duracion, medicion)
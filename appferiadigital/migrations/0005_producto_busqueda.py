@@ -0,0 +1,87 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:56
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+FTS = 'appferiadigital_productobusqueda_fts'
+TABLA = 'appferiadigital_productobusqueda'
+
+SQLITE_FTS = [
+    f"""CREATE VIRTUAL TABLE {FTS} USING fts5(
+        texto, content='{TABLA}', content_rowid='id_producto_id', tokenize='unicode61'
+    )""",
+    f"""CREATE TRIGGER {TABLA}_ai AFTER INSERT ON {TABLA} BEGIN
+        INSERT INTO {FTS}(rowid, texto) VALUES (new.id_producto_id, new.texto);
+    END""",
+    f"""CREATE TRIGGER {TABLA}_ad AFTER DELETE ON {TABLA} BEGIN
+        INSERT INTO {FTS}({FTS}, rowid, texto) VALUES ('delete', old.id_producto_id, old.texto);
+    END""",
+    f"""CREATE TRIGGER {TABLA}_au AFTER UPDATE ON {TABLA} BEGIN
+        INSERT INTO {FTS}({FTS}, rowid, texto) VALUES ('delete', old.id_producto_id, old.texto);
+        INSERT INTO {FTS}(rowid, texto) VALUES (new.id_producto_id, new.texto);
+    END""",
+]
+
+POSTGRES_INDICES = [
+    'CREATE EXTENSION IF NOT EXISTS pg_trgm',
+    # Misma expresión que genera SearchVector('busqueda__texto', config='simple')
+    f"""CREATE INDEX {TABLA}_tsv ON {TABLA}
+        USING gin (to_tsvector('simple'::regconfig, COALESCE(texto, '')))""",
+    f'CREATE INDEX {TABLA}_trgm ON {TABLA} USING gin (texto gin_trgm_ops)',
+]
+
+
+def crear_indices(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        sentencias = SQLITE_FTS
+    elif vendor == 'postgresql':
+        sentencias = POSTGRES_INDICES
+    else:
+        return
+    for sql in sentencias:
+        schema_editor.execute(sql)
+
+
+def eliminar_indices(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        for sufijo in ('ai', 'ad', 'au'):
+            schema_editor.execute(f'DROP TRIGGER IF EXISTS {TABLA}_{sufijo}')
+        schema_editor.execute(f'DROP TABLE IF EXISTS {FTS}')
+    elif vendor == 'postgresql':
+        schema_editor.execute(f'DROP INDEX IF EXISTS {TABLA}_tsv')
+        schema_editor.execute(f'DROP INDEX IF EXISTS {TABLA}_trgm')
+
+
+def indexar_productos(apps, schema_editor):
+    from appferiadigital.busqueda_service import texto_indexable
+
+    Producto = apps.get_model('appferiadigital', 'Producto')
+    ProductoBusqueda = apps.get_model('appferiadigital', 'ProductoBusqueda')
+    filas = Producto.objects.values_list(
+        'id_producto', 'nombre_producto', 'id_categoria__nombre', 'id_puesto__id_feria__nombre_feria'
+    )
+    ProductoBusqueda.objects.bulk_create([
+        ProductoBusqueda(id_producto_id=id_producto, texto=texto_indexable(nombre, categoria, feria))
+        for id_producto, nombre, categoria, feria in filas.iterator(chunk_size=2000)
+    ], batch_size=2000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appferiadigital', '0004_remove_feria_latitud_remove_feria_longitud'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductoBusqueda',
+            fields=[
+                ('id_producto', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='busqueda', serialize=False, to='appferiadigital.producto')),
+                ('texto', models.TextField()),
+            ],
+        ),
+        migrations.RunPython(crear_indices, eliminar_indices),
+        migrations.RunPython(indexar_productos, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:58
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appferiadigital', '0005_producto_busqueda'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EstadisticaVendedor',
+            fields=[
+                ('id_usuario', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='estadisticas', serialize=False, to='appferiadigital.usuario')),
+                ('total_productos', models.IntegerField(default=0)),
+                ('total_stock', models.IntegerField(default=0)),
+                ('total_reservas', models.IntegerField(default=0)),
+                ('cantidad_reservada', models.IntegerField(default=0)),
+                ('productos_populares', models.JSONField(default=list)),
+                ('reservas_por_dia', models.JSONField(default=dict)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='EstadisticaProducto',
+            fields=[
+                ('id_producto', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='estadisticas', serialize=False, to='appferiadigital.producto')),
+                ('total_reservas', models.IntegerField(default=0)),
+                ('cantidad_reservada', models.IntegerField(default=0)),
+                ('id_usuario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='appferiadigital.usuario')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['id_usuario', '-cantidad_reservada'], name='estprod_vendedor_cant_idx')],
+            },
+        ),
+    ]
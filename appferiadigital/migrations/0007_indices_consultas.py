@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appferiadigital', '0006_estadisticas_vendedor'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='producto',
+            index=models.Index(fields=['id_puesto', 'nombre_producto', 'id_producto'], name='producto_puesto_nombre_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='producto',
+            index=models.Index(condition=models.Q(('stock__gt', 0)), fields=['id_producto'], name='producto_con_stock_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='puesto',
+            index=models.Index(fields=['id_feria', 'id_puesto'], name='puesto_feria_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='reserva',
+            index=models.Index(fields=['-fecha_reserva', '-id_reserva'], name='reserva_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='reserva',
+            index=models.Index(fields=['id_usuario', '-fecha_reserva', '-id_reserva'], name='reserva_cliente_fecha_idx'),
+        ),
+    ]
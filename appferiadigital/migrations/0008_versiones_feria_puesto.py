@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:12
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appferiadigital', '0007_indices_consultas'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='feria',
+            name='modificado',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+        migrations.AddField(
+            model_name='feria',
+            name='version',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='puesto',
+            name='modificado',
+            field=models.DateTimeField(db_index=True, default=django.utils.timezone.now, editable=False),
+        ),
+        migrations.AddField(
+            model_name='puesto',
+            name='version',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:33
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appferiadigital', '0008_versiones_feria_puesto'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='reserva',
+            name='estado',
+            field=models.CharField(choices=[('pendiente', 'Pendiente'), ('procesada', 'Procesada'), ('cancelada', 'Cancelada')], default='pendiente', max_length=10),
+        ),
+        migrations.CreateModel(
+            name='ReservaArchivada',
+            fields=[
+                ('id_reserva', models.IntegerField(primary_key=True, serialize=False)),
+                ('cantidad', models.PositiveIntegerField()),
+                ('fecha_reserva', models.DateField()),
+                ('estado', models.CharField(choices=[('pendiente', 'Pendiente'), ('procesada', 'Procesada'), ('cancelada', 'Cancelada')], max_length=10)),
+                ('archivada', models.DateTimeField(default=django.utils.timezone.now)),
+                ('id_producto', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='reservas_archivadas', to='appferiadigital.producto')),
+                ('id_usuario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reservas_archivadas', to='appferiadigital.usuario')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ReservaProductoArchivada',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('cantidad_reserva', models.IntegerField()),
+                ('unidad_de_medida', models.CharField(blank=True, max_length=50, null=True)),
+                ('id_producto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lineas_archivadas', to='appferiadigital.producto')),
+                ('id_reserva', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reservaproducto_set', related_query_name='reservaproducto', to='appferiadigital.reservaarchivada')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='reservaarchivada',
+            index=models.Index(fields=['-fecha_reserva', '-id_reserva'], name='resarch_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='reservaarchivada',
+            index=models.Index(fields=['id_usuario', '-fecha_reserva', '-id_reserva'], name='resarch_cliente_fecha_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='reservaproductoarchivada',
+            unique_together={('id_reserva', 'id_producto')},
+        ),
+    ]
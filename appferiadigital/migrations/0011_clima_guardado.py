@@ -0,0 +1,40 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:48
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appferiadigital', '0010_feria_coordenadas'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ClimaSnapshot',
+            fields=[
+                ('id_ciudad', models.IntegerField(primary_key=True, serialize=False)),
+                ('nombre', models.CharField(max_length=100)),
+                ('clima', models.JSONField()),
+                ('actualizado', models.DateTimeField()),
+            ],
+        ),
+        migrations.AddField(
+            model_name='feria',
+            name='id_ciudad_clima',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='ferias', to='appferiadigital.climasnapshot'),
+        ),
+        migrations.CreateModel(
+            name='ClimaPronostico',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha_hora', models.DateTimeField()),
+                ('clima', models.JSONField()),
+                ('id_ciudad', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='pronosticos', to='appferiadigital.climasnapshot')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('id_ciudad', 'fecha_hora'), name='pronostico_ciudad_fecha_uniq')],
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appferiadigital', '0011_clima_guardado'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='estadisticavendedor',
+            name='cambios',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='estadisticavendedor',
+            name='cambios_derivados',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
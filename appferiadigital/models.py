@@ -1,4 +1,6 @@
 from django.db import models
+from django.db.models import Q
+from django.utils import timezone
 from .clima_service import ClimaService
 
 class Usuario(models.Model):
@@ -26,17 +28,68 @@ class Feria(models.Model):
     nombre_feria = models.CharField(max_length=100)
     ubicacion_feria = models.CharField(max_length=200, blank=True, null=True)
     ciudad = models.CharField(max_length=100, blank=True, null=True)  # Campo nuevo
+    # Para ordenar por distancia (indice_ferias.py) y el clima por celda
+    latitud = models.DecimalField(max_digits=9, decimal_places=6, blank=True, null=True)
+    longitud = models.DecimalField(max_digits=9, decimal_places=6, blank=True, null=True)
     aglomeracion = models.IntegerField(blank=True, null=True)
+    # Ciudad de OpenWeatherMap, resuelta una vez por manage.py actualizar_clima
+    # (ver clima_guardado.py); se vuelve a resolver si cambia el lugar
+    id_ciudad_clima = models.ForeignKey(
+        'ClimaSnapshot', on_delete=models.SET_NULL, blank=True, null=True, editable=False,
+        related_name='ferias'
+    )
+    # Cambia con la feria o sus puestos (ver versiones.py)
+    version = models.PositiveIntegerField(default=0, editable=False)
+    modificado = models.DateTimeField(default=timezone.now, editable=False)
+
+    # Lo que muestran las páginas de sus puestos (el nombre además se indexa)
+    CAMPOS_PUESTOS = ('nombre_feria', 'ubicacion_feria')
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Lugar leído de la BD, para olvidar la ciudad del clima si cambia
+        if {'ciudad', 'latitud', 'longitud'} <= instance.__dict__.keys():
+            instance._lugar_guardado = instance.lugar_clima
+        # Valores leídos de la BD, para saber al guardar si cambió algo que
+        # se indexa o se muestra en las páginas de sus puestos
+        instance._campos_guardados = {
+            campo: instance.__dict__[campo] for campo in cls.CAMPOS_PUESTOS if campo in instance.__dict__
+        }
+        return instance
 
     def __str__(self):
         return self.nombre_feria
 
+    @property
+    def lugar_clima(self):
+        """Coordenadas si las tiene (el clima se comparte por celda); si no, la ciudad"""
+        if self.latitud is not None and self.longitud is not None:
+            return float(self.latitud), float(self.longitud)
+        return self.ciudad
+
 
 class Puesto(models.Model):
     id_puesto = models.AutoField(primary_key=True)
     id_feria = models.ForeignKey(Feria, on_delete=models.CASCADE)
     id_usuario = models.ForeignKey(Usuario, on_delete=models.CASCADE, related_name='puestos')
     numero_puesto = models.CharField(max_length=20, blank=True, null=True)
+    # Cambia con el puesto o sus productos (ver versiones.py)
+    version = models.PositiveIntegerField(default=0, editable=False)
+    modificado = models.DateTimeField(default=timezone.now, editable=False, db_index=True)
+
+    class Meta:
+        indexes = [
+            # detalle_feria: puestos de una feria paginados por id_puesto
+            models.Index(fields=['id_feria', 'id_puesto'], name='puesto_feria_idx'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Feria leída de la BD, para marcar también la anterior si el puesto se mueve
+        instance._feria_guardada = instance.__dict__.get('id_feria_id')
+        return instance
 
     def __str__(self):
         return f"Puesto {self.numero_puesto or self.id_puesto} - {self.id_feria.nombre_feria}"
@@ -58,17 +111,51 @@ class Producto(models.Model):
     nombre_producto = models.CharField(max_length=100)
     stock = models.IntegerField(default=0)
 
+    class Meta:
+        indexes = [
+            # mis_productos: orden (id_puesto, nombre_producto, id_producto)
+            models.Index(fields=['id_puesto', 'nombre_producto', 'id_producto'], name='producto_puesto_nombre_idx'),
+            # buscar_productos: solo productos con stock, paginados por id
+            models.Index(fields=['id_producto'], condition=Q(stock__gt=0), name='producto_con_stock_idx'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Stock leído de la BD, para calcular la diferencia al guardar
+        instance._stock_guardado = instance.__dict__.get('stock')
+        return instance
+
     def __str__(self):
         return f"{self.nombre_producto} ({self.id_puesto})"
 
 
 class Reserva(models.Model):
+    PENDIENTE = 'pendiente'
+    PROCESADA = 'procesada'
+    CANCELADA = 'cancelada'
+    ESTADOS = [
+        (PENDIENTE, 'Pendiente'),
+        (PROCESADA, 'Procesada'),
+        (CANCELADA, 'Cancelada'),
+    ]
+    # Ya no cambian: pasan a ReservaArchivada con el tiempo (archivo_reservas.py)
+    FINALIZADAS = (PROCESADA, CANCELADA)
+
     id_reserva = models.AutoField(primary_key=True)
     id_usuario = models.ForeignKey(Usuario, on_delete=models.CASCADE)
     id_producto = models.ForeignKey(Producto, on_delete=models.CASCADE, null=True, blank=True)  
     cantidad = models.PositiveIntegerField()
     fecha_reserva = models.DateField(auto_now_add=True)
+    estado = models.CharField(max_length=10, choices=ESTADOS, default=PENDIENTE)
 
+    class Meta:
+        indexes = [
+            # mis_reservas y estadísticas: orden -fecha_reserva y rangos de fecha
+            models.Index(fields=['-fecha_reserva', '-id_reserva'], name='reserva_fecha_idx'),
+            # mis_reservas_cliente: reservas de un cliente, más recientes primero
+            models.Index(fields=['id_usuario', '-fecha_reserva', '-id_reserva'], name='reserva_cliente_fecha_idx'),
+        ]
 
     def __str__(self):
         return f"Reserva {self.id_reserva} - {self.id_usuario.nombre}"
@@ -85,3 +172,121 @@ class ReservaProducto(models.Model):
 
     def __str__(self):
         return f"{self.id_producto.nombre_producto} x{self.cantidad_reserva}"
+
+
+class ReservaArchivada(models.Model):
+    """
+    Reserva finalizada hace más de RESERVAS_ARCHIVO_DIAS, fuera de la tabla
+    que usan las vistas. Mismos nombres de campos que Reserva (y sus líneas
+    en `reservaproducto_set`), así las vistas y plantillas sirven para ambas.
+    """
+    id_reserva = models.IntegerField(primary_key=True)  # el de la Reserva original
+    id_usuario = models.ForeignKey(Usuario, on_delete=models.CASCADE, related_name='reservas_archivadas')
+    id_producto = models.ForeignKey(Producto, on_delete=models.CASCADE, null=True, blank=True,
+                                    related_name='reservas_archivadas')
+    cantidad = models.PositiveIntegerField()
+    fecha_reserva = models.DateField()
+    estado = models.CharField(max_length=10, choices=Reserva.ESTADOS)
+    archivada = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-fecha_reserva', '-id_reserva'], name='resarch_fecha_idx'),
+            models.Index(fields=['id_usuario', '-fecha_reserva', '-id_reserva'], name='resarch_cliente_fecha_idx'),
+        ]
+
+    def __str__(self):
+        return f"Reserva archivada {self.id_reserva}"
+
+
+class ReservaProductoArchivada(models.Model):
+    id_reserva = models.ForeignKey(ReservaArchivada, on_delete=models.CASCADE,
+                                   related_name='reservaproducto_set', related_query_name='reservaproducto')
+    id_producto = models.ForeignKey(Producto, on_delete=models.CASCADE, related_name='lineas_archivadas')
+    cantidad_reserva = models.IntegerField()
+    unidad_de_medida = models.CharField(max_length=50, blank=True, null=True)
+
+    class Meta:
+        unique_together = (('id_reserva', 'id_producto'),)
+
+    def __str__(self):
+        return f"{self.id_producto.nombre_producto} x{self.cantidad_reserva}"
+
+
+class ProductoBusqueda(models.Model):
+    """Texto normalizado (sin tildes) de producto, categoría y feria para la búsqueda"""
+    id_producto = models.OneToOneField(
+        Producto, on_delete=models.CASCADE, primary_key=True, related_name='busqueda'
+    )
+    texto = models.TextField()
+
+    def __str__(self):
+        return self.texto
+
+
+class EstadisticaVendedor(models.Model):
+    """Estadísticas de un vendedor mantenidas al reservar, cancelar y editar stock"""
+    id_usuario = models.OneToOneField(
+        Usuario, on_delete=models.CASCADE, primary_key=True, related_name='estadisticas'
+    )
+    total_productos = models.IntegerField(default=0)
+    total_stock = models.IntegerField(default=0)
+    total_reservas = models.IntegerField(default=0)
+    cantidad_reservada = models.IntegerField(default=0)
+    # [{'id_producto__nombre_producto': ..., 'total_reservado': ...}, ...] (top 5)
+    productos_populares = models.JSONField(default=list)
+    # {'AAAA-MM-DD': reservas} de los últimos días
+    reservas_por_dia = models.JSONField(default=dict)
+    # Eventos que cambian el top o las reservas por día (se suma con F()) y el
+    # último con que se calcularon; si difieren se recalculan al leer
+    cambios = models.PositiveIntegerField(default=0)
+    cambios_derivados = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"Estadísticas de {self.id_usuario_id}"
+
+
+class EstadisticaProducto(models.Model):
+    id_producto = models.OneToOneField(
+        Producto, on_delete=models.CASCADE, primary_key=True, related_name='estadisticas'
+    )
+    id_usuario = models.ForeignKey(Usuario, on_delete=models.CASCADE)
+    total_reservas = models.IntegerField(default=0)
+    cantidad_reservada = models.IntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['id_usuario', '-cantidad_reservada'], name='estprod_vendedor_cant_idx'),
+        ]
+
+    def __str__(self):
+        return f"Estadísticas de producto {self.id_producto_id}"
+
+
+class ClimaSnapshot(models.Model):
+    """Último clima de una ciudad de OpenWeatherMap (clima_guardado.py)"""
+    id_ciudad = models.IntegerField(primary_key=True)  # ID de ciudad de OpenWeatherMap
+    nombre = models.CharField(max_length=100)
+    # Formato de ClimaService.procesar_clima
+    clima = models.JSONField()
+    actualizado = models.DateTimeField()
+
+    def __str__(self):
+        return f"Clima de {self.nombre} ({self.id_ciudad})"
+
+
+class ClimaPronostico(models.Model):
+    """Pronóstico cada 3 horas de una ciudad; se reemplaza completo en cada actualización"""
+    id_ciudad = models.ForeignKey(ClimaSnapshot, on_delete=models.CASCADE, related_name='pronosticos')
+    fecha_hora = models.DateTimeField()
+    # Formato de ClimaService.procesar_pronostico
+    clima = models.JSONField()
+
+    class Meta:
+        constraints = [
+            # detalle_feria: pronóstico de la ciudad desde ahora, por fecha_hora
+            models.UniqueConstraint(fields=['id_ciudad', 'fecha_hora'], name='pronostico_ciudad_fecha_uniq'),
+        ]
+
+    def __str__(self):
+        return f"Pronóstico {self.id_ciudad_id} {self.fecha_hora:%Y-%m-%d %H:%M}"
@@ -0,0 +1,195 @@
+"""
+Paginación por cursor (keyset) para los listados.
+
+En vez de OFFSET, cada página se pide con los valores de orden de la última
+(o primera) fila de la página anterior: WHERE (a, b) > (x, y) ORDER BY a, b
+LIMIT n. El costo de cada página no crece con su posición y las páginas no se
+corren cuando se insertan filas nuevas.
+"""
+import base64
+import json
+from datetime import date, datetime
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+
+class CursorInvalidoError(ValueError):
+    pass
+
+
+def _codificar_cursor(valores):
+    datos = [v.isoformat() if isinstance(v, (date, datetime)) else v for v in valores]
+    crudo = json.dumps(datos, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(crudo).decode().rstrip('=')
+
+
+def _convertir(campo, valor):
+    # Una FK se compara con el tipo de la columna a la que apunta
+    campo = getattr(campo, 'target_field', campo)
+    valor = campo.to_python(valor)
+    if valor is None:
+        raise ValidationError('Valor vacío en el cursor')
+    campo.run_validators(valor)
+    return valor
+
+
+def _decodificar_cursor(cursor, campos_modelo):
+    """
+    Valores del cursor convertidos al tipo de cada campo del orden. Un cursor
+    alterado (tipos incorrectos, fuera de rango) es CursorInvalidoError, no
+    un error al filtrar.
+    """
+    try:
+        crudo = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        valores = json.loads(crudo)
+    except (ValueError, TypeError) as e:
+        raise CursorInvalidoError(cursor) from e
+    if not isinstance(valores, list) or len(valores) != len(campos_modelo):
+        raise CursorInvalidoError(cursor)
+    try:
+        return [_convertir(campo, valor) for campo, valor in zip(campos_modelo, valores)]
+    except (ValidationError, ValueError, TypeError) as e:
+        raise CursorInvalidoError(cursor) from e
+
+
+class PaginaKeyset:
+    def __init__(self, objetos, orden, request, hay_siguiente, hay_anterior, parametro_prefijo=''):
+        self.objetos = objetos
+        self.hay_siguiente = hay_siguiente
+        self.hay_anterior = hay_anterior
+        self._orden = orden
+        self._request = request
+        self._prefijo = parametro_prefijo
+
+    def __iter__(self):
+        return iter(self.objetos)
+
+    def __len__(self):
+        return len(self.objetos)
+
+    def __bool__(self):
+        return bool(self.objetos)
+
+    def _valores(self, obj):
+        return [getattr(obj, attname) for attname, _, _ in self._orden]
+
+    @property
+    def cursor_siguiente(self):
+        if self.hay_siguiente and self.objetos:
+            return _codificar_cursor(self._valores(self.objetos[-1]))
+        return None
+
+    @property
+    def cursor_anterior(self):
+        if self.hay_anterior and self.objetos:
+            return _codificar_cursor(self._valores(self.objetos[0]))
+        return None
+
+    def _url(self, parametro, cursor):
+        params = self._request.GET.copy()
+        params.pop(f'{self._prefijo}despues', None)
+        params.pop(f'{self._prefijo}antes', None)
+        params[f'{self._prefijo}{parametro}'] = cursor
+        return f'?{params.urlencode()}'
+
+    @property
+    def url_siguiente(self):
+        cursor = self.cursor_siguiente
+        return self._url('despues', cursor) if cursor else None
+
+    @property
+    def url_anterior(self):
+        cursor = self.cursor_anterior
+        return self._url('antes', cursor) if cursor else None
+
+
+def _condicion_keyset(orden, valores, hacia_adelante):
+    """
+    Construye (a > x) OR (a = x AND b > y) OR ... respetando la dirección
+    de cada columna. Hacia atrás se invierten los operadores.
+    """
+    condicion = Q()
+    iguales = {}
+    for (attname, nombre, descendente), valor in zip(orden, valores):
+        operador = 'lt' if descendente == hacia_adelante else 'gt'
+        condicion |= Q(**iguales, **{f'{nombre}__{operador}': valor})
+        iguales[nombre] = valor
+    return condicion
+
+
+def _tamano_pagina(request, tamano):
+    if tamano is None:
+        tamano = settings.PAGINACION_TAMANO
+    try:
+        solicitado = int(request.GET.get('tamano', tamano))
+    except (TypeError, ValueError):
+        solicitado = tamano
+    return max(1, min(solicitado, settings.PAGINACION_TAMANO_MAXIMO))
+
+
+def _consulta_pagina(request, queryset, orden, tamano, prefijo):
+    """(queryset con LIMIT, campos, cursor, hacia_adelante, tamaño)"""
+    tamano = _tamano_pagina(request, tamano)
+    modelo = queryset.model
+    campos, campos_modelo = [], []
+    for campo in orden:
+        descendente = campo.startswith('-')
+        nombre = campo.lstrip('-')
+        campos_modelo.append(modelo._meta.get_field(nombre))
+        campos.append((campos_modelo[-1].attname, nombre, descendente))
+
+    despues = request.GET.get(f'{prefijo}despues')
+    antes = request.GET.get(f'{prefijo}antes')
+    hacia_adelante = bool(despues) or not antes
+    cursor = despues or antes
+
+    if cursor:
+        try:
+            valores = _decodificar_cursor(cursor, campos_modelo)
+        except CursorInvalidoError:
+            cursor = None
+            hacia_adelante = True
+        else:
+            queryset = queryset.filter(_condicion_keyset(campos, valores, hacia_adelante))
+
+    if hacia_adelante:
+        queryset = queryset.order_by(*orden)
+    else:
+        queryset = queryset.order_by(*[c[1:] if c.startswith('-') else f'-{c}' for c in orden])
+
+    return queryset[:tamano + 1], campos, cursor, hacia_adelante, tamano
+
+
+def _armar_pagina(objetos, request, campos, cursor, hacia_adelante, tamano, prefijo):
+    hay_mas = len(objetos) > tamano
+    objetos = objetos[:tamano]
+
+    if hacia_adelante:
+        return PaginaKeyset(objetos, campos, request, hay_siguiente=hay_mas,
+                            hay_anterior=bool(cursor), parametro_prefijo=prefijo)
+
+    objetos.reverse()
+    return PaginaKeyset(objetos, campos, request, hay_siguiente=True,
+                        hay_anterior=hay_mas, parametro_prefijo=prefijo)
+
+
+def paginar_keyset(request, queryset, orden, tamano=None, prefijo=''):
+    """
+    Pagina `queryset` por cursor.
+
+    `orden` son nombres de campos locales del modelo (con '-' para
+    descendente); el último debe ser único (normalmente la clave primaria)
+    para que el orden sea total. Los cursores se leen de los parámetros GET
+    `despues` y `antes` (con `prefijo` si hay más de un listado por página).
+    Un cursor inválido se ignora y se muestra la primera página.
+    """
+    consulta, *datos = _consulta_pagina(request, queryset, orden, tamano, prefijo)
+    return _armar_pagina(list(consulta), request, *datos, prefijo)
+
+
+async def apaginar_keyset(request, queryset, orden, tamano=None, prefijo=''):
+    """Igual que paginar_keyset, para vistas async (ORM async)"""
+    consulta, *datos = _consulta_pagina(request, queryset, orden, tamano, prefijo)
+    return _armar_pagina([obj async for obj in consulta], request, *datos, prefijo)
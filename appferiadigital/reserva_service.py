@@ -0,0 +1,184 @@
+from django.db import transaction
+from django.db.models import Case, F, Q, When
+
+from .estadisticas_service import EstadisticasService
+from .models import Producto, Reserva, ReservaArchivada, ReservaProducto, ReservaProductoArchivada
+from .versiones import tocar_puestos
+
+MAX_LINEAS_CARRITO = 50
+
+
+class StockInsuficienteError(Exception):
+    """Algún producto del carrito no tiene stock suficiente"""
+
+
+class ReservaService:
+    @staticmethod
+    def _al_confirmar(lineas, puestos=None, **estadisticas):
+        """
+        Estadísticas del vendedor y versión de los puestos, después del COMMIT.
+        Son UPDATE de filas que comparten todas las reservas del vendedor y
+        del puesto: dentro de la transacción las dejarían bloqueadas hasta el
+        final y las reservas se harían de a una. Si fallan, la reserva queda
+        igual (EstadisticasService.diferencias/recalcular las corrige).
+        """
+        def aplicar():
+            EstadisticasService.registrar_reserva(lineas, **estadisticas)
+            if puestos is not None:
+                tocar_puestos(puestos)
+        transaction.on_commit(aplicar)
+
+    @staticmethod
+    def reservar(usuario_id, producto_id, cantidad):
+        """
+        Descuenta stock y crea la reserva en una sola transacción.
+
+        El descuento es un UPDATE condicional (stock >= cantidad), así dos
+        clientes que reservan a la vez nunca dejan el stock negativo y no
+        hace falta leer ni bloquear la fila antes.
+
+        Retorna la Reserva creada, o None si no había stock suficiente.
+        """
+        with transaction.atomic():
+            actualizados = Producto.objects.filter(
+                id_producto=producto_id,
+                stock__gte=cantidad
+            ).update(stock=F('stock') - cantidad)
+
+            if not actualizados:
+                return None
+
+            reserva = Reserva.objects.create(
+                id_usuario_id=usuario_id,
+                id_producto_id=producto_id,
+                cantidad=cantidad
+            )
+            # El UPDATE de stock no emite señales
+            ReservaService._al_confirmar({int(producto_id): cantidad}, Q(producto__id_producto=producto_id))
+            return reserva
+
+    @staticmethod
+    def reservar_carrito(usuario_id, id_puesto, lineas):
+        """
+        Reserva varios productos de un mismo puesto en una sola Reserva.
+
+        `lineas` es una lista de (producto_id, cantidad, unidad_de_medida);
+        las líneas repetidas de un producto se suman. Todo el stock se
+        descuenta con un único UPDATE condicional y las líneas se insertan
+        con bulk_create, así el número de consultas no depende del tamaño
+        del carrito. Si algún producto no alcanza, no se reserva nada.
+
+        Retorna la Reserva creada, o None si no había stock suficiente.
+        """
+        cantidades = {}
+        unidades = {}
+        for producto_id, cantidad, unidad in lineas:
+            producto_id = int(producto_id)
+            cantidades[producto_id] = cantidades.get(producto_id, 0) + cantidad
+            unidades.setdefault(producto_id, unidad or None)
+
+        if not cantidades:
+            return None
+
+        condicion = Q()
+        for producto_id, cantidad in cantidades.items():
+            condicion |= Q(id_producto=producto_id, stock__gte=cantidad)
+
+        try:
+            with transaction.atomic():
+                actualizados = Producto.objects.filter(
+                    condicion, id_puesto_id=id_puesto
+                ).update(stock=Case(
+                    *[When(id_producto=producto_id, then=F('stock') - cantidad)
+                      for producto_id, cantidad in cantidades.items()],
+                    default=F('stock'),
+                ))
+
+                # Si alguna fila no cumplió la condición se deshace todo
+                if actualizados != len(cantidades):
+                    raise StockInsuficienteError
+
+                reserva = Reserva.objects.create(
+                    id_usuario_id=usuario_id,
+                    cantidad=sum(cantidades.values())
+                )
+                ReservaProducto.objects.bulk_create([
+                    ReservaProducto(
+                        id_reserva=reserva,
+                        id_producto_id=producto_id,
+                        cantidad_reserva=cantidad,
+                        unidad_de_medida=unidades[producto_id]
+                    )
+                    for producto_id, cantidad in cantidades.items()
+                ])
+                ReservaService._al_confirmar(cantidades, Q(id_puesto=id_puesto))
+                return reserva
+        except StockInsuficienteError:
+            return None
+
+    @staticmethod
+    def _lineas(reserva):
+        """{producto_id: cantidad} de una reserva simple o de carrito"""
+        if reserva.id_producto_id:
+            return {reserva.id_producto_id: reserva.cantidad}
+        # Reserva de carrito: los productos están en sus líneas
+        return dict(ReservaProducto.objects.filter(
+            id_reserva=reserva.id_reserva
+        ).values_list('id_producto_id', 'cantidad_reserva'))
+
+    @staticmethod
+    def _finalizar(reserva, estado, devolver_stock):
+        with transaction.atomic():
+            # UPDATE condicional: solo una petición saca la reserva de pendiente
+            actualizados = Reserva.objects.filter(
+                id_reserva=reserva.id_reserva, estado=Reserva.PENDIENTE
+            ).update(estado=estado)
+            if not actualizados:
+                return False
+            reserva.estado = estado
+
+            lineas = ReservaService._lineas(reserva)
+            if lineas and devolver_stock:
+                Producto.objects.filter(id_producto__in=lineas).update(stock=Case(
+                    *[When(id_producto=producto_id, then=F('stock') + cantidad)
+                      for producto_id, cantidad in lineas.items()],
+                    default=F('stock'),
+                ))
+            # Las estadísticas cuentan solo reservas pendientes
+            ReservaService._al_confirmar(
+                lineas, Q(producto__id_producto__in=lineas) if lineas and devolver_stock else None,
+                signo=-1, devolver_stock=devolver_stock,
+            )
+            return True
+
+    @staticmethod
+    def cancelar(reserva):
+        """
+        Marca la reserva como cancelada y devuelve su stock en una sola
+        transacción.
+
+        Si otra petición ya la canceló o procesó no se devuelve stock dos
+        veces. Retorna True si esta llamada fue la que la canceló.
+        """
+        return ReservaService._finalizar(reserva, Reserva.CANCELADA, devolver_stock=True)
+
+    @staticmethod
+    def procesar(reserva):
+        """
+        Marca la reserva como entregada, sin devolver stock.
+        """
+        return ReservaService._finalizar(reserva, Reserva.PROCESADA, devolver_stock=False)
+
+    @staticmethod
+    def producto_tiene_reservas(producto):
+        """
+        True si alguna reserva (de cualquier estado, también líneas de carrito
+        y archivadas) incluye el producto: borrarlo las borraría en cascada
+        """
+        consultas = (
+            Reserva.objects.filter(id_producto=producto),
+            ReservaProducto.objects.filter(id_producto=producto),
+            ReservaArchivada.objects.filter(id_producto=producto),
+            ReservaProductoArchivada.objects.filter(id_producto=producto),
+        )
+        return any(consulta.exists() for consulta in consultas)
@@ -0,0 +1,135 @@
+from datetime import date, timedelta
+
+from rest_framework import serializers
+
+from .models import EstadisticaVendedor, Feria, Producto, Puesto, Reserva
+from .reserva_service import MAX_LINEAS_CARRITO
+
+
+class CamposDinamicosMixin:
+    """
+    Selección de campos con ?campos=a,b,c (sin el parámetro se envían todos).
+    Aplica a los campos del primer nivel.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Solo el serializer raíz recibe el contexto en __init__
+        campos = self.context.get('campos')
+        if campos:
+            for nombre in set(self.fields) - set(campos):
+                self.fields.pop(nombre)
+
+
+class FeriaSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
+    clima = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Feria
+        fields = ['id_feria', 'nombre_feria', 'ubicacion_feria', 'ciudad', 'latitud', 'longitud',
+                  'aglomeracion', 'clima']
+
+    def get_clima(self, feria):
+        # La vista obtiene el clima de toda la página (clima_guardado.climas_de_ferias)
+        return self.context.get('climas', {}).get(feria.id_feria)
+
+
+class FeriaCercanaSerializer(FeriaSerializer):
+    distancia_km = serializers.FloatField(read_only=True)
+
+    class Meta(FeriaSerializer.Meta):
+        fields = FeriaSerializer.Meta.fields + ['distancia_km']
+
+
+class ProductoSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
+    categoria = serializers.CharField(source='id_categoria.nombre', default=None, read_only=True)
+    id_puesto = serializers.IntegerField(source='id_puesto_id', read_only=True)
+    feria = serializers.CharField(source='id_puesto.id_feria.nombre_feria', read_only=True)
+
+    class Meta:
+        model = Producto
+        fields = ['id_producto', 'nombre_producto', 'stock', 'categoria', 'id_puesto', 'feria']
+
+
+class ProductoPuestoSerializer(serializers.ModelSerializer):
+    categoria = serializers.CharField(source='id_categoria.nombre', default=None, read_only=True)
+
+    class Meta:
+        model = Producto
+        fields = ['id_producto', 'nombre_producto', 'stock', 'categoria']
+
+
+class PuestoSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
+    id_feria = serializers.IntegerField(source='id_feria_id', read_only=True)
+    feria = serializers.CharField(source='id_feria.nombre_feria', read_only=True)
+    vendedor = serializers.CharField(source='id_usuario.nombre', read_only=True)
+    productos = ProductoPuestoSerializer(source='producto_set', many=True, read_only=True)
+
+    class Meta:
+        model = Puesto
+        fields = ['id_puesto', 'numero_puesto', 'id_feria', 'feria', 'vendedor', 'productos']
+
+
+class LineaReservaSerializer(serializers.Serializer):
+    id_producto = serializers.IntegerField(source='id_producto_id')
+    nombre_producto = serializers.CharField(source='id_producto.nombre_producto')
+    cantidad = serializers.IntegerField(source='cantidad_reserva')
+    unidad_de_medida = serializers.CharField(allow_null=True)
+
+
+class ReservaSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
+    id_producto = serializers.IntegerField(source='id_producto_id', allow_null=True, read_only=True)
+    nombre_producto = serializers.CharField(source='id_producto.nombre_producto', default=None, read_only=True)
+    lineas = LineaReservaSerializer(source='reservaproducto_set', many=True, read_only=True)
+
+    class Meta:
+        model = Reserva
+        fields = ['id_reserva', 'fecha_reserva', 'estado', 'cantidad', 'id_producto', 'nombre_producto', 'lineas']
+
+
+class CrearReservaSerializer(serializers.Serializer):
+    """
+    Reserva simple: {"id_producto": 1, "cantidad": 2}
+    Carrito: {"id_puesto": 3, "lineas": [{"id_producto": 1, "cantidad": 2, "unidad_de_medida": "kg"}]}
+    """
+    id_producto = serializers.IntegerField(required=False)
+    cantidad = serializers.IntegerField(required=False, min_value=1)
+    id_puesto = serializers.IntegerField(required=False)
+    lineas = serializers.ListField(
+        child=serializers.DictField(), required=False, max_length=MAX_LINEAS_CARRITO
+    )
+
+    def validate(self, datos):
+        if 'lineas' in datos:
+            if 'id_puesto' not in datos:
+                raise serializers.ValidationError({'id_puesto': 'Obligatorio para un carrito'})
+            lineas = []
+            for linea in datos['lineas']:
+                try:
+                    producto_id, cantidad = int(linea['id_producto']), int(linea['cantidad'])
+                except (KeyError, TypeError, ValueError):
+                    raise serializers.ValidationError({'lineas': 'Cada línea requiere id_producto y cantidad'})
+                if cantidad < 0:
+                    raise serializers.ValidationError({'lineas': 'Cantidad inválida'})
+                if cantidad:
+                    unidad = str(linea.get('unidad_de_medida') or '').strip()[:50]
+                    lineas.append((producto_id, cantidad, unidad))
+            if not lineas:
+                raise serializers.ValidationError({'lineas': 'El carrito está vacío'})
+            datos['lineas'] = lineas
+        elif 'id_producto' not in datos or 'cantidad' not in datos:
+            raise serializers.ValidationError('Indique id_producto y cantidad, o id_puesto y lineas')
+        return datos
+
+
+class EstadisticaVendedorSerializer(serializers.ModelSerializer):
+    reservas_recientes = serializers.SerializerMethodField()
+
+    class Meta:
+        model = EstadisticaVendedor
+        fields = ['total_productos', 'total_stock', 'total_reservas', 'cantidad_reservada',
+                  'productos_populares', 'reservas_recientes']
+
+    def get_reservas_recientes(self, stats):
+        limite = (date.today() - timedelta(days=7)).isoformat()
+        return sum(n for dia, n in stats.reservas_por_dia.items() if dia >= limite)
@@ -0,0 +1,182 @@
+from django.db.backends.signals import connection_created
+from django.db.models import Q
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from .autenticacion import invalidar_identidad
+from .busqueda_service import BusquedaService
+from .estadisticas_service import EstadisticasService
+from . import indice_ferias, metricas
+from .models import Categoria, Feria, Producto, Puesto, Usuario
+from .versiones import marcar_baja, tocar_ferias, tocar_puestos
+
+
+# El índice de búsqueda se borra solo con el producto (OneToOne en cascada);
+# aquí se mantiene el texto al crear o modificar cualquiera de sus partes.
+
+@receiver(post_save, sender=Producto)
+def indexar_producto(sender, instance, **kwargs):
+    BusquedaService.indexar(Q(id_producto=instance.id_producto))
+
+
+@receiver(post_save, sender=Categoria)
+def indexar_productos_categoria(sender, instance, created, **kwargs):
+    if not created:
+        BusquedaService.indexar(Q(id_categoria=instance.id_categoria))
+
+
+@receiver(pre_delete, sender=Categoria)
+def recordar_productos_categoria(sender, instance, **kwargs):
+    # Al borrar la categoría los productos quedan con id_categoria NULL
+    instance._productos_a_indexar = list(
+        Producto.objects.filter(id_categoria=instance.id_categoria).values_list('id_producto', flat=True)
+    )
+
+
+@receiver(post_delete, sender=Categoria)
+def indexar_productos_sin_categoria(sender, instance, **kwargs):
+    ids = getattr(instance, '_productos_a_indexar', None)
+    if ids:
+        BusquedaService.indexar(Q(id_producto__in=ids))
+
+
+@receiver(post_save, sender=Puesto)
+def indexar_productos_puesto(sender, instance, created, **kwargs):
+    # Del puesto solo se indexa el nombre de su feria (_feria_guardada se
+    # actualiza después, en version_puesto_guardado)
+    if not created and getattr(instance, '_feria_guardada', None) != instance.id_feria_id:
+        BusquedaService.indexar(Q(id_puesto=instance.id_puesto))
+
+
+@receiver(pre_save, sender=Feria)
+def recordar_cambios_feria(sender, instance, update_fields=None, **kwargs):
+    # Feria.CAMPOS_PUESTOS que cambian con este save()
+    guardados = getattr(instance, '_campos_guardados', {})
+    instance._campos_cambiados = {
+        campo for campo in Feria.CAMPOS_PUESTOS
+        if (update_fields is None or campo in update_fields)
+        and (campo not in guardados or guardados[campo] != getattr(instance, campo))
+    }
+    guardados.update((campo, getattr(instance, campo)) for campo in instance._campos_cambiados)
+    instance._campos_guardados = guardados
+
+
+@receiver(post_save, sender=Feria)
+def indexar_productos_feria(sender, instance, created, **kwargs):
+    # De la feria solo se indexa el nombre
+    if not created and 'nombre_feria' in instance._campos_cambiados:
+        BusquedaService.indexar(Q(id_puesto__id_feria=instance.id_feria))
+
+
+# Estadísticas del vendedor: productos y stock
+
+@receiver(post_save, sender=Producto)
+def estadisticas_producto_guardado(sender, instance, created, **kwargs):
+    vendedor_id = instance.id_puesto.id_usuario_id
+    if created:
+        EstadisticasService.registrar_producto_creado(instance, vendedor_id)
+    else:
+        anterior = getattr(instance, '_stock_guardado', None)
+        if anterior is not None:
+            EstadisticasService.registrar_cambio_stock(vendedor_id, instance.stock - anterior)
+    instance._stock_guardado = instance.stock
+
+
+@receiver(post_delete, sender=Producto)
+def estadisticas_producto_eliminado(sender, instance, **kwargs):
+    vendedor_id = Puesto.objects.filter(
+        id_puesto=instance.id_puesto_id
+    ).values_list('id_usuario_id', flat=True).first()
+    if vendedor_id is not None:
+        EstadisticasService.registrar_producto_eliminado(instance, vendedor_id)
+
+
+# Identidad del usuario en caché (autenticacion.py)
+
+@receiver(post_save, sender=Usuario)
+@receiver(post_delete, sender=Usuario)
+def invalidar_identidad_usuario(sender, instance, **kwargs):
+    invalidar_identidad(instance.id_usuario)
+
+
+# Índice de ferias cercanas del proceso (indice_ferias.py)
+
+@receiver(post_save, sender=Feria)
+@receiver(post_delete, sender=Feria)
+def invalidar_indice_ferias(sender, instance, **kwargs):
+    indice_ferias.invalidar()
+
+
+# Ciudad de OpenWeatherMap de la feria (clima_guardado.py)
+
+@receiver(pre_save, sender=Feria)
+def olvidar_ciudad_clima(sender, instance, **kwargs):
+    # Con otro lugar, manage.py actualizar_clima vuelve a resolver la ciudad
+    if hasattr(instance, '_lugar_guardado') and instance._lugar_guardado != instance.lugar_clima:
+        instance.id_ciudad_clima = None
+    instance._lugar_guardado = instance.lugar_clima
+
+
+# Versiones de ferias y puestos para GET condicionales (versiones.py)
+
+@receiver(post_save, sender=Producto)
+@receiver(post_delete, sender=Producto)
+def version_puesto_producto(sender, instance, **kwargs):
+    tocar_puestos(Q(id_puesto=instance.id_puesto_id))
+
+
+@receiver(post_save, sender=Puesto)
+def version_puesto_guardado(sender, instance, created, **kwargs):
+    if not created:
+        tocar_puestos(Q(id_puesto=instance.id_puesto))
+    ferias = {instance.id_feria_id, getattr(instance, '_feria_guardada', None)} - {None}
+    tocar_ferias(Q(id_feria__in=ferias))
+    instance._feria_guardada = instance.id_feria_id
+
+
+@receiver(post_delete, sender=Puesto)
+def version_puesto_eliminado(sender, instance, **kwargs):
+    tocar_ferias(Q(id_feria=instance.id_feria_id))
+    marcar_baja('puestos')
+
+
+@receiver(post_delete, sender=Feria)
+def version_feria_eliminada(sender, instance, **kwargs):
+    marcar_baja('ferias')
+
+
+@receiver(post_save, sender=Feria)
+def version_feria_guardada(sender, instance, created, **kwargs):
+    if not created:
+        tocar_ferias(Q(id_feria=instance.id_feria))
+        # Los puestos solo muestran el nombre y la ubicación de la feria
+        if instance._campos_cambiados:
+            tocar_puestos(Q(id_feria=instance.id_feria))
+
+
+@receiver(post_save, sender=Categoria)
+def version_puestos_categoria(sender, instance, created, **kwargs):
+    if not created:
+        tocar_puestos(Q(producto__id_categoria=instance.id_categoria))
+
+
+@receiver(post_delete, sender=Categoria)
+def version_puestos_sin_categoria(sender, instance, **kwargs):
+    ids = getattr(instance, '_productos_a_indexar', None)
+    if ids:
+        tocar_puestos(Q(producto__id_producto__in=ids))
+
+
+@receiver(post_save, sender=Usuario)
+def version_puestos_vendedor(sender, instance, created, update_fields=None, **kwargs):
+    # Del vendedor solo se muestran el nombre y el teléfono
+    if created or instance.rol != 'vendedor' or (update_fields and not {'nombre', 'telefono'} & update_fields):
+        return
+    tocar_puestos(Q(id_usuario=instance.id_usuario))
+    tocar_ferias(Q(puesto__id_usuario=instance.id_usuario))
+
+
+@receiver(connection_created)
+def instalar_metricas(sender, connection, **kwargs):
+    # Cada hilo abre sus propias conexiones (también los de sync_to_async)
+    metricas.instalar_en_conexion(connection)
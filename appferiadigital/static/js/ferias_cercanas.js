@@ -0,0 +1,20 @@
+// "Ferias cerca de mí": pide la ubicación al navegador y envía lat/lon
+(function () {
+    var formulario = document.getElementById('ferias-cercanas');
+    if (!formulario) {
+        return;
+    }
+    formulario.addEventListener('submit', function (evento) {
+        if (!navigator.geolocation) {
+            return;
+        }
+        evento.preventDefault();
+        navigator.geolocation.getCurrentPosition(function (posicion) {
+            formulario.elements.lat.value = posicion.coords.latitude.toFixed(6);
+            formulario.elements.lon.value = posicion.coords.longitude.toFixed(6);
+            formulario.submit();
+        }, function () {
+            alert('No se pudo obtener tu ubicación');
+        });
+    });
+})();
@@ -0,0 +1,35 @@
+// Stock en vivo: actualiza cantidades y formularios sin recargar la página
+(function () {
+    var contenedor = document.getElementById('productos-puesto');
+    // Sin data-eventos el servidor no tiene stock en vivo (WSGI)
+    if (!contenedor || !contenedor.dataset.eventos || !window.EventSource) {
+        return;
+    }
+    var fuente = new EventSource(contenedor.dataset.eventos);
+
+    fuente.addEventListener('stock', function (evento) {
+        var productos = JSON.parse(evento.data).productos;
+        Object.keys(productos).forEach(function (id) {
+            var stock = productos[id] || 0;
+            document.querySelectorAll('[data-producto="' + id + '"]').forEach(function (elemento) {
+                var cantidad = elemento.querySelector('[data-stock]');
+                if (cantidad) {
+                    cantidad.textContent = productos[id] === null ? 'No disponible' : stock;
+                }
+                elemento.querySelectorAll('input[name="cantidad"]').forEach(function (campo) {
+                    campo.max = stock;
+                });
+                var formulario = elemento.querySelector('[data-con-stock]');
+                var sinStock = elemento.querySelector('[data-sin-stock]');
+                if (formulario && sinStock) {
+                    formulario.classList.toggle('d-none', stock <= 0);
+                    sinStock.classList.toggle('d-none', stock > 0);
+                }
+            });
+        });
+    });
+
+    fuente.addEventListener('fin', function () {
+        fuente.close();
+    });
+})();
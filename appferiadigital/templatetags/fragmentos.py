@@ -0,0 +1,48 @@
+"""
+{% fragmento nombre var1 var2 ... %} ... {% endfragmento %}
+
+Como {% cache %} de Django, pero sin tiempo de expiración en la plantilla
+(FRAGMENTOS_CACHE_TIMEOUT) y contando aciertos y fallos en las métricas de
+la vista. Las variables forman la clave: para un objeto se pasa su `version`
+(ver versiones.py), así un cambio del objeto deja de usar la copia anterior
+sin tener que borrarla.
+"""
+from django import template
+from django.conf import settings
+from django.core.cache import cache
+from django.core.cache.utils import make_template_fragment_key
+
+from ..metricas import registrar_fragmento
+
+register = template.Library()
+
+
+class FragmentoNode(template.Node):
+    def __init__(self, nodelist, nombre, variables):
+        self.nodelist = nodelist
+        self.nombre = nombre
+        self.variables = variables
+
+    def render(self, context):
+        if not settings.FRAGMENTOS_CACHE_HABILITADOS:
+            return self.nodelist.render(context)
+
+        clave = make_template_fragment_key(
+            self.nombre, [variable.resolve(context) for variable in self.variables]
+        )
+        contenido = cache.get(clave)
+        registrar_fragmento(contenido is not None)
+        if contenido is None:
+            contenido = self.nodelist.render(context)
+            cache.set(clave, contenido, settings.FRAGMENTOS_CACHE_TIMEOUT)
+        return contenido
+
+
+@register.tag
+def fragmento(parser, token):
+    nodelist = parser.parse(('endfragmento',))
+    parser.delete_first_token()
+    partes = token.split_contents()
+    if len(partes) < 2:
+        raise template.TemplateSyntaxError("'fragmento' necesita al menos un nombre")
+    return FragmentoNode(nodelist, partes[1], [parser.compile_filter(p) for p in partes[2:]])
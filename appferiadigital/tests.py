@@ -1,3 +1,1357 @@
-from django.test import TestCase
+import asyncio
+import csv
+import io
+import json
+import os
+import subprocess
+import tempfile
+import threading
+import time
+import tracemalloc
+from datetime import timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
 
-# Create your tests here.
+import httpx
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache, caches
+from django.core.management import call_command
+from django.db import connection, connections
+from django.test import AsyncClient, Client, RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.templatetags.static import static
+from django.urls import reverse
+from django.utils import timezone
+
+from . import clima_service, indice_ferias, limite_login, metricas
+from .autenticacion import obtener_usuario
+from .cache_dos_niveles import DosNivelesCache
+from .cliente_http import CircuitBreaker
+from .clima_service import ClimaService
+from .busqueda_service import BusquedaService, normalizar_texto
+from .estadisticas_service import EstadisticasService
+from .estaticos import minificar_css
+from .importacion_service import ImportacionService
+from .paginacion import _codificar_cursor, paginar_keyset
+from .models import (
+    Categoria, ClimaPronostico, ClimaSnapshot, EstadisticaVendedor, Feria, Producto, Puesto, Reserva, ReservaArchivada, ReservaProducto,
+    ReservaProductoArchivada, Usuario,
+)
+from .reserva_service import ReservaService
+
+# L2 en memoria para no depender de la tabla de caché en pruebas sin BD
+CACHES_PRUEBA = {
+    'default': {
+        'BACKEND': 'appferiadigital.cache_dos_niveles.DosNivelesCache',
+        'LOCATION': 'pruebas',
+        'OPTIONS': {'L2': 'compartida', 'VERSION_CHECK_INTERVAL': 0},
+    },
+    'compartida': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'pruebas-compartida',
+    },
+}
+
+
+@override_settings(CACHES=CACHES_PRUEBA, WEATHER_MAX_WORKERS=4, WEATHER_BATCH_TIMEOUT=1)
+class ClimaMultipleTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_deduplica_ciudades_normalizadas(self):
+        with mock.patch.object(ClimaService, 'obtener_clima_por_ciudad',
+                               return_value={'temperatura': 20}) as obtener:
+            climas = ClimaService.obtener_clima_multiple(['Santiago', ' santiago ', 'Talca', None])
+        self.assertEqual(obtener.call_count, 2)
+        self.assertEqual(set(climas), {'Santiago', ' santiago ', 'Talca'})
+
+    def test_devuelve_lo_terminado_dentro_del_plazo(self):
+        def lento(ciudad):
+            if ciudad == 'Lenta':
+                time.sleep(2)
+            return {'ciudad': ciudad}
+
+        with mock.patch.object(ClimaService, 'obtener_clima_por_ciudad', side_effect=lento):
+            inicio = time.monotonic()
+            climas = ClimaService.obtener_clima_multiple(['Rapida', 'Lenta'], timeout=0.3)
+            duracion = time.monotonic() - inicio
+        self.assertIn('Rapida', climas)
+        self.assertNotIn('Lenta', climas)
+        self.assertLess(duracion, 1)
+
+    def test_coordenadas_cercanas_comparten_la_consulta_de_su_celda(self):
+        with mock.patch.object(ClimaService, '_consultar_clima_coordenadas',
+                               side_effect=lambda lat, lon: {'centro': (lat, lon)}) as consultar:
+            climas = ClimaService.obtener_clima_multiple(
+                [(-35.4264, -71.6554), (-35.43, -71.67), (-34.985, -71.239)]
+            )
+        self.assertEqual(consultar.call_count, 2)
+        self.assertEqual(climas[(-35.4264, -71.6554)], {'centro': (-35.45, -71.65)})
+        self.assertEqual(climas[(-35.43, -71.67)], climas[(-35.4264, -71.6554)])
+        self.assertEqual(climas[(-34.985, -71.239)], {'centro': (-34.95, -71.25)})
+
+    def test_async_consulta_a_la_vez_dentro_del_plazo(self):
+        async def consultar(ciudad):
+            await asyncio.sleep(2 if ciudad == 'Lenta' else 0.2)
+            return {'ciudad': ciudad}
+
+        with mock.patch.object(ClimaService, '_consultar_clima_ciudad_async', side_effect=consultar):
+            inicio = time.monotonic()
+            climas = asyncio.run(
+                ClimaService.obtener_clima_multiple_async(['Talca', 'Curicó', 'Linares', 'Lenta'], timeout=0.5)
+            )
+            duracion = time.monotonic() - inicio
+        self.assertEqual(set(climas), {'Talca', 'Curicó', 'Linares'})
+        self.assertLess(duracion, 1)
+
+
+@override_settings(CACHES=CACHES_PRUEBA)
+class ClimaStaleWhileRevalidateTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_sirve_dato_vencido_y_refresca_una_vez(self):
+        cache_key = ClimaService._clave_cache_ciudad('Talca')
+        cache.set(cache_key, {'clima': {'temperatura': 10}, 'expira_suave': time.time() - 1}, 60)
+
+        with mock.patch.object(ClimaService, '_consultar_clima_ciudad',
+                               return_value={'temperatura': 25}) as consultar, \
+                mock.patch('appferiadigital.clima_service._refresco_executor') as executor:
+            primero = ClimaService.obtener_clima_por_ciudad('Talca')
+            segundo = ClimaService.obtener_clima_por_ciudad('Talca')
+            self.assertEqual(primero, {'temperatura': 10})
+            self.assertEqual(segundo, {'temperatura': 10})
+            # El lock por ciudad evita programar más de un refresco
+            self.assertEqual(executor.submit.call_count, 1)
+            consultar.assert_not_called()
+
+            funcion, *argumentos = executor.submit.call_args.args
+            funcion(*argumentos)
+
+        self.assertEqual(ClimaService.obtener_clima_por_ciudad('Talca'), {'temperatura': 25})
+
+
+RESPUESTA_CLIMA = {
+    'main': {'temp': 21.3, 'feels_like': 20.8, 'humidity': 40, 'pressure': 1015},
+    'weather': [{'description': 'cielo claro', 'icon': '01d'}],
+    'wind': {'speed': 2.5, 'deg': 180},
+    'visibility': 10000,
+    'name': 'Talca',
+    'sys': {'country': 'CL', 'sunrise': 0, 'sunset': 0},
+    'dt': 0,
+}
+
+
+class _StubOpenWeatherMap(BaseHTTPRequestHandler):
+    estado = 200
+    llamadas = 0
+
+    def do_GET(self):
+        type(self).llamadas += 1
+        cuerpo = json.dumps(RESPUESTA_CLIMA).encode()
+        self.send_response(self.estado)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(cuerpo)))
+        self.end_headers()
+        self.wfile.write(cuerpo)
+
+    def log_message(self, *args):
+        pass
+
+
+@override_settings(CACHES=CACHES_PRUEBA)
+class ClimaCircuitBreakerTests(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.servidor = ThreadingHTTPServer(('127.0.0.1', 0), _StubOpenWeatherMap)
+        threading.Thread(target=cls.servidor.serve_forever, daemon=True).start()
+        cls.url = f'http://127.0.0.1:{cls.servidor.server_port}/data/2.5/weather'
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.servidor.shutdown()
+        cls.servidor.server_close()
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+        clima_service._ultimos_climas.clear()
+        _StubOpenWeatherMap.estado = 200
+        _StubOpenWeatherMap.llamadas = 0
+        circuito = CircuitBreaker('prueba', umbral_fallos=2, tiempo_espera=60)
+        parche = mock.patch.object(clima_service, 'circuito_clima', circuito)
+        parche.start()
+        self.addCleanup(parche.stop)
+        self.circuito = circuito
+
+    def test_circuito_abierto_no_llama_a_la_api_y_sirve_ultimo_valor(self):
+        with self.settings(WEATHER_API_URL=self.url, WEATHER_HTTP_RETRIES=0):
+            self.assertEqual(ClimaService.refrescar_clima_ciudad('Talca')['temperatura'], 21.3)
+            cache.clear()
+
+            _StubOpenWeatherMap.estado = 503
+            for ciudad in ('Talca', 'Talca'):
+                cache.clear()
+                self.assertEqual(ClimaService.obtener_clima_por_ciudad(ciudad)['ciudad'], 'Talca')
+            self.assertEqual(self.circuito.estado, CircuitBreaker.ABIERTO)
+
+            llamadas = _StubOpenWeatherMap.llamadas
+            cache.clear()
+            self.assertEqual(ClimaService.obtener_clima_por_ciudad('Talca')['ciudad'], 'Talca')
+            self.assertIsNone(ClimaService.obtener_clima_por_ciudad('Curico'))
+            self.assertEqual(_StubOpenWeatherMap.llamadas, llamadas)
+            self.assertEqual(self.circuito.rechazos, 2)
+
+    def test_semiabierto_cierra_tras_prueba_exitosa(self):
+        with self.settings(WEATHER_API_URL=self.url, WEATHER_HTTP_RETRIES=0):
+            self.circuito.tiempo_espera = 0
+            _StubOpenWeatherMap.estado = 500
+            ClimaService.refrescar_clima_ciudad('Talca')
+            ClimaService.refrescar_clima_ciudad('Talca')
+            self.assertEqual(self.circuito.estado, CircuitBreaker.ABIERTO)
+
+            _StubOpenWeatherMap.estado = 200
+            self.assertIsNotNone(ClimaService.refrescar_clima_ciudad('Talca'))
+            self.assertEqual(self.circuito.estado, CircuitBreaker.CERRADO)
+            self.assertEqual(self.circuito.transiciones[CircuitBreaker.SEMIABIERTO], 1)
+            self.assertIn(
+                'circuit_breaker_transiciones_total{circuito="prueba",estado="abierto"} 1',
+                self.circuito.metricas(),
+            )
+
+    async def test_prueba_cancelada_no_deja_el_circuito_semiabierto(self):
+        self.circuito.tiempo_espera = 0
+        self.circuito.registrar_fallo()
+        self.circuito.registrar_fallo()
+
+        async def colgada(*args, **kwargs):
+            await asyncio.sleep(60)
+
+        with mock.patch.object(httpx.AsyncClient, 'get', colgada):
+            with self.assertRaises(asyncio.TimeoutError):
+                await asyncio.wait_for(ClimaService._llamar_api_async({'q': 'Talca'}), 0.05)
+        self.assertEqual(self.circuito.estado, CircuitBreaker.ABIERTO)
+        self.assertTrue(self.circuito.permitir())
+
+    async def test_lote_async_usa_un_cliente_y_lo_cierra(self):
+        creados = []
+        original = httpx.AsyncClient
+
+        def crear(*args, **kwargs):
+            creados.append(original(*args, **kwargs))
+            return creados[-1]
+
+        with self.settings(WEATHER_API_URL=self.url, WEATHER_HTTP_RETRIES=0), \
+                mock.patch.object(httpx, 'AsyncClient', side_effect=crear):
+            climas = await ClimaService.obtener_clima_multiple_async(['Talca', 'Curicó'])
+        self.assertEqual(len(climas), 2)
+        self.assertEqual(_StubOpenWeatherMap.llamadas, 2)
+        self.assertEqual(len(creados), 1)
+        self.assertTrue(creados[0].is_closed)
+
+    @override_settings(WEATHER_ULTIMOS_MAXIMO=2)
+    def test_ultimos_climas_descarta_el_menos_usado(self):
+        for lugar in ('talca', 'curico', 'linares'):
+            clima_service._recordar_clima(lugar, {'ciudad': lugar})
+            clima_service._ultimo_clima('talca')
+        self.assertEqual(set(clima_service._ultimos_climas), {'talca', 'linares'})
+
+    def test_prueba_sin_resultado_vence_tras_el_plazo(self):
+        circuito = CircuitBreaker('prueba', umbral_fallos=1, tiempo_espera=0, plazo_prueba=30)
+        circuito.registrar_fallo()
+        self.assertTrue(circuito.permitir())
+        self.assertFalse(circuito.permitir())
+        with mock.patch('appferiadigital.cliente_http.time.monotonic', return_value=time.monotonic() + 31):
+            self.assertTrue(circuito.permitir())
+
+
+@override_settings(CACHES=CACHES_PRUEBA)
+class CacheDosNivelesTests(SimpleTestCase):
+    def worker(self, nombre):
+        # Cada LOCATION tiene su propio L1, como si fuera otro proceso
+        return DosNivelesCache(nombre, {
+            'OPTIONS': {'L2': 'compartida', 'L1_TIMEOUT': 60, 'VERSION_CHECK_INTERVAL': 0},
+        })
+
+    def setUp(self):
+        caches['compartida'].clear()
+
+    def test_lee_de_l1_sin_tocar_l2(self):
+        worker = self.worker('w1')
+        worker.set('clave', {'valor': 1}, 60)
+        with mock.patch.object(caches['compartida'], 'get_many') as get_many:
+            self.assertEqual(worker.get_many(['clave']), {'clave': {'valor': 1}})
+        get_many.assert_not_called()
+
+    def test_escritura_en_un_worker_invalida_l1_de_los_demas(self):
+        w1, w2 = self.worker('w1'), self.worker('w2')
+        w1.set('clave', 'viejo', 60)
+        self.assertEqual(w2.get('clave'), 'viejo')
+
+        w1.set('clave', 'nuevo', 60)
+        self.assertEqual(w2.get('clave'), 'nuevo')
+
+        w1.delete('clave')
+        self.assertIsNone(w2.get('clave'))
+
+    def test_invalida_solo_el_prefijo_escrito(self):
+        def worker(nombre):
+            return DosNivelesCache(nombre, {'OPTIONS': {
+                'L2': 'compartida', 'L1_TIMEOUT': 60, 'VERSION_CHECK_INTERVAL': 0, 'INVALIDAR': ['identidad_'],
+            }})
+
+        w1, w2 = worker('p1'), worker('p2')
+        w1.set_many({'identidad_1': 'viejo', 'fragmento': 'a'}, 60)
+        self.assertEqual(w2.get_many(['identidad_1', 'fragmento']), {'identidad_1': 'viejo', 'fragmento': 'a'})
+
+        # Una clave sin prefijo no publica versión y escribir otro prefijo no
+        # vacía el L1: w2 sigue leyendo su copia hasta L1_TIMEOUT
+        w1.set('fragmento', 'b', 60)
+        w1.set('identidad_1', 'nuevo', 60)
+        self.assertEqual(w2.get('fragmento'), 'a')
+        self.assertEqual(w2.get('identidad_1'), 'nuevo')
+
+        w1.clear()
+        self.assertIsNone(w2.get('fragmento'))
+
+
+class ReservaConcurrenteTests(TransactionTestCase):
+    def setUp(self):
+        feria = Feria.objects.create(nombre_feria='Feria Central', ciudad='Talca')
+        vendedor = Usuario.objects.create(rut='11111111-1', nombre='Vendedor', rol='vendedor',
+                                          email='v@feria.cl', contrasena='x')
+        puesto = Puesto.objects.create(id_feria=feria, id_usuario=vendedor, numero_puesto='1')
+        self.producto = Producto.objects.create(id_puesto=puesto, nombre_producto='Tomate', stock=50)
+        self.clientes = [
+            Usuario.objects.create(rut=f'2000000{i}-1', nombre=f'Cliente {i}', rol='cliente',
+                                   email=f'c{i}@feria.cl', contrasena='x')
+            for i in range(8)
+        ]
+
+    def test_reservas_concurrentes_no_sobrevenden(self):
+        # Con SQLite en memoria los hilos comparten una conexión y la tabla queda bloqueada
+        if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+            self.skipTest('Requiere una base de datos en disco (ver DATABASES en settings)')
+        intentos_por_cliente = 20
+        exitos = []
+
+        def reservar(cliente):
+            try:
+                for _ in range(intentos_por_cliente):
+                    if ReservaService.reservar(cliente.id_usuario, self.producto.id_producto, 1):
+                        exitos.append(1)
+            finally:
+                connections.close_all()
+
+        hilos = [threading.Thread(target=reservar, args=(c,)) for c in self.clientes]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+
+        self.producto.refresh_from_db()
+        self.assertEqual(self.producto.stock, 0)
+        self.assertEqual(len(exitos), 50)
+        self.assertEqual(Reserva.objects.count(), 50)
+
+    def test_cancelar_dos_veces_devuelve_stock_una_vez(self):
+        reserva = ReservaService.reservar(self.clientes[0].id_usuario, self.producto.id_producto, 5)
+        self.assertTrue(ReservaService.cancelar(reserva))
+        self.assertFalse(ReservaService.cancelar(reserva))
+        self.producto.refresh_from_db()
+        self.assertEqual(self.producto.stock, 50)
+
+
+class CarritoTests(TestCase):
+    def setUp(self):
+        feria = Feria.objects.create(nombre_feria='Feria Central')
+        vendedor = Usuario.objects.create(rut='11111111-1', nombre='Vendedor', rol='vendedor',
+                                          email='v@feria.cl', contrasena='x')
+        self.cliente = Usuario.objects.create(rut='22222222-2', nombre='Cliente', rol='cliente',
+                                              email='c@feria.cl', contrasena='x')
+        self.puesto = Puesto.objects.create(id_feria=feria, id_usuario=vendedor, numero_puesto='1')
+        self.productos = Producto.objects.bulk_create([
+            Producto(id_puesto=self.puesto, nombre_producto=f'Producto {i}', stock=10)
+            for i in range(8)
+        ])
+
+    def reservar(self, productos, cantidad=1):
+        return ReservaService.reservar_carrito(
+            self.cliente.id_usuario, self.puesto.id_puesto,
+            [(p.id_producto, cantidad, 'kg') for p in productos]
+        )
+
+    def test_consultas_constantes_sin_importar_el_tamano_del_carrito(self):
+        EstadisticasService.recalcular(self.puesto.id_usuario_id)
+        with CaptureQueriesContext(connection) as uno:
+            self.reservar(self.productos[:1])
+        with self.assertNumQueries(len(uno.captured_queries)):
+            reserva = self.reservar(self.productos)
+        self.assertEqual(ReservaProducto.objects.filter(id_reserva=reserva).count(), 8)
+        self.assertEqual(reserva.cantidad, 8)
+
+    def test_todo_o_nada(self):
+        self.assertIsNone(self.reservar(self.productos, cantidad=11))
+        self.assertFalse(Reserva.objects.exists())
+        self.assertEqual(set(Producto.objects.values_list('stock', flat=True)), {10})
+
+    def test_cancelar_devuelve_stock_de_todas_las_lineas(self):
+        reserva = self.reservar(self.productos, cantidad=3)
+        self.assertTrue(ReservaService.cancelar(reserva))
+        self.assertEqual(set(Producto.objects.values_list('stock', flat=True)), {10})
+        reserva.refresh_from_db()
+        self.assertEqual(reserva.estado, Reserva.CANCELADA)
+        # Ya finalizada: no se puede cancelar ni procesar otra vez
+        self.assertFalse(ReservaService.cancelar(reserva))
+        self.assertFalse(ReservaService.procesar(reserva))
+        self.assertEqual(set(Producto.objects.values_list('stock', flat=True)), {10})
+
+
+class ArchivoReservasTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        feria = Feria.objects.create(nombre_feria='Feria Central')
+        self.vendedor = Usuario.objects.create(rut='11111111-1', nombre='Vendedor', rol='vendedor',
+                                               email='v@feria.cl', contrasena='x')
+        self.cliente = Usuario.objects.create(rut='22222222-2', nombre='Cliente', rol='cliente',
+                                              email='c@feria.cl', contrasena='x')
+        self.puesto = Puesto.objects.create(id_feria=feria, id_usuario=self.vendedor, numero_puesto='1')
+        self.productos = [
+            Producto.objects.create(id_puesto=self.puesto, nombre_producto=f'Producto {i}', stock=100)
+            for i in range(2)
+        ]
+
+    def reservas_antiguas(self):
+        a, b = self.productos
+        with self.captureOnCommitCallbacks(execute=True):
+            reservas = [ReservaService.reservar(self.cliente.id_usuario, a.id_producto, 1) for _ in range(5)]
+            reservas.append(ReservaService.reservar_carrito(
+                self.cliente.id_usuario, self.puesto.id_puesto,
+                [(a.id_producto, 2, 'kg'), (b.id_producto, 3, 'kg')]
+            ))
+            for reserva in reservas[:2]:
+                ReservaService.cancelar(reserva)
+            for reserva in reservas[2:4] + reservas[5:]:
+                ReservaService.procesar(reserva)
+        Reserva.objects.update(fecha_reserva=timezone.localdate() - timedelta(days=200))
+        EstadisticasService.recalcular(self.vendedor.id_usuario)
+        # Reciente: se queda aunque esté procesada
+        with self.captureOnCommitCallbacks(execute=True):
+            reciente = ReservaService.reservar(self.cliente.id_usuario, b.id_producto, 1)
+            ReservaService.procesar(reciente)
+        return reservas, reciente
+
+    def test_archiva_en_lotes_solo_las_finalizadas_antiguas(self):
+        reservas, reciente = self.reservas_antiguas()
+        salida = io.StringIO()
+        call_command('archivar_reservas', dias=90, lote=2, stdout=salida)
+
+        # 5 finalizadas antiguas (la pendiente reservas[4] se queda), en 3 lotes
+        archivadas = {reservas[i].id_reserva for i in (0, 1, 2, 3, 5)}
+        self.assertEqual(set(ReservaArchivada.objects.values_list('id_reserva', flat=True)), archivadas)
+        self.assertEqual(set(Reserva.objects.values_list('id_reserva', flat=True)),
+                         {reservas[4].id_reserva, reciente.id_reserva})
+        self.assertEqual(ReservaProductoArchivada.objects.filter(id_reserva=reservas[5].id_reserva).count(), 2)
+        self.assertFalse(ReservaProducto.objects.exists())
+        self.assertEqual(ReservaArchivada.objects.get(id_reserva=reservas[0].id_reserva).estado, Reserva.CANCELADA)
+        self.assertIn('5 reservas', salida.getvalue())
+        # Las estadísticas solo cuentan pendientes: archivar no las cambia
+        self.assertEqual(EstadisticasService.diferencias(self.vendedor.id_usuario), {})
+
+        call_command('archivar_reservas', dias=90, stdout=io.StringIO())
+        self.assertEqual(ReservaArchivada.objects.count(), 5)
+
+    def test_mis_reservas_muestra_el_archivo(self):
+        reservas, reciente = self.reservas_antiguas()
+        call_command('archivar_reservas', dias=90, stdout=io.StringIO())
+        cliente = Client(HTTP_HOST='localhost')
+        sesion = cliente.session
+        sesion.update({'usuario_id': self.cliente.id_usuario, 'usuario_rol': 'cliente'})
+        sesion.save()
+
+        actuales = cliente.get(reverse('mis_reservas_cliente'))
+        self.assertEqual(len(actuales.context['reservas']), 2)
+        archivo = cliente.get(reverse('mis_reservas_cliente'), {'archivo': 1})
+        self.assertEqual({r.id_reserva for r in archivo.context['reservas']},
+                         set(ReservaArchivada.objects.values_list('id_reserva', flat=True)))
+
+    def test_productos_con_reservas_archivadas_o_en_carrito_no_se_eliminan(self):
+        reservas, reciente = self.reservas_antiguas()
+        call_command('archivar_reservas', dias=90, stdout=io.StringIO())
+        reciente.delete()
+        solo_archivo = self.productos[1]
+        en_carrito, libre = (
+            Producto.objects.create(id_puesto=self.puesto, nombre_producto=f'Producto {i}', stock=10)
+            for i in (2, 3)
+        )
+        ReservaService.reservar_carrito(self.cliente.id_usuario, self.puesto.id_puesto,
+                                        [(en_carrito.id_producto, 1, 'kg')])
+
+        self.assertTrue(ReservaService.producto_tiene_reservas(solo_archivo))
+        self.assertTrue(ReservaService.producto_tiene_reservas(en_carrito))
+        self.assertFalse(ReservaService.producto_tiene_reservas(libre))
+
+
+class ImportacionProductosTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        feria = Feria.objects.create(nombre_feria='Feria Central')
+        self.vendedor = Usuario.objects.create(rut='11111111-1', nombre='Vendedor', rol='vendedor',
+                                               email='v@feria.cl', contrasena='x')
+        otro = Usuario.objects.create(rut='33333333-3', nombre='Otro', rol='vendedor',
+                                      email='o@feria.cl', contrasena='x')
+        self.puesto = Puesto.objects.create(id_feria=feria, id_usuario=self.vendedor, numero_puesto='7')
+        self.ajeno = Puesto.objects.create(id_feria=feria, id_usuario=otro, numero_puesto='8')
+        self.frutas = Categoria.objects.create(nombre='Frutas')
+        self.papa = Producto.objects.create(id_puesto=self.puesto, nombre_producto='Papa', stock=5)
+        EstadisticasService.recalcular(self.vendedor.id_usuario)
+        self.http = Client(HTTP_HOST='localhost')
+        sesion = self.http.session
+        sesion.update({'usuario_id': self.vendedor.id_usuario, 'usuario_rol': 'vendedor'})
+        sesion.save()
+
+    def _csv(self, texto, nombre='productos.csv'):
+        archivo = io.BytesIO(texto.encode())
+        archivo.name = nombre
+        return self.http.post(reverse('importar_productos'), {'archivo': archivo})
+
+    def test_crea_actualiza_e_informa_filas_con_error(self):
+        version = self.puesto.version
+        respuesta = self._csv(
+            'nombre;stock;categoria;puesto\n'
+            'Manzana;10;frutas;7\n'
+            'PAPÁ;8;;\n'
+            'Pera;-1;;\n'
+            'Kiwi;3;Lácteos;\n'
+            'Uva;4;;8\n'
+        )
+        resultado = respuesta.context['resultado']
+        self.assertEqual((resultado.creados, resultado.actualizados, resultado.filas_con_error), (1, 1, 3))
+        self.assertEqual([numero for numero, _ in resultado.errores], [4, 5, 6])
+        self.assertContains(respuesta, 'Categoría desconocida')
+
+        manzana = Producto.objects.get(nombre_producto='Manzana')
+        self.assertEqual((manzana.id_puesto_id, manzana.id_categoria_id), (self.puesto.id_puesto, self.frutas.id_categoria))
+        self.papa.refresh_from_db()
+        self.assertEqual(self.papa.stock, 8)
+        self.assertFalse(Producto.objects.filter(id_puesto=self.ajeno).exists())
+
+        # Lo que hacen las señales para un producto guardado uno a uno
+        stats = EstadisticaVendedor.objects.get(id_usuario=self.vendedor)
+        self.assertEqual((stats.total_productos, stats.total_stock), (2, 18))
+        self.assertEqual(EstadisticasService.diferencias(self.vendedor.id_usuario), {})
+        self.assertEqual(BusquedaService.buscar('manzana')[0].id_producto, manzana.id_producto)
+        self.puesto.refresh_from_db()
+        self.assertGreater(self.puesto.version, version)
+
+    @override_settings(IMPORTACION_LOTE=10)
+    def test_consultas_por_lote_no_dependen_del_archivo(self):
+        def importar(inicio, filas):
+            lineas = ['nombre,stock'] + [f'Producto {i},{i}' for i in range(inicio, inicio + filas)]
+            with CaptureQueriesContext(connection) as consultas:
+                resultado = ImportacionService.importar(self.vendedor.id_usuario, csv.reader(lineas))
+            self.assertEqual(resultado.creados, filas)
+            return len(consultas.captured_queries)
+
+        un_lote = importar(0, 10)
+        dos_lotes = importar(100, 20)
+        self.assertEqual(importar(200, 50), un_lote + 4 * (dos_lotes - un_lote))
+
+    def test_xlsx(self):
+        from openpyxl import Workbook
+        libro = Workbook()
+        libro.active.append(['Nombre', 'Stock', 'Categoría'])
+        libro.active.append(['Papa', 12.0, self.frutas.id_categoria])
+        archivo = io.BytesIO()
+        libro.save(archivo)
+        archivo.seek(0)
+
+        filas = ImportacionService.leer_filas(archivo, 'inventario.XLSX')
+        resultado = ImportacionService.importar(self.vendedor.id_usuario, filas)
+        self.assertEqual(resultado.actualizados, 1)
+        self.papa.refresh_from_db()
+        self.assertEqual((self.papa.stock, self.papa.id_categoria_id), (12, self.frutas.id_categoria))
+
+
+class ExportacionReservasTests(TestCase):
+    def setUp(self):
+        feria = Feria.objects.create(nombre_feria='Feria Central')
+        vendedor = Usuario.objects.create(rut='11111111-1', nombre='Vendedor', rol='vendedor',
+                                          email='v@feria.cl', contrasena='x')
+        otro = Usuario.objects.create(rut='33333333-3', nombre='Otro', rol='vendedor',
+                                      email='o@feria.cl', contrasena='x')
+        self.cliente = Usuario.objects.create(rut='22222222-2', nombre='Cliente Ñuñoa', rol='cliente',
+                                              email='c@feria.cl', contrasena='x')
+        self.puesto = Puesto.objects.create(id_feria=feria, id_usuario=vendedor, numero_puesto='7')
+        self.otro_puesto = Puesto.objects.create(id_feria=feria, id_usuario=vendedor, numero_puesto='9')
+        self.papa = Producto.objects.create(id_puesto=self.puesto, nombre_producto='Papa', stock=10_000)
+        self.choclo = Producto.objects.create(id_puesto=self.otro_puesto, nombre_producto='Choclo', stock=10)
+        ajeno = Producto.objects.create(
+            id_puesto=Puesto.objects.create(id_feria=feria, id_usuario=otro), nombre_producto='Ajeno', stock=10
+        )
+        ReservaService.reservar(self.cliente.id_usuario, ajeno.id_producto, 1)
+        self.http = Client(HTTP_HOST='localhost')
+        sesion = self.http.session
+        sesion.update({'usuario_id': vendedor.id_usuario, 'usuario_rol': 'vendedor'})
+        sesion.save()
+        self.vendedor = vendedor
+
+    def _exportar(self, **filtros):
+        respuesta = self.http.get(reverse('exportar_reservas'), filtros)
+        self.assertEqual(respuesta.status_code, 200)
+        return b''.join(respuesta.streaming_content).decode()
+
+    def test_una_fila_por_producto_con_filtros(self):
+        simple = ReservaService.reservar(self.cliente.id_usuario, self.papa.id_producto, 2)
+        carrito = ReservaService.reservar_carrito(
+            self.cliente.id_usuario, self.otro_puesto.id_puesto, [(self.choclo.id_producto, 3, 'kg')]
+        )
+        Reserva.objects.filter(id_reserva=simple.id_reserva).update(fecha_reserva=timezone.localdate() - timedelta(days=10))
+
+        filas = list(csv.reader(io.StringIO(self._exportar().lstrip('\ufeff'))))
+        self.assertEqual(filas[0][:3], ['id_reserva', 'fecha', 'cliente'])
+        self.assertEqual([(f[0], f[2], f[5], f[6], f[7], f[8]) for f in filas[1:]], [
+            (str(carrito.id_reserva), 'Cliente Ñuñoa', '9', 'Choclo', '3', 'kg'),
+            (str(simple.id_reserva), 'Cliente Ñuñoa', '7', 'Papa', '2', ''),
+        ])
+
+        desde = (timezone.localdate() - timedelta(days=1)).isoformat()
+        self.assertEqual(len(self._exportar(desde=desde).splitlines()), 2)
+        lineas = self._exportar(formato='jsonl', puesto=self.puesto.id_puesto).splitlines()
+        self.assertEqual([json.loads(linea)['producto'] for linea in lineas], ['Papa'])
+
+    @override_settings(EXPORTACION_CHUNK=100)
+    def test_memoria_no_crece_con_las_filas(self):
+        def pico(reservas):
+            Reserva.objects.bulk_create(
+                [Reserva(id_usuario=self.cliente, id_producto=self.papa, cantidad=1)] * reservas
+            )
+            tracemalloc.start()
+            try:
+                filas = sum(bloque.count(b'\n') for bloque in self.http.get(reverse('exportar_reservas')).streaming_content)
+                return filas, tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+
+        self._exportar()  # cachés de Django (URLs, compilación de consultas) fuera de la medición
+        filas, chico = pico(300)
+        self.assertEqual(filas, 301)
+        filas, grande = pico(2700)
+        self.assertEqual(filas, 3001)
+        self.assertLess(grande, chico * 1.5)
+
+    @override_settings(EXPORTACION_CHUNK=1)
+    async def test_con_asgi_envia_los_bloques_a_medida_que_los_lee(self):
+        for _ in range(3):
+            await sync_to_async(ReservaService.reservar)(self.cliente.id_usuario, self.papa.id_producto, 1)
+        http = AsyncClient(headers={'Host': 'localhost'})
+        sesion = await http.asession()
+        await sesion.aupdate({'usuario_id': self.vendedor.id_usuario, 'usuario_rol': 'vendedor'})
+        await sesion.asave()
+
+        respuesta = await http.get(reverse('exportar_reservas'), {'formato': 'jsonl'})
+        self.assertTrue(respuesta.is_async)
+        bloques = [bloque async for bloque in respuesta.streaming_content]
+        self.assertEqual(len(bloques), 3)
+        self.assertEqual({json.loads(bloque)['producto'] for bloque in bloques}, {'Papa'})
+
+
+class EstadisticasVendedorTests(TestCase):
+    def setUp(self):
+        feria = Feria.objects.create(nombre_feria='Feria Central')
+        self.vendedor = Usuario.objects.create(rut='11111111-1', nombre='Vendedor', rol='vendedor',
+                                               email='v@feria.cl', contrasena='x')
+        self.cliente = Usuario.objects.create(rut='22222222-2', nombre='Cliente', rol='cliente',
+                                              email='c@feria.cl', contrasena='x')
+        self.puesto = Puesto.objects.create(id_feria=feria, id_usuario=self.vendedor)
+        self.productos = [
+            Producto.objects.create(id_puesto=self.puesto, nombre_producto=f'Producto {i}', stock=20)
+            for i in range(3)
+        ]
+
+    def test_incrementales_coinciden_con_recalculo(self):
+        id_vendedor = self.vendedor.id_usuario
+        a, b, c = self.productos
+        with self.captureOnCommitCallbacks(execute=True):
+            simple = ReservaService.reservar(self.cliente.id_usuario, a.id_producto, 4)
+            carrito = ReservaService.reservar_carrito(
+                self.cliente.id_usuario, self.puesto.id_puesto,
+                [(a.id_producto, 1, 'kg'), (b.id_producto, 6, 'kg')]
+            )
+            otra = ReservaService.reservar(self.cliente.id_usuario, c.id_producto, 2)
+            ReservaService.cancelar(simple)
+            ReservaService.procesar(otra)
+        producto = Producto.objects.get(id_producto=b.id_producto)
+        producto.stock += 5
+        producto.save()
+        c.refresh_from_db()
+        c.delete()
+
+        self.assertEqual(EstadisticasService.diferencias(id_vendedor), {})
+        stats = EstadisticaVendedor.objects.get(id_usuario=id_vendedor)
+        self.assertEqual((stats.total_productos, stats.total_reservas, stats.cantidad_reservada),
+                         (2, 1, 7))
+        self.assertEqual(stats.total_stock, 19 + 19)
+        self.assertEqual(stats.productos_populares[0],
+                         {'id_producto__nombre_producto': 'Producto 1', 'total_reservado': 6})
+
+        carrito.delete()
+        self.assertNotEqual(EstadisticasService.diferencias(id_vendedor), {})
+        EstadisticasService.recalcular(id_vendedor)
+        self.assertEqual(EstadisticasService.diferencias(id_vendedor), {})
+
+    def test_reservar_suma_sin_recalcular_el_top_hasta_leer(self):
+        id_vendedor = self.vendedor.id_usuario
+        EstadisticasService.recalcular(id_vendedor)
+        with CaptureQueriesContext(connection) as consultas, self.captureOnCommitCallbacks() as despues:
+            ReservaService.reservar(self.cliente.id_usuario, self.productos[0].id_producto, 3)
+        # La transacción de la reserva no escribe filas compartidas por el vendedor o el puesto
+        sql = ' '.join(c['sql'] for c in consultas.captured_queries)
+        self.assertNotIn('estadistica', sql)
+        self.assertNotIn('UPDATE "appferiadigital_puesto"', sql)
+        self.assertNotIn('FOR UPDATE', sql)
+
+        with CaptureQueriesContext(connection) as consultas:
+            for funcion in despues:
+                funcion()
+        sql = ' '.join(c['sql'] for c in consultas.captured_queries)
+        self.assertNotIn('FROM "appferiadigital_estadisticaproducto"', sql)  # el top
+
+        stats = EstadisticaVendedor.objects.get(id_usuario=id_vendedor)
+        self.assertEqual((stats.total_reservas, stats.cantidad_reservada, stats.productos_populares), (1, 3, []))
+
+        # Fila, top, reservas por día y guardarlos; luego solo la fila
+        with self.assertNumQueries(4):
+            stats = EstadisticasService.leer(id_vendedor)
+        self.assertEqual(stats.productos_populares,
+                         [{'id_producto__nombre_producto': 'Producto 0', 'total_reservado': 3}])
+        self.assertEqual(sum(stats.reservas_por_dia.values()), 1)
+        with self.assertNumQueries(1):
+            EstadisticasService.leer(id_vendedor)
+
+
+@override_settings(CACHES=CACHES_PRUEBA)
+class IdentidadUsuarioTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.usuario = Usuario.objects.create(rut='22222222-2', nombre='Cliente', rol='cliente',
+                                              email='c@feria.cl', contrasena='x')
+        self.request = RequestFactory().get('/')
+        self.request.session = {'usuario_id': self.usuario.id_usuario, 'usuario_rol': 'cliente'}
+
+    def test_identidad_en_cache_sin_contrasena_e_invalidada_al_guardar(self):
+        with self.assertNumQueries(1):
+            usuario = obtener_usuario(self.request)
+        self.assertEqual(usuario.get_deferred_fields(), {'contrasena'})
+        with self.assertNumQueries(0):
+            self.assertEqual(obtener_usuario(self.request).nombre, 'Cliente')
+
+        usuario.nombre = 'Otro nombre'
+        usuario.save(update_fields=['nombre'])
+        with self.assertNumQueries(1):
+            self.assertEqual(obtener_usuario(self.request).nombre, 'Otro nombre')
+
+    def test_rol_incorrecto_redirige_al_dashboard(self):
+        cliente = Client(HTTP_HOST='localhost')
+        sesion = cliente.session
+        sesion.update({'usuario_id': self.usuario.id_usuario, 'usuario_rol': 'cliente'})
+        sesion.save()
+        respuesta = cliente.get(reverse('mi_puesto'))
+        self.assertRedirects(respuesta, reverse('dashboard'), fetch_redirect_response=False)
+
+
+@override_settings(CACHES=CACHES_PRUEBA)
+class GetCondicionalTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.feria = Feria.objects.create(nombre_feria='Feria Central', ciudad='Talca')
+        vendedor = Usuario.objects.create(rut='11111111-1', nombre='Vendedor', rol='vendedor',
+                                          email='v@feria.cl', contrasena='x')
+        self.cliente = Usuario.objects.create(rut='22222222-2', nombre='Cliente', rol='cliente',
+                                              email='c@feria.cl', contrasena='x')
+        self.puesto = Puesto.objects.create(id_feria=self.feria, id_usuario=vendedor)
+        self.producto = Producto.objects.create(id_puesto=self.puesto, nombre_producto='Papa', stock=5)
+        self.http = Client(HTTP_HOST='localhost')
+        sesion = self.http.session
+        sesion.update({'usuario_id': self.cliente.id_usuario, 'usuario_rol': 'cliente'})
+        sesion.save()
+
+    def test_304_sin_consultas_principales_hasta_que_cambia_el_stock(self):
+        url = reverse('detalle_puesto', args=[self.puesto.id_puesto])
+        self.http.get(url)  # crea la cookie CSRF, que forma parte del ETag
+        etag = self.http.get(url)['ETag']
+
+        # Sesión y versión del puesto
+        with self.assertNumQueries(2):
+            respuesta = self.http.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(respuesta.status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            ReservaService.reservar(self.cliente.id_usuario, self.producto.id_producto, 1)
+        respuesta = self.http.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertNotEqual(respuesta['ETag'], etag)
+
+    def test_puestos_cambian_de_version_solo_con_lo_que_muestran_de_la_feria(self):
+        def version_puesto():
+            return Puesto.objects.values_list('version', flat=True).get(id_puesto=self.puesto.id_puesto)
+
+        feria = Feria.objects.get(id_feria=self.feria.id_feria)
+        antes = version_puesto()
+        feria.aglomeracion = 80
+        feria.save()
+        self.assertEqual(version_puesto(), antes)
+        feria.ubicacion_feria = 'Calle 1'
+        feria.save()
+        self.assertEqual(version_puesto(), antes + 1)
+
+    async def test_detalle_feria_async_con_asgi(self):
+        url = reverse('detalle_feria', args=[self.feria.id_feria])
+        http = AsyncClient(headers={'Host': 'localhost'})
+        with mock.patch.object(ClimaService, 'obtener_clima_por_ciudad_async',
+                               return_value={'temperatura': 21, 'ciudad': 'Talca'}) as clima:
+            respuesta = await http.get(url)
+            self.assertContains(respuesta, '21°C')
+            respuesta = await http.get(url, headers={'If-None-Match': respuesta['ETag']})
+        self.assertEqual(respuesta.status_code, 304)
+        self.assertEqual(clima.await_count, 1)
+
+    def test_lista_ferias_304_sin_pedir_clima(self):
+        url = reverse('lista_ferias')
+        Feria.objects.update(modificado=timezone.now() - timedelta(minutes=5))
+        with mock.patch.object(ClimaService, 'obtener_clima_multiple_async', return_value={}) as clima:
+            modificado = self.http.get(url)['Last-Modified']
+            self.assertEqual(self.http.get(url, HTTP_IF_MODIFIED_SINCE=modificado).status_code, 304)
+            self.assertEqual(clima.call_count, 1)
+
+            self.feria.nombre_feria = 'Feria Nueva'
+            self.feria.save()
+            self.assertEqual(self.http.get(url, HTTP_IF_MODIFIED_SINCE=modificado).status_code, 200)
+
+    def test_lista_ferias_cambia_last_modified_al_borrar(self):
+        url = reverse('lista_ferias')
+        otra = Feria.objects.create(nombre_feria='Feria Sur')
+        Feria.objects.update(modificado=timezone.now() - timedelta(minutes=5))
+        with mock.patch.object(ClimaService, 'obtener_clima_multiple_async', return_value={}):
+            modificado = self.http.get(url)['Last-Modified']
+            self.assertEqual(self.http.get(url, HTTP_IF_MODIFIED_SINCE=modificado).status_code, 304)
+            otra.delete()
+            self.assertEqual(self.http.get(url, HTTP_IF_MODIFIED_SINCE=modificado).status_code, 200)
+
+
+class EventosStockTests(TestCase):
+    def setUp(self):
+        vendedor = Usuario.objects.create(rut='11111111-1', nombre='Vendedor', rol='vendedor',
+                                          email='v@feria.cl', contrasena='x')
+        self.cliente = Usuario.objects.create(rut='22222222-2', nombre='Cliente', rol='cliente',
+                                              email='c@feria.cl', contrasena='x')
+        feria = Feria.objects.create(nombre_feria='Feria Central')
+        self.puesto = Puesto.objects.create(id_feria=feria, id_usuario=vendedor)
+        self.papa = Producto.objects.create(id_puesto=self.puesto, nombre_producto='Papa', stock=5)
+        self.choclo = Producto.objects.create(id_puesto=self.puesto, nombre_producto='Choclo', stock=2)
+        self.puesto.refresh_from_db()
+        self.http = AsyncClient(headers={'Host': 'localhost'})
+        sesion = self.http.session
+        sesion.update({'usuario_id': self.cliente.id_usuario, 'usuario_rol': 'cliente'})
+        sesion.save()
+
+    async def _eventos(self, version):
+        url = reverse('eventos_stock', args=[self.puesto.id_puesto])
+        respuesta = await self.http.get(url, {'version': version})
+        self.assertEqual(respuesta['Content-Type'], 'text/event-stream')
+        stream = respuesta.streaming_content
+        self.assertTrue((await anext(stream)).startswith(b'retry: '))  # se suscribe al feed
+        return stream
+
+    def reservar(self, producto, cantidad):
+        # La versión del puesto se marca al confirmar la transacción
+        with self.captureOnCommitCallbacks(execute=True):
+            return ReservaService.reservar(self.cliente.id_usuario, producto.id_producto, cantidad)
+
+    async def _siguiente_stock(self, stream):
+        async for parte in stream:
+            parte = parte.decode()
+            if parte.startswith('event: stock'):
+                return json.loads(parte.split('data: ')[1])
+
+    def test_sin_asgi_no_se_conecta(self):
+        http = Client(HTTP_HOST='localhost')
+        sesion = http.session
+        sesion.update({'usuario_id': self.cliente.id_usuario, 'usuario_rol': 'cliente'})
+        sesion.save()
+        pagina = http.get(reverse('detalle_puesto', args=[self.puesto.id_puesto]))
+        self.assertNotContains(pagina, 'data-eventos')
+        self.assertEqual(http.get(reverse('eventos_stock', args=[self.puesto.id_puesto])).status_code, 204)
+
+    async def test_con_asgi_la_pagina_se_conecta(self):
+        pagina = await self.http.get(reverse('detalle_puesto', args=[self.puesto.id_puesto]))
+        self.assertContains(pagina, 'data-eventos')
+
+    @override_settings(STOCK_EVENTOS_INTERVALO=0.01, STOCK_EVENTOS_LATIDO=0.02, STOCK_EVENTOS_DURACION=2)
+    async def test_solo_envia_los_productos_que_cambiaron(self):
+        stream = await self._eventos(self.puesto.version)
+        await asyncio.sleep(0.05)  # la página ya estaba al día: ningún evento todavía
+        await sync_to_async(self.reservar)(self.papa, 2)
+
+        evento = await self._siguiente_stock(stream)
+        self.assertEqual(evento['productos'], {str(self.papa.id_producto): 3})
+        await stream.aclose()
+
+    @override_settings(STOCK_EVENTOS_INTERVALO=0.01, STOCK_EVENTOS_DURACION=2)
+    async def test_version_vieja_recibe_todo_el_stock(self):
+        stream = await self._eventos(self.puesto.version - 1)
+        evento = await self._siguiente_stock(stream)
+        self.assertEqual(evento, {
+            'version': self.puesto.version,
+            'productos': {str(self.papa.id_producto): 5, str(self.choclo.id_producto): 2},
+        })
+        await stream.aclose()
+
+
+@override_settings(CACHES=CACHES_PRUEBA)
+class FragmentosCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        metricas.registro.reiniciar()
+        self.feria = Feria.objects.create(nombre_feria='Feria Central')
+        self.vendedor = Usuario.objects.create(rut='11111111-1', nombre='Vendedor', rol='vendedor',
+                                               email='v@feria.cl', contrasena='x', telefono='111')
+        for i in range(3):
+            puesto = Puesto.objects.create(id_feria=self.feria, id_usuario=self.vendedor)
+            Producto.objects.create(id_puesto=puesto, nombre_producto='Papa', stock=5)
+        self.url = reverse('detalle_feria', args=[self.feria.id_feria])
+
+    def test_tarjetas_desde_cache_hasta_que_cambia_el_vendedor(self):
+        http = Client(HTTP_HOST='localhost')
+        with CaptureQueriesContext(connection) as fria:
+            http.get(self.url)
+        with CaptureQueriesContext(connection) as caliente:
+            http.get(self.url)
+        # Sin el conteo de productos de cada tarjeta
+        self.assertEqual(len(fria) - len(caliente), 3)
+        datos = metricas.registro.instantanea()['detalle_feria']
+        self.assertEqual((datos['fragmentos_aciertos'], datos['fragmentos_fallos']), (3, 3))
+
+        self.vendedor.telefono = '222'
+        self.vendedor.save(update_fields=['telefono'])
+        self.assertContains(http.get(self.url), '222', count=3)
+
+
+@override_settings(CACHES=CACHES_PRUEBA, LOGIN_IP_CAPACIDAD=4, LOGIN_EMAIL_CAPACIDAD=10,
+                   LOGIN_FALLOS_SIN_ESPERA=2, LOGIN_ESPERA_BASE=30)
+class LimiteLoginTests(TestCase):
+    def setUp(self):
+        caches['compartida'].clear()
+        Usuario.objects.create(rut='22222222-2', nombre='Cliente', rol='cliente',
+                               email='c@feria.cl', contrasena=make_password('clave'))
+        self.http = Client(HTTP_HOST='localhost')
+
+    def intentar(self, email, contrasena='mala'):
+        return self.http.post(reverse('login'), {'email': email, 'contrasena': contrasena})
+
+    def test_rechaza_sin_calcular_el_hash_y_espera_progresiva(self):
+        with mock.patch('appferiadigital.limite_login.check_password', return_value=False) as verificar:
+            for _ in range(2):
+                self.assertEqual(self.intentar('c@feria.cl').status_code, 200)
+            # Tercer fallo: el email y la IP quedan en espera
+            respuesta = self.intentar('otro@feria.cl')
+            self.assertEqual(respuesta.status_code, 429)
+            self.assertGreaterEqual(int(respuesta['Retry-After']), 29)
+        self.assertEqual(verificar.call_count, 2)
+        self.assertIn('login_intentos_total{resultado="limitado"} 1', limite_login.metricas())
+
+    def test_email_desconocido_verifica_un_hash_ficticio(self):
+        with mock.patch('appferiadigital.limite_login.check_password', return_value=False) as verificar:
+            self.intentar('nadie@feria.cl')
+        verificar.assert_called_once_with('mala', limite_login._hash_ficticio())
+        self.assertRedirects(self.intentar('c@feria.cl', 'clave'), reverse('dashboard'),
+                             fetch_redirect_response=False)
+
+
+@override_settings(CACHES=CACHES_PRUEBA)
+class MetricasVistaTests(TestCase):
+    def setUp(self):
+        directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(directorio.cleanup)
+        ajustes = override_settings(METRICAS_DIR=directorio.name, METRICAS_INTERVALO=0)
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+        self.directorio = directorio.name
+        metricas.registro.reiniciar()
+        self.addCleanup(metricas.registro.reiniciar)
+
+    def test_acumula_por_vista_y_suma_los_workers(self):
+        cliente = Client(HTTP_HOST='localhost')
+        cliente.get(reverse('login'))
+        cliente.get(reverse('dashboard'))
+
+        vistas = metricas.registro.instantanea()
+        self.assertEqual(vistas['login']['peticiones'], {'2xx': 1})
+        self.assertEqual(vistas['dashboard']['peticiones'], {'3xx': 1})
+        self.assertTrue(os.path.exists(os.path.join(self.directorio, f'{os.getpid()}.json')))
+
+        # Otro worker con una petición a login
+        with open(os.path.join(self.directorio, '1.json'), 'w') as archivo:
+            json.dump({'login': vistas['login']}, archivo)
+        texto = metricas.exportar_prometheus(metricas.leer_todas())
+        self.assertIn('vista_peticiones_total{vista="login",estado="2xx"} 2', texto)
+        self.assertIn('vista_latencia_segundos_count{vista="login"} 2', texto)
+        self.assertIn('vista_latencia_segundos_bucket{vista="dashboard",le="+Inf"} 1', texto)
+
+    async def test_cuenta_las_consultas_de_las_vistas_async(self):
+        await Feria.objects.acreate(nombre_feria='Feria Central')
+        hilos = []
+        escribir = metricas.escribir_instantanea
+        with mock.patch.object(ClimaService, 'obtener_clima_multiple_async', return_value={}), \
+                mock.patch.object(metricas, 'escribir_instantanea',
+                                  side_effect=lambda: hilos.append(threading.get_ident()) or escribir()):
+            respuesta = await AsyncClient(headers={'Host': 'localhost'}).get(reverse('lista_ferias'))
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertGreater(metricas.registro.instantanea()['lista_ferias']['consultas'], 0)
+        # El archivo se escribe fuera del event loop
+        self.assertEqual(len(hilos), 1)
+        self.assertNotEqual(hilos[0], threading.get_ident())
+        self.assertTrue(os.path.exists(os.path.join(self.directorio, f'{os.getpid()}.json')))
+
+    def test_descarta_los_archivos_de_workers_terminados(self):
+        terminado = subprocess.Popen(['true'])
+        terminado.wait()
+        archivo = os.path.join(self.directorio, f'{terminado.pid}.json')
+        with open(archivo, 'w') as salida:
+            json.dump({'login': metricas._vista_vacia() | {'peticiones': {'2xx': 7}}}, salida)
+        self.assertNotIn('login', metricas.leer_todas())
+        self.assertFalse(os.path.exists(archivo))
+
+    def test_endpoint_solo_staff(self):
+        respuesta = Client(HTTP_HOST='localhost').get(reverse('metricas'))
+        self.assertEqual(respuesta.status_code, 403)
+
+
+class EstaticosTests(SimpleTestCase):
+    def test_minificar_css_respeta_cadenas_y_selectores(self):
+        self.assertEqual(
+            minificar_css('/* x */ a > b , .c :hover { content: "a ,  b" ; margin: 0 auto ; }\n'),
+            'a>b,.c :hover{content:"a ,  b";margin:0 auto}',
+        )
+
+    def test_collectstatic_con_hash_comprimidos_e_inmutables(self):
+        with tempfile.TemporaryDirectory() as directorio, override_settings(STATIC_ROOT=directorio):
+            # Sin los de admin y DRF: comprimirlos con brotli toma segundos
+            call_command('collectstatic', interactive=False, verbosity=0,
+                         ignore_patterns=['admin', 'rest_framework'])
+            url = static('css/base.css')
+            self.assertRegex(url, r'^/static/css/base\.[0-9a-f]{12}\.css$')
+            ruta = os.path.join(directorio, url.removeprefix('/static/'))
+            for extension in ('.gz', '.br'):
+                self.assertTrue(os.path.exists(ruta + extension))
+            with open(ruta) as archivo:
+                self.assertNotIn('\n    ', archivo.read())
+
+            respuesta = Client(HTTP_HOST='localhost').get(url, HTTP_ACCEPT_ENCODING='br, gzip')
+            self.assertEqual(respuesta['Content-Encoding'], 'br')
+            self.assertIn('immutable', respuesta['Cache-Control'])
+            self.assertLess(int(respuesta['Content-Length']), os.path.getsize(ruta))
+
+
+class GenerarDatosTests(TestCase):
+    def test_carga_las_cantidades_pedidas_con_estadisticas_al_dia(self):
+        call_command('generar_datos', ferias=2, puestos=4, productos=40, reservas=60, stdout=io.StringIO())
+        self.assertEqual(Feria.objects.count(), 2)
+        self.assertEqual(Puesto.objects.count(), 4)
+        self.assertEqual(Producto.objects.count(), 40)
+        self.assertEqual(Reserva.objects.count(), 60)
+        self.assertTrue(ReservaProducto.objects.exists())
+        for vendedor_id in Usuario.objects.filter(rol='vendedor').values_list('id_usuario', flat=True):
+            self.assertEqual(EstadisticasService.diferencias(vendedor_id), {})
+
+
+class PlanesConsultaTests(TestCase):
+    def test_consultas_de_las_vistas_no_recorren_tablas_grandes(self):
+        # Falla con CommandError si algún plan hace un escaneo secuencial
+        call_command('explicar_consultas', generar=[3, 20, 1500, 2000], filas_minimas=500,
+                     stdout=io.StringIO())
+
+
+@override_settings(CACHES=CACHES_PRUEBA)
+class ApiTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.feria = Feria.objects.create(nombre_feria='Feria Central', ciudad='Talca')
+        vendedor = Usuario.objects.create(rut='11111111-1', nombre='Vendedor', rol='vendedor',
+                                          email='v@feria.cl', contrasena='x')
+        self.cliente = Usuario.objects.create(rut='22222222-2', nombre='Cliente', rol='cliente',
+                                              email='c@feria.cl', contrasena='x')
+        self.puesto = Puesto.objects.create(id_feria=self.feria, id_usuario=vendedor, numero_puesto='7')
+        self.productos = [
+            Producto.objects.create(id_puesto=self.puesto, nombre_producto=f'Tomate {i}', stock=10)
+            for i in range(5)
+        ]
+
+    def cliente_con_sesion(self, usuario, **kwargs):
+        cliente = Client(HTTP_HOST='localhost', **kwargs)
+        sesion = cliente.session
+        sesion.update({'usuario_id': usuario.id_usuario, 'usuario_rol': usuario.rol})
+        sesion.save()
+        return cliente
+
+    def test_campos_y_paginacion_por_cursor(self):
+        Feria.objects.bulk_create([Feria(nombre_feria=f'Feria {i}') for i in range(30)])
+        respuesta = Client(HTTP_HOST='localhost').get(
+            reverse('api_ferias'), {'campos': 'id_feria,nombre_feria', 'tamano': 20}
+        )
+        datos = respuesta.json()
+        self.assertEqual(len(datos['resultados']), 20)
+        self.assertEqual(set(datos['resultados'][0]), {'id_feria', 'nombre_feria'})
+        siguiente = Client(HTTP_HOST='localhost').get(datos['siguiente']).json()
+        self.assertEqual(len(siguiente['resultados']), 11)
+        self.assertIsNone(siguiente['siguiente'])
+
+    def test_puesto_mismas_reglas_de_rol_y_mucho_menor_que_el_html(self):
+        url = reverse('api_puesto', args=[self.puesto.id_puesto])
+        self.assertEqual(Client(HTTP_HOST='localhost').get(url).status_code, 401)
+        self.assertEqual(self.cliente_con_sesion(self.puesto.id_usuario).get(url).status_code, 403)
+
+        cliente = self.cliente_con_sesion(self.cliente)
+        cliente.get(url)
+        with self.assertNumQueries(3):  # sesión, puesto con feria y vendedor, productos
+            respuesta = cliente.get(url)
+        self.assertEqual(len(respuesta.json()['productos']), 5)
+        html = cliente.get(reverse('detalle_puesto', args=[self.puesto.id_puesto]))
+        self.assertLess(len(respuesta.content) * 5, len(html.content))
+
+    def test_crear_y_cancelar_reserva_exige_csrf(self):
+        producto = self.productos[0]
+        cliente = self.cliente_con_sesion(self.cliente, enforce_csrf_checks=True)
+        datos = {'id_producto': producto.id_producto, 'cantidad': 3}
+        self.assertEqual(cliente.post(reverse('api_reservas'), datos, content_type='application/json').status_code, 403)
+
+        token = cliente.get(reverse('api_csrf')).json()['csrftoken']
+        respuesta = cliente.post(reverse('api_reservas'), datos, content_type='application/json',
+                                 HTTP_X_CSRFTOKEN=token)
+        self.assertEqual(respuesta.status_code, 201)
+        producto.refresh_from_db()
+        self.assertEqual(producto.stock, 7)
+
+        respuesta = cliente.post(reverse('api_reservas'), {'id_producto': producto.id_producto, 'cantidad': 8},
+                                 content_type='application/json', HTTP_X_CSRFTOKEN=token)
+        self.assertEqual(respuesta.status_code, 409)
+
+        id_reserva = Reserva.objects.get().id_reserva
+        respuesta = cliente.delete(reverse('api_reserva', args=[id_reserva]), HTTP_X_CSRFTOKEN=token)
+        self.assertEqual(respuesta.status_code, 204)
+        producto.refresh_from_db()
+        self.assertEqual(producto.stock, 10)
+
+
+class FeriasCercanasTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        indice_ferias.invalidar()
+        self.talca = Feria.objects.create(nombre_feria='Talca', latitud='-35.426400', longitud='-71.655400')
+        self.curico = Feria.objects.create(nombre_feria='Curicó', latitud='-34.985000', longitud='-71.239000')
+        self.santiago = Feria.objects.create(nombre_feria='Santiago', latitud='-33.450000', longitud='-70.660000')
+        Feria.objects.create(nombre_feria='Sin coordenadas', ciudad='Linares')
+
+    def test_mas_cercanas_y_dentro_del_radio(self):
+        cercanas = indice_ferias.ferias_cercanas(-35.43, -71.67, n=2)
+        self.assertEqual([id_feria for id_feria, _ in cercanas], [self.talca.id_feria, self.curico.id_feria])
+        self.assertAlmostEqual(cercanas[0][1], 1.37, places=1)
+        self.assertAlmostEqual(cercanas[1][1], 63.1, places=1)
+
+        dentro = indice_ferias.ferias_cercanas(-35.43, -71.67, radio_km=100)
+        self.assertEqual([id_feria for id_feria, _ in dentro], [self.talca.id_feria, self.curico.id_feria])
+
+        # La señal de Feria reconstruye el índice en la siguiente consulta
+        nueva = Feria.objects.create(nombre_feria='Talca Oriente', latitud='-35.430000', longitud='-71.660000')
+        self.assertEqual(indice_ferias.ferias_cercanas(-35.43, -71.67, n=1)[0][0], nueva.id_feria)
+
+    def test_api_y_lista_html_ordenan_por_distancia(self):
+        url = reverse('api_ferias_cercanas')
+        http = Client(HTTP_HOST='localhost')
+        self.assertEqual(http.get(url).status_code, 400)
+        self.assertEqual(http.get(url, {'lat': 'x', 'lon': 1}).status_code, 400)
+        datos = http.get(url, {'lat': -33.5, 'lon': -70.7, 'n': 2, 'campos': 'nombre_feria,distancia_km'}).json()
+        self.assertEqual([f['nombre_feria'] for f in datos['resultados']], ['Santiago', 'Curicó'])
+        self.assertLess(datos['resultados'][0]['distancia_km'], 10)
+
+        sesion = http.session
+        sesion.update({'usuario_id': 1, 'usuario_rol': 'cliente'})
+        sesion.save()
+        with mock.patch.object(ClimaService, 'obtener_clima_multiple_async', return_value={}):
+            respuesta = http.get(reverse('lista_ferias'), {'lat': -35.43, 'lon': -71.67, 'radio': 100})
+        self.assertEqual([f.nombre_feria for f in respuesta.context['ferias']], ['Talca', 'Curicó'])
+        self.assertContains(respuesta, '63,1 km')
+        self.assertContains(respuesta, 'name="lat" value="-35.43"')
+
+
+@override_settings(CACHES=CACHES_PRUEBA, WEATHER_GRUPO_MAXIMO=2)
+class ClimaGuardadoTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.talca = Feria.objects.create(nombre_feria='Talca', ciudad='Talca')
+        Feria.objects.create(nombre_feria='Talca Oriente', ciudad='talca ')
+        Feria.objects.create(nombre_feria='Curicó', ciudad='Curicó')
+        Feria.objects.create(nombre_feria='Linares', ciudad='Linares')
+        self.llamadas = []
+
+    def api(self, params, url=None):
+        """OpenWeatherMap simulado: ID 1, 2, 3... por ciudad en orden de consulta"""
+        self.llamadas.append((url, params.get('id') or params.get('q')))
+        if url == settings.WEATHER_GROUP_URL:
+            return {'list': [dict(RESPUESTA_CLIMA, id=int(i), name=f'Ciudad {i}') for i in params['id'].split(',')]}
+        if url == settings.WEATHER_FORECAST_URL:
+            ahora = int(time.time())
+            return {'list': [
+                dict(RESPUESTA_CLIMA, dt=ahora + 3600 * 3 * i, pop=i / 10, main=dict(RESPUESTA_CLIMA['main'], temp=10 + i))
+                for i in range(1, 9)
+            ]}
+        return dict(RESPUESTA_CLIMA, id=len(self.llamadas), name=params['q'].split(',')[0])
+
+    def test_resuelve_una_vez_y_agrupa_las_ciudades(self):
+        with mock.patch.object(ClimaService, '_llamar_api', side_effect=self.api):
+            call_command('actualizar_clima', stdout=io.StringIO())
+            self.assertEqual(len(self.llamadas), 3 + 2 + 3)  # /weather, /group de a 2, /forecast
+            self.assertEqual([ids for url, ids in self.llamadas if url == settings.WEATHER_GROUP_URL], ['1,2', '3'])
+
+            self.llamadas.clear()
+            call_command('actualizar_clima', '--sin-pronostico', stdout=io.StringIO())
+            self.assertEqual([url for url, _ in self.llamadas], [settings.WEATHER_GROUP_URL] * 2)
+
+        self.talca.refresh_from_db()
+        self.assertEqual(Feria.objects.filter(id_ciudad_clima=self.talca.id_ciudad_clima_id).count(), 2)
+        self.assertEqual(ClimaSnapshot.objects.get(pk=self.talca.id_ciudad_clima_id).clima['temperatura'], 21.3)
+        self.assertEqual(ClimaPronostico.objects.filter(id_ciudad=self.talca.id_ciudad_clima_id).count(), 8)
+
+        # Al cambiar de lugar la ciudad se vuelve a resolver
+        self.talca.ciudad = 'Molina'
+        self.talca.save()
+        self.assertIsNone(Feria.objects.get(pk=self.talca.pk).id_ciudad_clima_id)
+
+    def test_vistas_leen_el_clima_guardado_sin_llamar_a_la_api(self):
+        with mock.patch.object(ClimaService, '_llamar_api', side_effect=self.api):
+            call_command('actualizar_clima', stdout=io.StringIO())
+
+        http = Client(HTTP_HOST='localhost')
+        sesion = http.session
+        sesion.update({'usuario_id': 1, 'usuario_rol': 'cliente'})
+        sesion.save()
+        with mock.patch.object(ClimaService, '_llamar_api', side_effect=AssertionError), \
+                mock.patch.object(ClimaService, '_llamar_api_async', side_effect=AssertionError):
+            respuesta = http.get(reverse('detalle_feria', args=[self.talca.id_feria]))
+            self.assertContains(respuesta, '21,3°C')
+            self.assertContains(respuesta, 'Pronóstico')
+            self.assertGreaterEqual(respuesta.context['pronostico'][0]['maxima'], 11)
+
+            respuesta = http.get(reverse('lista_ferias'))
+            self.assertEqual(len([f for f in respuesta.context['ferias'] if f.clima]), 4)
+            datos = http.get(reverse('api_ferias'), {'campos': 'nombre_feria,clima'}).json()
+            self.assertTrue(all(f['clima']['temperatura'] == 21.3 for f in datos['resultados']))
+
+        # Un clima guardado demasiado viejo no se muestra: se usa ClimaService
+        ClimaSnapshot.objects.update(actualizado=timezone.now() - timedelta(days=1))
+        with mock.patch.object(ClimaService, 'obtener_clima_multiple', return_value={}) as en_vivo:
+            datos = http.get(reverse('api_ferias'), {'campos': 'clima'}).json()
+        self.assertEqual(en_vivo.call_count, 1)
+        self.assertTrue(all(f['clima'] is None for f in datos['resultados']))
+
+
+class PaginacionKeysetTests(TestCase):
+    def setUp(self):
+        cliente = Usuario.objects.create(rut='22222222-2', nombre='Cliente', rol='cliente',
+                                         email='c@feria.cl', contrasena='x')
+        Reserva.objects.bulk_create([Reserva(id_usuario=cliente, cantidad=i + 1) for i in range(7)])
+        self.factory = RequestFactory()
+
+    def pagina(self, **params):
+        request = self.factory.get('/', params)
+        return paginar_keyset(request, Reserva.objects.all(), ['-fecha_reserva', '-id_reserva'], tamano=3)
+
+    def test_recorre_todas_las_filas_sin_repetir_y_vuelve_atras(self):
+        vistos = []
+        pagina = self.pagina()
+        self.assertFalse(pagina.hay_anterior)
+        paginas = [pagina]
+        while True:
+            vistos += [r.id_reserva for r in pagina]
+            if not pagina.cursor_siguiente:
+                break
+            pagina = self.pagina(despues=pagina.cursor_siguiente)
+            paginas.append(pagina)
+
+        esperado = list(Reserva.objects.order_by('-fecha_reserva', '-id_reserva')
+                        .values_list('id_reserva', flat=True))
+        self.assertEqual(vistos, esperado)
+        self.assertEqual([len(p) for p in paginas], [3, 3, 1])
+
+        anterior = self.pagina(antes=paginas[-1].cursor_anterior)
+        self.assertEqual([r.id_reserva for r in anterior], [r.id_reserva for r in paginas[1]])
+        self.assertTrue(anterior.hay_anterior)
+
+    def test_cursor_invalido_muestra_la_primera_pagina(self):
+        self.assertEqual(len(self.pagina(despues='no-es-un-cursor')), 3)
+
+    def test_cursor_con_tipos_alterados_muestra_la_primera_pagina(self):
+        for valores in (['x', 1], ['2026-01-01T00:00:00+00:00', 'abc'], [{'a': 1}, 1],
+                        [None, 1], ['2026-01-01T00:00:00+00:00', 10 ** 30]):
+            with self.subTest(valores=valores):
+                pagina = self.pagina(antes=_codificar_cursor(valores))
+                self.assertEqual(len(pagina), 3)
+                self.assertFalse(pagina.hay_anterior)
+
+        http = Client(HTTP_HOST='localhost')
+        respuesta = http.get(reverse('api_ferias'), {'despues': _codificar_cursor(['abc'])})
+        self.assertEqual(respuesta.status_code, 200)
+
+
+class BusquedaProductosTests(TestCase):
+    def setUp(self):
+        vendedor = Usuario.objects.create(rut='11111111-1', nombre='Vendedor', rol='vendedor',
+                                          email='v@feria.cl', contrasena='x')
+        self.feria = Feria.objects.create(nombre_feria='Feria Ñuñoa')
+        puesto = Puesto.objects.create(id_feria=self.feria, id_usuario=vendedor)
+        self.frutas = Categoria.objects.create(nombre='Frutas')
+        self.platano = Producto.objects.create(id_puesto=puesto, id_categoria=self.frutas,
+                                               nombre_producto='Plátano', stock=5)
+        self.limon = Producto.objects.create(id_puesto=puesto, nombre_producto='Limón', stock=5)
+
+    def buscar(self, query):
+        return [p.id_producto for p in BusquedaService.buscar(query)]
+
+    def test_normaliza_tildes(self):
+        self.assertEqual(normalizar_texto('  Plátano ÑUBLE!'), 'platano nuble')
+
+    def test_busca_sin_tildes_por_prefijo_categoria_y_feria(self):
+        self.assertEqual(self.buscar('platano'), [self.platano.id_producto])
+        self.assertEqual(self.buscar('LIMÓN'), [self.limon.id_producto])
+        self.assertEqual(self.buscar('plat'), [self.platano.id_producto])
+        self.assertEqual(self.buscar('frutas'), [self.platano.id_producto])
+        self.assertCountEqual(self.buscar('nunoa'), [self.platano.id_producto, self.limon.id_producto])
+
+    def test_indice_se_mantiene_al_editar_y_borrar(self):
+        self.frutas.nombre = 'Tropicales'
+        self.frutas.save()
+        self.assertEqual(self.buscar('tropicales'), [self.platano.id_producto])
+        self.assertEqual(self.buscar('frutas'), [])
+
+        self.platano.delete()
+        self.assertEqual(self.buscar('platano'), [])
+
+    def test_reindexa_solo_si_cambia_el_texto_indexado(self):
+        feria = Feria.objects.get(id_feria=self.feria.id_feria)
+        puesto = Puesto.objects.get(id_feria=feria)
+        with mock.patch.object(BusquedaService, 'indexar') as indexar:
+            feria.aglomeracion = 40
+            feria.save()
+            puesto.numero_puesto = '3'
+            puesto.save()
+            self.assertFalse(indexar.called)
+
+        feria.nombre_feria = 'Feria Macul'
+        feria.save()
+        self.assertEqual(len(self.buscar('macul')), 2)
+        puesto.id_feria = Feria.objects.create(nombre_feria='Feria Pirque')
+        puesto.save()
+        self.assertEqual(len(self.buscar('pirque')), 2)
@@ -12,11 +12,19 @@ urlpatterns = [
     path('puestos/', views.lista_puestos_view, name='lista_puestos'),
     path('puesto/<int:id_puesto>/', views.detalle_puesto_view, name='detalle_puesto'),
     path('crear-reserva/', views.crear_reserva_view, name='crear_reserva'),
+    path('puesto/<int:id_puesto>/stock/eventos/', views.eventos_stock_view, name='eventos_stock'),
+    path('puesto/<int:id_puesto>/carrito/', views.checkout_carrito_view, name='checkout_carrito'),
+    path('mis-reservas-cliente/', views.mis_reservas_cliente_view, name='mis_reservas_cliente'),
+    path('reserva/<int:id_reserva>/cancelar/', views.cancelar_reserva_view, name='cancelar_reserva'),
     
     # Vendedor
     path('mi-puesto/', views.mi_puesto_view, name='mi_puesto'),
     path('agregar-producto/', views.agregar_producto_view, name='agregar_producto'),
+    path('importar-productos/', views.importar_productos_view, name='importar_productos'),
     path('mis-reservas/', views.mis_reservas_view, name='mis_reservas'),
+    path('mis-reservas/exportar/', views.exportar_reservas_view, name='exportar_reservas'),
+    path('mis-reservas/<int:id_reserva>/procesar/', views.actualizar_estado_reserva_view, name='procesar_reserva'),
     path('ferias/', views.lista_ferias, name='lista_ferias'),
     path('feria/<int:feria_id>/', views.detalle_feria, name='detalle_feria'),
+    path('metricas/', views.metricas_view, name='metricas'),
 ]
\ No newline at end of file
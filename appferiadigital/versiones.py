@@ -0,0 +1,173 @@
+"""
+Versiones de ferias y puestos para responder GET condicionales.
+
+Feria y Puesto tienen un contador `version` y la fecha `modificado`, que se
+actualizan con un UPDATE cada vez que cambia algo que se muestra en su página:
+
+- Puesto: el propio puesto, sus productos (también el stock que mueven las
+  reservas), el nombre o la ubicación de su feria, los datos de su vendedor
+  o el nombre de sus categorías.
+- Feria: la propia feria, sus puestos y los datos de sus vendedores.
+
+Las mismas versiones forman la clave de los fragmentos de plantilla en caché
+(templatetags/fragmentos.py).
+
+Las escrituras con save()/delete() se marcan en signals.py; ReservaService
+marca los puestos cuyo stock cambia con UPDATE, después del COMMIT.
+
+Una baja no deja fila con `modificado`: en las listas cambia el total (y así
+el ETag) y, para Last-Modified, se guarda en caché la fecha de la última baja
+de puestos o de ferias (marcar_baja, desde signals.py).
+
+Las vistas decoradas con `pagina_condicional` calculan el ETag y el
+Last-Modified con una consulta pequeña y responden 304 sin ejecutar sus
+consultas principales ni renderizar la plantilla.
+"""
+import zlib
+from datetime import datetime, timedelta, timezone as dt_timezone
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.contrib import messages
+from django.core.cache import cache
+from django.db.models import Count, F, Max
+from django.utils import timezone
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition
+from django.views.decorators.vary import vary_on_cookie
+
+from .clima_guardado import snapshot_vigente
+from .clima_service import ClimaService
+from .models import Feria, Puesto
+
+
+def tocar_puestos(filtro):
+    Puesto.objects.filter(filtro).update(version=F('version') + 1, modificado=timezone.now())
+
+
+def tocar_ferias(filtro):
+    Feria.objects.filter(filtro).update(version=F('version') + 1, modificado=timezone.now())
+
+
+def marcar_baja(tabla):
+    """`tabla`: 'puestos' o 'ferias'"""
+    cache.set(f'versiones_baja_{tabla}', timezone.now(), None)
+
+
+def _con_bajas(modificado, tabla):
+    baja = cache.get(f'versiones_baja_{tabla}')
+    return max(modificado, baja) if modificado and baja else modificado or baja
+
+
+# ---------- Versión de cada página: (etiqueta, modificado) o None ----------
+
+# Lo que se lee de una feria: su versión, su lugar y cuándo se guardó su clima
+CAMPOS_VERSION = (
+    'id_feria', 'version', 'modificado', 'ciudad', 'latitud', 'longitud',
+    'id_ciudad_clima', 'id_ciudad_clima__actualizado',
+)
+
+
+def _ferias_version():
+    return Feria.objects.select_related('id_ciudad_clima').only(*CAMPOS_VERSION)
+
+
+def _con_clima(etiqueta, modificado, ferias):
+    """El clima se renueva aparte: la página cambia también cuando se guarda uno nuevo"""
+    guardados = [f.id_ciudad_clima.actualizado.timestamp() for f in ferias if f.id_ciudad_clima]
+    en_cache = [f.lugar_clima for f in ferias if not snapshot_vigente(f.id_ciudad_clima)]
+    marca = max([ClimaService.marca_clima(en_cache), *guardados])
+    if not marca:
+        return etiqueta, modificado
+    guardado = datetime.fromtimestamp(marca, tz=dt_timezone.utc)
+    return f'{etiqueta}-c{int(marca)}', max(modificado, guardado) if modificado else guardado
+
+
+def version_puesto(request, id_puesto):
+    fila = Puesto.objects.filter(id_puesto=id_puesto).values_list('version', 'modificado').first()
+    if fila is None:
+        return None
+    version, modificado = fila
+    return f'puesto-{id_puesto}-v{version}', modificado
+
+
+def version_lista_puestos(request):
+    # Las altas y cambios suben el máximo; las bajas cambian el total
+    datos = Puesto.objects.aggregate(total=Count('id_puesto'), modificado=Max('modificado'))
+    modificado = datos['modificado']
+    marca = int(modificado.timestamp() * 1_000_000) if modificado else 0
+    return f'puestos-{datos["total"]}-{marca}', _con_bajas(modificado, 'puestos')
+
+
+def version_feria(request, feria_id):
+    feria = _ferias_version().filter(id_feria=feria_id).first()
+    if feria is None:
+        return None
+    return _con_clima(f'feria-{feria_id}-v{feria.version}', feria.modificado, [feria])
+
+
+def version_lista_ferias(request):
+    # Se listan todas las ferias (tabla pequeña): una consulta con lo necesario
+    ferias = list(_ferias_version())
+    suma = zlib.crc32(repr([(f.id_feria, f.version) for f in ferias]).encode())
+    modificado = _con_bajas(max((f.modificado for f in ferias), default=None), 'ferias')
+    return _con_clima(f'ferias-{len(ferias)}-{suma:x}', modificado, ferias)
+
+
+# ---------- Decorador ----------
+
+def _huella_sesion(request):
+    """
+    La plantilla base muestra el usuario de la sesión y los formularios llevan
+    el token CSRF: otra sesión en el mismo navegador no reutiliza la copia.
+    """
+    sesion = request.session
+    datos = '|'.join(str(v) for v in (
+        sesion.get('usuario_id'), sesion.get('usuario_rol'), sesion.get('usuario_nombre'),
+        request.COOKIES.get(settings.CSRF_COOKIE_NAME),
+    ))
+    return f'{zlib.crc32(datos.encode()):x}'
+
+
+def pagina_condicional(version):
+    """
+    Responde 304 a If-None-Match / If-Modified-Since según
+    `version(request, *args, **kwargs)`. Si hay mensajes pendientes la página
+    se renderiza siempre, para que el usuario los vea.
+    """
+    def _calcular(request, *args, **kwargs):
+        # condition() pide el ETag y el Last-Modified por separado
+        if not hasattr(request, '_version_pagina'):
+            datos = None if len(messages.get_messages(request)) else version(request, *args, **kwargs)
+            if datos is None:
+                request._version_pagina = (None, None)
+            else:
+                etiqueta, modificado = datos
+                # Last-Modified tiene resolución de segundos: si el último cambio es de
+                # este mismo segundo, otro cambio en ese segundo no se notaría
+                if modificado is not None and timezone.now() - modificado < timedelta(seconds=1):
+                    modificado = None
+                request._version_pagina = (f'{etiqueta}-{_huella_sesion(request)}', modificado)
+        return request._version_pagina
+
+    def etag(request, *args, **kwargs):
+        return _calcular(request, *args, **kwargs)[0]
+
+    def ultima_modificacion(request, *args, **kwargs):
+        return _calcular(request, *args, **kwargs)[1]
+
+    def decorador(vista):
+        condicional = condition(etag_func=etag, last_modified_func=ultima_modificacion)(vista)
+        if iscoroutinefunction(vista):
+            sin_consultas = condicional
+
+            @wraps(vista)
+            async def condicional(request, *args, **kwargs):
+                # Sesión, mensajes y versión consultan la BD: fuera del event loop
+                await sync_to_async(_calcular)(request, *args, **kwargs)
+                return await sin_consultas(request, *args, **kwargs)
+
+        # El navegador guarda la copia pero la revalida en cada visita
+        return cache_control(private=True, no_cache=True)(vary_on_cookie(condicional))
+    return decorador
@@ -1,5 +1,8 @@
 # appferiadigital/views.py
-from django.shortcuts import render, redirect, get_object_or_404
+from asgiref.sync import sync_to_async
+from django.shortcuts import render, redirect, get_object_or_404, aget_object_or_404
+from django.core.handlers.asgi import ASGIRequest
+from django.http import Http404, HttpResponse, HttpResponseForbidden, StreamingHttpResponse
 from django.contrib import messages
 from django.contrib.auth.hashers import make_password, check_password
 from django.db.models import Q
@@ -7,9 +10,24 @@ from django.conf import settings
 from datetime import datetime,  timedelta
 from django.db.models import Q, Sum, Count
 from django.views.decorators.csrf import csrf_protect
-from .models import Usuario, Puesto, Producto, Reserva, Feria, Categoria
+from .models import Usuario, Puesto, Producto, Reserva, ReservaArchivada, Feria, Categoria
 import re
-from .clima_service import ClimaService
+from .clima_guardado import clima_de_feria_async, climas_de_ferias_async, pronostico_por_dia
+from .clima_service import circuito_clima
+from .reserva_service import MAX_LINEAS_CARRITO, ReservaService
+from .paginacion import apaginar_keyset, paginar_keyset
+from .busqueda_service import BusquedaService
+from .estadisticas_service import EstadisticasService
+from .eventos_stock import eventos_stock
+from .exportacion_service import FORMATOS, ExportacionService
+from .importacion_service import ArchivoInvalidoError, ImportacionService
+from .indice_ferias import ferias_cercanas, leer_coordenadas
+from .autenticacion import requiere_login, requiere_rol
+from .metricas import exportar_prometheus, leer_todas
+from . import limite_login
+from .versiones import (
+    pagina_condicional, version_feria, version_lista_ferias, version_lista_puestos, version_puesto,
+)
 
 
 def validar_rut(rut):
@@ -35,18 +53,23 @@ def login_view(request):
             messages.error(request, 'Debe ingresar email y contraseña')
             return render(request, 'login.html')
         
-        try:
-            usuario = Usuario.objects.get(email=email)
-            if check_password(contrasena, usuario.contrasena):
-                request.session['usuario_id'] = usuario.id_usuario
-                request.session['usuario_rol'] = usuario.rol
-                request.session['usuario_nombre'] = usuario.nombre
-                messages.success(request, f'Bienvenido {usuario.nombre}')
-                return redirect('dashboard')
-            else:
-                messages.error(request, 'Credenciales incorrectas')
-        except Usuario.DoesNotExist:
-            messages.error(request, 'Credenciales incorrectas')
+        # Antes de calcular el hash de la contraseña
+        ip = limite_login.ip_cliente(request)
+        espera = limite_login.consumir(ip, email)
+        if espera:
+            messages.error(request, f'Demasiados intentos. Intente nuevamente en {espera} segundos')
+            response = render(request, 'login.html', status=429)
+            response['Retry-After'] = str(espera)
+            return response
+
+        usuario = limite_login.autenticar(ip, email, contrasena)
+        if usuario is not None:
+            request.session['usuario_id'] = usuario.id_usuario
+            request.session['usuario_rol'] = usuario.rol
+            request.session['usuario_nombre'] = usuario.nombre
+            messages.success(request, f'Bienvenido {usuario.nombre}')
+            return redirect('dashboard')
+        messages.error(request, 'Credenciales incorrectas')
     
     return render(request, 'login.html')
 
@@ -106,48 +129,54 @@ def logout_view(request):
     messages.success(request, 'Sesión cerrada exitosamente')
     return redirect('login')
 
+@requiere_login
 def dashboard_view(request):
-    if not request.session.get('usuario_id'):
-        return redirect('login')
-    
     usuario_rol = request.session.get('usuario_rol')
     context = {'rol': usuario_rol}
     return render(request, 'dashboard.html', context)
 
 # VISTAS CLIENTE
+@requiere_rol('cliente')
+@pagina_condicional(version_lista_puestos)
 def lista_puestos_view(request):
-    if not request.session.get('usuario_id'):
-        return redirect('login')
-    
-    if request.session.get('usuario_rol') != 'cliente':
-        messages.error(request, 'Acceso denegado')
-        return redirect('dashboard')
-    
-    puestos = Puesto.objects.select_related('id_feria', 'id_usuario').all()
-    context = {'puestos': puestos}
+    pagina = paginar_keyset(
+        request, Puesto.objects.select_related('id_feria', 'id_usuario'), ['id_puesto']
+    )
+    context = {'puestos': pagina, 'pagina': pagina}
     return render(request, 'lista_puestos.html', context)
 
+@requiere_rol('cliente')
+@pagina_condicional(version_puesto)
 def detalle_puesto_view(request, id_puesto):
-    if not request.session.get('usuario_id'):
-        return redirect('login')
-    
-    if request.session.get('usuario_rol') != 'cliente':
-        messages.error(request, 'Acceso denegado')
-        return redirect('dashboard')
-    
     puesto = get_object_or_404(Puesto, id_puesto=id_puesto)
     productos = Producto.objects.filter(id_puesto=puesto).select_related('id_categoria')
-    context = {'puesto': puesto, 'productos': productos}
+    # El stock en vivo necesita ASGI (ver eventos_stock_view)
+    context = {'puesto': puesto, 'productos': productos, 'stock_en_vivo': isinstance(request, ASGIRequest)}
     return render(request, 'detalle_puesto.html', context)
 
+@requiere_rol('cliente')
+async def eventos_stock_view(request, id_puesto):
+    """Stock del puesto en vivo (Server-Sent Events) para detalle_puesto"""
+    if not isinstance(request, ASGIRequest):
+        # Con WSGI Django acumula toda la respuesta y ocuparía un worker por
+        # STOCK_EVENTOS_DURACION sin enviar nada; 204 hace que EventSource no reintente
+        return HttpResponse(status=204)
+    if not await Puesto.objects.filter(id_puesto=id_puesto).aexists():
+        raise Http404('Puesto no encontrado')
+    # Al reconectarse el navegador envía la versión del último evento recibido
+    version = request.headers.get('Last-Event-ID') or request.GET.get('version')
+    try:
+        version = int(version)
+    except (TypeError, ValueError):
+        version = None
+
+    respuesta = StreamingHttpResponse(eventos_stock(id_puesto, version), content_type='text/event-stream')
+    respuesta['Cache-Control'] = 'no-cache'
+    respuesta['X-Accel-Buffering'] = 'no'  # nginx: enviar cada evento sin acumular
+    return respuesta
+
+@requiere_rol('cliente')
 def crear_reserva_view(request):
-    if not request.session.get('usuario_id'):
-        return redirect('login')
-    
-    if request.session.get('usuario_rol') != 'cliente':
-        messages.error(request, 'Acceso denegado')
-        return redirect('dashboard')
-    
     if request.method == 'POST':
         producto_id = request.POST.get('producto_id')
         cantidad = request.POST.get('cantidad')
@@ -160,38 +189,72 @@ def crear_reserva_view(request):
             messages.error(request, 'Cantidad inválida')
             return redirect('lista_puestos')
         
-        producto = get_object_or_404(Producto, id_producto=producto_id)
-        
-        if cantidad > producto.stock:
-            messages.error(request, 'Stock insuficiente')
-            return redirect('detalle_puesto', id_puesto=producto.id_puesto.id_puesto)
-        
-        usuario = Usuario.objects.get(id_usuario=request.session.get('usuario_id'))
+        id_puesto = Producto.objects.filter(
+            id_producto=producto_id
+        ).values_list('id_puesto_id', flat=True).first()
+        if id_puesto is None:
+            raise Http404('Producto no encontrado')
         
-        Reserva.objects.create(
-            id_usuario=usuario,
-            id_producto=producto,
-            cantidad=cantidad
+        # Descuento de stock condicional y atómico (sin leer el stock antes)
+        reserva = ReservaService.reservar(
+            request.session.get('usuario_id'), producto_id, cantidad
         )
         
-        producto.stock -= cantidad
-        producto.save()
+        if reserva is None:
+            messages.error(request, 'Stock insuficiente')
+            return redirect('detalle_puesto', id_puesto=id_puesto)
         
         messages.success(request, 'Reserva creada exitosamente')
-        return redirect('detalle_puesto', id_puesto=producto.id_puesto.id_puesto)
+        return redirect('detalle_puesto', id_puesto=id_puesto)
     
     return redirect('lista_puestos')
 
-# VISTAS VENDEDOR
-def mi_puesto_view(request):
-    if not request.session.get('usuario_id'):
-        return redirect('login')
+@requiere_rol('cliente')
+def checkout_carrito_view(request, id_puesto):
+    """Reservar varios productos de un puesto en una sola operación"""
+    if request.method != 'POST':
+        return redirect('detalle_puesto', id_puesto=id_puesto)
+    
+    productos_ids = request.POST.getlist('producto_id')
+    cantidades = request.POST.getlist('cantidad')
+    unidades = request.POST.getlist('unidad_de_medida')
+    unidades += [''] * (len(productos_ids) - len(unidades))
+    
+    lineas = []
+    try:
+        for producto_id, cantidad, unidad in zip(productos_ids, cantidades, unidades):
+            producto_id, cantidad = int(producto_id), int(cantidad or 0)
+            if cantidad < 0:
+                raise ValueError
+            if cantidad:
+                lineas.append((producto_id, cantidad, unidad.strip()[:50]))
+    except (ValueError, TypeError):
+        messages.error(request, 'Cantidad inválida')
+        return redirect('detalle_puesto', id_puesto=id_puesto)
+    
+    if not lineas:
+        messages.error(request, 'El carrito está vacío')
+        return redirect('detalle_puesto', id_puesto=id_puesto)
+    
+    if len(lineas) > MAX_LINEAS_CARRITO:
+        messages.error(request, f'El carrito admite hasta {MAX_LINEAS_CARRITO} productos')
+        return redirect('detalle_puesto', id_puesto=id_puesto)
+    
+    reserva = ReservaService.reservar_carrito(
+        request.session.get('usuario_id'), id_puesto, lineas
+    )
     
-    if request.session.get('usuario_rol') != 'vendedor':
-        messages.error(request, 'Acceso denegado')
-        return redirect('dashboard')
+    if reserva is None:
+        messages.error(request, 'Stock insuficiente para uno o más productos')
+        return redirect('detalle_puesto', id_puesto=id_puesto)
     
-    usuario = Usuario.objects.get(id_usuario=request.session.get('usuario_id'))
+    messages.success(request, f'Reserva creada con {len(lineas)} productos')
+    return redirect('detalle_puesto', id_puesto=id_puesto)
+
+# VISTAS VENDEDOR
+@requiere_rol('vendedor')
+def mi_puesto_view(request):
+    usuario = request.usuario
     
     if request.method == 'POST':
         feria_id = request.POST.get('feria_id')
@@ -214,15 +277,9 @@ def mi_puesto_view(request):
     context = {'puestos': puestos, 'ferias': ferias}
     return render(request, 'mi_puesto.html', context)
 
+@requiere_rol('vendedor')
 def agregar_producto_view(request):
-    if not request.session.get('usuario_id'):
-        return redirect('login')
-    
-    if request.session.get('usuario_rol') != 'vendedor':
-        messages.error(request, 'Acceso denegado')
-        return redirect('dashboard')
-    
-    usuario = Usuario.objects.get(id_usuario=request.session.get('usuario_id'))
+    usuario = request.usuario
     puestos = Puesto.objects.filter(id_usuario=usuario)
     
     if not puestos.exists():
@@ -266,72 +323,114 @@ def agregar_producto_view(request):
     context = {'puestos': puestos, 'categorias': categorias}
     return render(request, 'agregar_producto.html', context)
 
+@requiere_rol('vendedor')
+def importar_productos_view(request):
+    """Carga o actualización de muchos productos desde un CSV o XLSX"""
+    resultado = None
+    if request.method == 'POST':
+        archivo = request.FILES.get('archivo')
+        if archivo is None:
+            messages.error(request, 'Seleccione un archivo')
+            return redirect('importar_productos')
+        if archivo.size > settings.IMPORTACION_TAMANO_MAXIMO:
+            messages.error(request, 'El archivo es demasiado grande')
+            return redirect('importar_productos')
+        try:
+            resultado = ImportacionService.importar(
+                request.session.get('usuario_id'), ImportacionService.leer_filas(archivo, archivo.name)
+            )
+        except ArchivoInvalidoError as e:
+            messages.error(request, str(e))
+            return redirect('importar_productos')
+
+    context = {'resultado': resultado}
+    return render(request, 'importar_productos.html', context)
+
+@requiere_rol('vendedor')
 def mis_reservas_view(request):
-    if not request.session.get('usuario_id'):
-        return redirect('login')
-    
-    if request.session.get('usuario_rol') != 'vendedor':
-        messages.error(request, 'Acceso denegado')
-        return redirect('dashboard')
-    
-    usuario = Usuario.objects.get(id_usuario=request.session.get('usuario_id'))
+    usuario = request.usuario
     puestos = Puesto.objects.filter(id_usuario=usuario)
     productos = Producto.objects.filter(id_puesto__in=puestos)
-    reservas = Reserva.objects.filter(id_producto__in=productos).select_related('id_usuario', 'id_producto')
+    # Las reservas archivadas (antiguas) se leen solo si se piden
+    archivo = request.GET.get('archivo') == '1'
+    modelo = ReservaArchivada if archivo else Reserva
+    reservas = modelo.objects.filter(
+        Q(id_producto__in=productos) | Q(reservaproducto__id_producto__in=productos)
+    ).distinct().select_related('id_usuario', 'id_producto').prefetch_related(
+        'reservaproducto_set__id_producto'
+    )
+    pagina = paginar_keyset(request, reservas, ['-fecha_reserva', '-id_reserva'])
     
-    context = {'reservas': reservas}
+    context = {'reservas': pagina, 'pagina': pagina, 'puestos': puestos, 'archivo': archivo}
     return render(request, 'mis_reservas.html', context)
 
+@requiere_rol('vendedor')
+def exportar_reservas_view(request):
+    """Reservas de los productos del vendedor en CSV o JSON Lines, sin cargarlas en memoria"""
+    formato = request.GET.get('formato', 'csv')
+    if formato not in FORMATOS:
+        messages.error(request, 'Formato inválido')
+        return redirect('mis_reservas')
+    try:
+        desde, hasta = (
+            datetime.strptime(request.GET[campo], '%Y-%m-%d').date() if request.GET.get(campo) else None
+            for campo in ('desde', 'hasta')
+        )
+        id_puesto = int(request.GET['puesto']) if request.GET.get('puesto') else None
+    except ValueError:
+        messages.error(request, 'Filtros inválidos')
+        return redirect('mis_reservas')
+
+    filas = ExportacionService.reservas_vendedor(
+        request.session.get('usuario_id'), desde, hasta, id_puesto,
+        archivadas=request.GET.get('archivadas') == '1',
+    )
+    tipo, extension = FORMATOS[formato]
+    if isinstance(request, ASGIRequest):
+        bloques = ExportacionService.bloques_async(filas, formato)
+    else:
+        bloques = ExportacionService.bloques(filas, formato)
+    respuesta = StreamingHttpResponse(bloques, content_type=tipo)
+    respuesta['Content-Disposition'] = (
+        f'attachment; filename="reservas_{datetime.now():%Y%m%d}.{extension}"'
+    )
+    return respuesta
+
+@requiere_rol('cliente')
 def mis_reservas_cliente_view(request):
     """Ver todas las reservas del cliente"""
-    if not request.session.get('usuario_id'):
-        return redirect('login')
-    
-    if request.session.get('usuario_rol') != 'cliente':
-        messages.error(request, 'Acceso denegado')
-        return redirect('dashboard')
-    
-    usuario = Usuario.objects.get(id_usuario=request.session.get('usuario_id'))
-    reservas = Reserva.objects.filter(id_usuario=usuario).select_related(
+    usuario = request.usuario
+    archivo = request.GET.get('archivo') == '1'
+    modelo = ReservaArchivada if archivo else Reserva
+    reservas = modelo.objects.filter(id_usuario=usuario).select_related(
         'id_producto__id_puesto__id_feria'
-    ).order_by('-fecha_reserva')
+    ).prefetch_related(
+        'reservaproducto_set__id_producto__id_puesto__id_feria'
+    )
+    pagina = paginar_keyset(request, reservas, ['-fecha_reserva', '-id_reserva'])
     
-    context = {'reservas': reservas}
+    context = {'reservas': pagina, 'pagina': pagina, 'archivo': archivo}
     return render(request, 'mis_reservas_cliente.html', context)
 
 
+@requiere_rol('cliente')
 def cancelar_reserva_view(request, id_reserva):
     """Cancelar una reserva y devolver stock"""
-    if not request.session.get('usuario_id'):
-        return redirect('login')
-    
-    if request.session.get('usuario_rol') != 'cliente':
-        messages.error(request, 'Acceso denegado')
-        return redirect('dashboard')
-    
-    usuario = Usuario.objects.get(id_usuario=request.session.get('usuario_id'))
-    reserva = get_object_or_404(Reserva, id_reserva=id_reserva, id_usuario=usuario)
-    
-    # Devolver stock
-    if reserva.id_producto:
-        producto = reserva.id_producto
-        producto.stock += reserva.cantidad
-        producto.save()
+    reserva = get_object_or_404(
+        Reserva, id_reserva=id_reserva, id_usuario_id=request.session.get('usuario_id')
+    )
     
-    reserva.delete()
-    messages.success(request, 'Reserva cancelada exitosamente')
+    # Marcarla cancelada y devolver stock en la misma transacción
+    if ReservaService.cancelar(reserva):
+        messages.success(request, 'Reserva cancelada exitosamente')
+    else:
+        messages.error(request, 'La reserva ya no está pendiente')
     return redirect('mis_reservas_cliente')
 
 
+@requiere_rol('cliente')
 def buscar_productos_view(request):
     """Buscar productos por nombre o categoría"""
-    if not request.session.get('usuario_id'):
-        return redirect('login')
-    
-    if request.session.get('usuario_rol') != 'cliente':
-        messages.error(request, 'Acceso denegado')
-        return redirect('dashboard')
-    
     query = request.GET.get('q', '').strip()
     categoria_id = request.GET.get('categoria')
     
@@ -339,15 +438,21 @@ def buscar_productos_view(request):
         'id_puesto__id_feria', 'id_categoria'
     ).filter(stock__gt=0)
     
-    if query:
-        productos = productos.filter(nombre_producto__icontains=query)
-    
     if categoria_id:
         productos = productos.filter(id_categoria_id=categoria_id)
     
+    if query:
+        # Resultados ordenados por relevancia (índice sin tildes)
+        productos = BusquedaService.buscar(query, productos, limite=settings.BUSQUEDA_MAX_RESULTADOS)
+        pagina = None
+    else:
+        pagina = paginar_keyset(request, productos, ['id_producto'])
+        productos = pagina
+    
     categorias = Categoria.objects.all()
     context = {
         'productos': productos,
+        'pagina': pagina,
         'categorias': categorias,
         'query': query,
         'categoria_seleccionada': categoria_id
@@ -355,48 +460,80 @@ def buscar_productos_view(request):
     return render(request, 'buscar_productos.html', context)
 
 
-def lista_ferias(request):
-    """Lista de ferias con clima"""
-    ferias = Feria.objects.all()
-    
-    # Agregar clima a cada feria
+# Vistas async: la espera de OpenWeatherMap no ocupa un worker con ASGI.
+# La plantilla se renderiza en un hilo porque lee la sesión y la caché de
+# fragmentos, que usan la base de datos.
+
+@pagina_condicional(version_lista_ferias)
+async def lista_ferias(request):
+    """Lista de ferias con clima; con ?lat=&lon= (y ?radio= en km), las más cercanas primero"""
+    error_ubicacion = None
+    try:
+        cerca = leer_coordenadas(request.GET)
+    except ValueError as e:
+        cerca, error_ubicacion = None, str(e)
+
+    con_clima = Feria.objects.select_related('id_ciudad_clima')
+    if cerca:
+        lat, lon, radio = cerca
+        distancias = dict(await sync_to_async(ferias_cercanas)(lat, lon, radio_km=radio))
+        ferias = [feria async for feria in con_clima.filter(id_feria__in=list(distancias))]
+        for feria in ferias:
+            feria.distancia = round(distancias[feria.id_feria], 1)
+        ferias.sort(key=lambda feria: feria.distancia)
+    else:
+        ferias = [feria async for feria in con_clima]
+    
+    # Clima guardado junto con la feria; las demás, todas a la vez (una consulta por ciudad o celda)
+    climas = await climas_de_ferias_async(ferias)
     for feria in ferias:
-        if feria.ciudad:
-            feria.clima = ClimaService.obtener_clima_por_ciudad(feria.ciudad)
-        else:
-            feria.clima = None
-    
-    return render(request, 'lista_ferias.html', {'ferias': ferias})
+        feria.clima = climas.get(feria.id_feria)
+    
+    return await sync_to_async(render)(request, 'lista_ferias.html', {
+        'ferias': ferias,
+        'cerca': cerca,
+        'radio': request.GET.get('radio', ''),
+        'radios': (5, 10, 25, 50),
+        'error_ubicacion': error_ubicacion,
+    })
 
-def detalle_feria(request, feria_id):
-    """Detalle de una feria con clima"""
-    feria = get_object_or_404(Feria, id_feria=feria_id)
-    puestos = Puesto.objects.filter(id_feria=feria)
+@pagina_condicional(version_feria)
+async def detalle_feria(request, feria_id):
+    """Detalle de una feria con clima y pronóstico"""
+    feria = await aget_object_or_404(Feria.objects.select_related('id_ciudad_clima'), id_feria=feria_id)
+    pagina = await apaginar_keyset(
+        request, Puesto.objects.filter(id_feria=feria).select_related('id_usuario'), ['id_puesto']
+    )
     
-    # Obtener clima
-    clima = None
-    if feria.ciudad:
-        clima = ClimaService.obtener_clima_por_ciudad(feria.ciudad)
+    # Clima guardado por manage.py actualizar_clima (o de ClimaService si no hay)
+    clima = await clima_de_feria_async(feria)
+    pronostico = []
+    if feria.id_ciudad_clima_id:
+        pronostico = await sync_to_async(pronostico_por_dia)(feria.id_ciudad_clima_id)
     
-    return render(request, 'detalle_feria.html', {
+    return await sync_to_async(render)(request, 'detalle_feria.html', {
         'feria': feria,
-        'puestos': puestos,
-        'clima': clima
+        'puestos': pagina,
+        'pagina': pagina,
+        'clima': clima,
+        'pronostico': pronostico,
     })
 
 
+def metricas_view(request):
+    """Métricas por vista de todos los workers, del circuit breaker y del login (Prometheus, solo staff)"""
+    if not request.user.is_staff:
+        return HttpResponseForbidden()
+    texto = exportar_prometheus(leer_todas()) + circuito_clima.metricas() + limite_login.metricas()
+    return HttpResponse(texto, content_type='text/plain; version=0.0.4')
+
+
 # ========== VISTAS VENDEDOR - ADICIONALES ==========
 
+@requiere_rol('vendedor')
 def editar_producto_view(request, id_producto):
     """Editar información de un producto"""
-    if not request.session.get('usuario_id'):
-        return redirect('login')
-    
-    if request.session.get('usuario_rol') != 'vendedor':
-        messages.error(request, 'Acceso denegado')
-        return redirect('dashboard')
-    
-    usuario = Usuario.objects.get(id_usuario=request.session.get('usuario_id'))
+    usuario = request.usuario
     producto = get_object_or_404(
         Producto, 
         id_producto=id_producto,
@@ -438,24 +575,18 @@ def editar_producto_view(request, id_producto):
     return render(request, 'editar_producto.html', context)
 
 
+@requiere_rol('vendedor')
 def eliminar_producto_view(request, id_producto):
     """Eliminar un producto (solo si no tiene reservas)"""
-    if not request.session.get('usuario_id'):
-        return redirect('login')
-    
-    if request.session.get('usuario_rol') != 'vendedor':
-        messages.error(request, 'Acceso denegado')
-        return redirect('dashboard')
-    
-    usuario = Usuario.objects.get(id_usuario=request.session.get('usuario_id'))
+    usuario = request.usuario
     producto = get_object_or_404(
         Producto, 
         id_producto=id_producto,
         id_puesto__id_usuario=usuario
     )
     
-    # Verificar si tiene reservas activas
-    if Reserva.objects.filter(id_producto=producto).exists():
+    # Verificar si tiene reservas (el historial se borraría en cascada)
+    if ReservaService.producto_tiene_reservas(producto):
         messages.error(request, 'No se puede eliminar: el producto tiene reservas activas')
         return redirect('mis_productos')
     
@@ -464,108 +595,74 @@ def eliminar_producto_view(request, id_producto):
     return redirect('mis_productos')
 
 
+@requiere_rol('vendedor')
 def mis_productos_view(request):
     """Ver todos los productos del vendedor"""
-    if not request.session.get('usuario_id'):
-        return redirect('login')
-    
-    if request.session.get('usuario_rol') != 'vendedor':
-        messages.error(request, 'Acceso denegado')
-        return redirect('dashboard')
-    
-    usuario = Usuario.objects.get(id_usuario=request.session.get('usuario_id'))
+    usuario = request.usuario
     puestos = Puesto.objects.filter(id_usuario=usuario)
     productos = Producto.objects.filter(
         id_puesto__in=puestos
-    ).select_related('id_puesto', 'id_categoria').order_by('id_puesto', 'nombre_producto')
+    ).select_related('id_puesto', 'id_categoria')
+    pagina = paginar_keyset(request, productos, ['id_puesto', 'nombre_producto', 'id_producto'])
     
-    context = {'productos': productos}
+    context = {'productos': pagina, 'pagina': pagina}
     return render(request, 'mis_productos.html', context)
 
 
+@requiere_rol('vendedor')
 def actualizar_estado_reserva_view(request, id_reserva):
     """Marcar reserva como completada o procesada"""
-    if not request.session.get('usuario_id'):
-        return redirect('login')
-    
-    if request.session.get('usuario_rol') != 'vendedor':
-        messages.error(request, 'Acceso denegado')
-        return redirect('dashboard')
-    
-    usuario = Usuario.objects.get(id_usuario=request.session.get('usuario_id'))
+    usuario = request.usuario
     
-    # Verificar que la reserva pertenece a un producto del vendedor
+    if request.method != 'POST':
+        return redirect('mis_reservas')
+
+    # Verificar que la reserva (simple o de carrito) tiene productos del vendedor
     reserva = get_object_or_404(
-        Reserva,
+        Reserva.objects.filter(
+            Q(id_producto__id_puesto__id_usuario=usuario)
+            | Q(reservaproducto__id_producto__id_puesto__id_usuario=usuario)
+        ).distinct(),
         id_reserva=id_reserva,
-        id_producto__id_puesto__id_usuario=usuario
     )
     
-    # Aquí podrías agregar un campo de estado a Reserva si lo deseas
-    # Por ahora, simplemente la eliminamos como "completada"
-    reserva.delete()
-    messages.success(request, 'Reserva procesada exitosamente')
+    # Queda como procesada (sin devolver stock); se archiva con el tiempo
+    if ReservaService.procesar(reserva):
+        messages.success(request, 'Reserva procesada exitosamente')
+    else:
+        messages.error(request, 'La reserva ya no está pendiente')
     return redirect('mis_reservas')
 
 
+@requiere_rol('vendedor')
 def estadisticas_vendedor_view(request):
     """Ver estadísticas de ventas y reservas"""
-    if not request.session.get('usuario_id'):
-        return redirect('login')
-    
-    if request.session.get('usuario_rol') != 'vendedor':
-        messages.error(request, 'Acceso denegado')
-        return redirect('dashboard')
-    
-    usuario = Usuario.objects.get(id_usuario=request.session.get('usuario_id'))
-    puestos = Puesto.objects.filter(id_usuario=usuario)
-    productos = Producto.objects.filter(id_puesto__in=puestos)
-    
-    # Estadísticas
-    total_productos = productos.count()
-    total_stock = productos.aggregate(total=Sum('stock'))['total'] or 0
-    total_reservas = Reserva.objects.filter(id_producto__in=productos).count()
-    cantidad_reservada = Reserva.objects.filter(
-        id_producto__in=productos
-    ).aggregate(total=Sum('cantidad'))['total'] or 0
-    
-    # Productos más reservados
-    productos_populares = Reserva.objects.filter(
-        id_producto__in=productos
-    ).values(
-        'id_producto__nombre_producto'
-    ).annotate(
-        total_reservado=Sum('cantidad')
-    ).order_by('-total_reservado')[:5]
-    
+    # Una lectura por clave primaria: EstadisticasService mantiene los totales
+    # al día en cada reserva, cancelación y cambio de stock
+    usuario_id = request.session.get('usuario_id')
+    stats = EstadisticasService.leer(usuario_id)
+
     # Reservas recientes (últimos 7 días)
-    fecha_limite = datetime.now().date() - timedelta(days=7)
-    reservas_recientes = Reserva.objects.filter(
-        id_producto__in=productos,
-        fecha_reserva__gte=fecha_limite
-    ).count()
+    fecha_limite = (datetime.now().date() - timedelta(days=7)).isoformat()
+    reservas_recientes = sum(
+        n for dia, n in stats.reservas_por_dia.items() if dia >= fecha_limite
+    )
     
     context = {
-        'total_productos': total_productos,
-        'total_stock': total_stock,
-        'total_reservas': total_reservas,
-        'cantidad_reservada': cantidad_reservada,
-        'productos_populares': productos_populares,
+        'total_productos': stats.total_productos,
+        'total_stock': stats.total_stock,
+        'total_reservas': stats.total_reservas,
+        'cantidad_reservada': stats.cantidad_reservada,
+        'productos_populares': stats.productos_populares,
         'reservas_recientes': reservas_recientes
     }
     return render(request, 'estadisticas_vendedor.html', context)
 
 
+@requiere_rol('vendedor')
 def editar_puesto_view(request, id_puesto):
     """Editar información del puesto"""
-    if not request.session.get('usuario_id'):
-        return redirect('login')
-    
-    if request.session.get('usuario_rol') != 'vendedor':
-        messages.error(request, 'Acceso denegado')
-        return redirect('dashboard')
-    
-    usuario = Usuario.objects.get(id_usuario=request.session.get('usuario_id'))
+    usuario = request.usuario
     puesto = get_object_or_404(Puesto, id_puesto=id_puesto, id_usuario=usuario)
     
     if request.method == 'POST':
@@ -587,16 +684,10 @@ def editar_puesto_view(request, id_puesto):
     return render(request, 'editar_puesto.html', context)
 
 
+@requiere_rol('vendedor')
 def eliminar_puesto_view(request, id_puesto):
     """Eliminar un puesto (solo si no tiene productos)"""
-    if not request.session.get('usuario_id'):
-        return redirect('login')
-    
-    if request.session.get('usuario_rol') != 'vendedor':
-        messages.error(request, 'Acceso denegado')
-        return redirect('dashboard')
-    
-    usuario = Usuario.objects.get(id_usuario=request.session.get('usuario_id'))
+    usuario = request.usuario
     puesto = get_object_or_404(Puesto, id_puesto=id_puesto, id_usuario=usuario)
     
     # Verificar si tiene productos
@@ -611,12 +702,10 @@ def eliminar_puesto_view(request, id_puesto):
 
 # ========== VISTAS COMUNES ==========
 
+@requiere_login
 def perfil_view(request):
     """Ver y editar perfil de usuario"""
-    if not request.session.get('usuario_id'):
-        return redirect('login')
-    
-    usuario = Usuario.objects.get(id_usuario=request.session.get('usuario_id'))
+    usuario = request.usuario
     
     if request.method == 'POST':
         nombre = request.POST.get('nombre', '').strip()
@@ -640,7 +729,8 @@ def perfil_view(request):
         usuario.nombre = nombre
         usuario.telefono = telefono
         usuario.email = email
-        usuario.save()
+        # La identidad en caché se invalida al guardar (signals.py)
+        usuario.save(update_fields=['nombre', 'telefono', 'email'])
         
         request.session['usuario_nombre'] = usuario.nombre
         messages.success(request, 'Perfil actualizado exitosamente')
@@ -650,17 +740,15 @@ def perfil_view(request):
     return render(request, 'perfil.html', context)
 
 
+@requiere_login
 def cambiar_contrasena_view(request):
     """Cambiar contraseña del usuario"""
-    if not request.session.get('usuario_id'):
-        return redirect('login')
-    
     if request.method == 'POST':
         contrasena_actual = request.POST.get('contrasena_actual', '')
         nueva_contrasena = request.POST.get('nueva_contrasena', '')
         confirmar_nueva = request.POST.get('confirmar_nueva', '')
         
-        usuario = Usuario.objects.get(id_usuario=request.session.get('usuario_id'))
+        usuario = request.usuario
         
         if not check_password(contrasena_actual, usuario.contrasena):
             messages.error(request, 'Contraseña actual incorrecta')
@@ -675,7 +763,7 @@ def cambiar_contrasena_view(request):
             return redirect('cambiar_contrasena')
         
         usuario.contrasena = make_password(nueva_contrasena)
-        usuario.save()
+        usuario.save(update_fields=['contrasena'])
         
         messages.success(request, 'Contraseña cambiada exitosamente')
         return redirect('perfil')
@@ -6,6 +6,7 @@ import dj_database_url
 from pathlib import Path
 from dotenv import load_dotenv
 import os
+import tempfile
 from decouple import config
 
 # --- Cargar variables del archivo .env ---
@@ -26,16 +27,20 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'rest_framework',
     'appferiadigital',
 ]
 
 # --- Middleware ---
 MIDDLEWARE = [
+    'appferiadigital.metricas.MetricasMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'appferiadigital.estaticos.EstaticosMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'appferiadigital.autenticacion.IdentidadMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -69,6 +74,11 @@ DATABASES = {
         ssl_require=True
     )
 }
+if DATABASES['default']['ENGINE'] == 'django.db.backends.sqlite3':
+    # SQLite (desarrollo y tests) no usa SSL. La BD de tests va en disco: en
+    # memoria los hilos de ReservaConcurrenteTests compartirían una conexión
+    DATABASES['default']['OPTIONS'] = {'timeout': 20}
+    DATABASES['default']['TEST'] = {'NAME': str(BASE_DIR / 'test_db.sqlite3')}
 
 # --- Validación de contraseñas ---
 AUTH_PASSWORD_VALIDATORS = [
@@ -88,11 +98,80 @@ USE_TZ = True
 STATIC_URL = '/static/'
 STATICFILES_DIRS = [BASE_DIR / 'appferiadigital' / 'static']
 STATIC_ROOT = BASE_DIR / 'staticfiles'
+# collectstatic minifica CSS/JS, agrega el hash al nombre y genera .gz/.br
+# (ver appferiadigital/estaticos.py); WhiteNoise los sirve con caché de un
+# año e immutable
+STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'appferiadigital.estaticos.EstaticosComprimidos'},
+}
 
 # --- Media files ---
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# --- Paginación de listados (por cursor) ---
+PAGINACION_TAMANO = 24
+PAGINACION_TAMANO_MAXIMO = 100
+
+# --- Búsqueda de productos ---
+BUSQUEDA_MAX_RESULTADOS = 100
+
+# --- API JSON (/api/v1/) ---
+REST_FRAMEWORK = {
+    # Misma sesión y reglas de rol que las vistas HTML (autenticacion.py)
+    'DEFAULT_AUTHENTICATION_CLASSES': ['appferiadigital.autenticacion.SesionFeriaAuthentication'],
+    'DEFAULT_PERMISSION_CLASSES': ['appferiadigital.autenticacion.SesionIniciada'],
+    'DEFAULT_RENDERER_CLASSES': ['rest_framework.renderers.JSONRenderer'],
+    'UNAUTHENTICATED_USER': None,
+}
+
+# --- Importación masiva de productos (importacion_service.py) ---
+IMPORTACION_LOTE = 500                # filas por bulk_create/bulk_update
+IMPORTACION_MAX_ERRORES = 200         # filas con error que se detallan en el informe
+IMPORTACION_TAMANO_MAXIMO = 5 * 1024 * 1024
+
+# --- Exportación de reservas (exportacion_service.py) ---
+EXPORTACION_CHUNK = 1000              # filas por lectura de la BD y por bloque enviado
+
+# --- Archivo de reservas finalizadas (archivo_reservas.py, manage.py archivar_reservas) ---
+RESERVAS_ARCHIVO_DIAS = 90
+RESERVAS_ARCHIVO_LOTE = 1000
+
+# --- Ferias cercanas (indice_ferias.py, índice en memoria de cada proceso) ---
+INDICE_FERIAS_REVISION = 5     # Cada cuánto (s) se revisa si otro proceso cambió las ferias
+FERIAS_CERCANAS = 10           # Resultados por defecto de ?lat=&lon= en lista_ferias y la API
+
+# --- Identidad del usuario en sesión (caché por usuario, segundos) ---
+IDENTIDAD_CACHE_TIMEOUT = 3600
+
+# --- Límite de intentos de login (limite_login.py, en la caché compartida) ---
+LOGIN_IP_CABECERA = 'REMOTE_ADDR'     # detrás de un proxy: 'HTTP_X_FORWARDED_FOR'
+LOGIN_IP_CAPACIDAD = 20               # intentos seguidos por IP
+LOGIN_IP_RECARGA = 10 / 60            # intentos por segundo que se recuperan
+LOGIN_EMAIL_CAPACIDAD = 5
+LOGIN_EMAIL_RECARGA = 1 / 60
+LOGIN_FALLOS_SIN_ESPERA = 3           # desde aquí la espera se duplica con cada fallo
+LOGIN_ESPERA_BASE = 2                 # segundos
+LOGIN_ESPERA_MAXIMA = 300
+LOGIN_ESTADO_TIMEOUT = 3600
+
+# --- Fragmentos de plantilla en caché ({% fragmento %}, la clave lleva la versión) ---
+FRAGMENTOS_CACHE_HABILITADOS = True
+FRAGMENTOS_CACHE_TIMEOUT = 60 * 60 * 24
+
+# --- Stock en vivo por Server-Sent Events (eventos_stock.py, requiere ASGI) ---
+STOCK_EVENTOS_INTERVALO = 1           # segundos entre sondeos de versiones (uno por proceso)
+STOCK_EVENTOS_LATIDO = 15             # comentario sin cambios para mantener la conexión
+STOCK_EVENTOS_DURACION = 300          # luego el stream se cierra y el navegador se reconecta
+STOCK_EVENTOS_REINTENTO_MS = 3000
+
+# --- Métricas por vista (Prometheus en /metricas/, solo staff) ---
+METRICAS_HABILITADAS = os.getenv("METRICAS_HABILITADAS", "1") == "1"
+# Cada worker escribe aquí su acumulado cada METRICAS_INTERVALO segundos
+METRICAS_DIR = os.getenv("METRICAS_DIR", os.path.join(tempfile.gettempdir(), "feriadigital_metricas"))
+METRICAS_INTERVALO = 5
+
 # --- Clave primaria por defecto ---
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
@@ -106,13 +185,49 @@ SECURE_CONTENT_TYPE_NOSNIFF = True
 X_FRAME_OPTIONS = 'DENY'
 
 # --- Caché ---
+# Dos niveles: L1 en memoria por proceso + L2 compartida entre workers.
+# La tabla de L2 se crea con: python manage.py createcachetable
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-        'LOCATION': 'unique-snowflake',
-    }
+        'BACKEND': 'appferiadigital.cache_dos_niveles.DosNivelesCache',
+        'LOCATION': 'feriadigital',
+        'OPTIONS': {
+            'L2': 'compartida',
+            'L1_MAX_ENTRIES': 1000,
+            'L1_TIMEOUT': 10,              # TTL corto del L1 (s)
+            'VERSION_CHECK_INTERVAL': 1,   # Cada cuánto se revisa el sello de versión (s)
+            # Solo estas claves invalidan el L1 de los demás workers al escribirse
+            # (identidad del usuario, fecha de la última baja de puestos o ferias); el
+            # clima, los fragmentos (versión en la clave) y los locks vencen con L1_TIMEOUT
+            'INVALIDAR': ['identidad_', 'versiones_'],
+        },
+    },
+    'compartida': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'cache_feriadigital',
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+        },
+    },
 }
 
 # --- API del clima ---
 OPENWEATHERMAP_API_KEY = os.getenv('OPENWEATHERMAP_API_KEY', '')
-WEATHER_CACHE_TIMEOUT = 1800
\ No newline at end of file
+WEATHER_API_URL = 'http://api.openweathermap.org/data/2.5/weather'
+WEATHER_CONNECT_TIMEOUT = 3.05        # Timeout de conexión (s)
+WEATHER_READ_TIMEOUT = 5              # Timeout de lectura (s)
+WEATHER_HTTP_RETRIES = 2              # Reintentos ante errores de red o 5xx
+WEATHER_CIRCUIT_FAILURES = 5          # Fallos seguidos para abrir el circuito
+WEATHER_CIRCUIT_RESET = 60            # Segundos con el circuito abierto antes de probar
+WEATHER_CACHE_TIMEOUT = 1800          # Vencimiento suave: después se refresca en segundo plano
+WEATHER_CACHE_STALE_TIMEOUT = 21600   # Vencimiento duro: hasta aquí se sirve el dato viejo
+WEATHER_LOCK_TIMEOUT = 30             # Duración máxima del lock de refresco por ciudad
+WEATHER_LOCK_WAIT = 2                 # Espera (s) por el resultado de otro hilo que ya consulta
+WEATHER_ULTIMOS_MAXIMO = 1000        # Lugares con su último clima en memoria (si la API falla)
+WEATHER_MAX_WORKERS = 8        # Hilos para consultas de clima en paralelo
+WEATHER_BATCH_TIMEOUT = 4      # Plazo total (s) para obtener el clima de varias ciudades
+WEATHER_CELDA_GRADOS = 0.1     # Lado de la celda (~11 km): las ferias de una celda comparten el clima
+# Clima guardado en la BD (clima_guardado.py, manage.py actualizar_clima)
+WEATHER_GROUP_URL = 'http://api.openweathermap.org/data/2.5/group'        # Varias ciudades por ID
+WEATHER_FORECAST_URL = 'http://api.openweathermap.org/data/2.5/forecast'  # Cada 3 horas, 5 días
+WEATHER_GRUPO_MAXIMO = 20      # IDs por llamada a /group (límite de la API)